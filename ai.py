@@ -0,0 +1,125 @@
+"""Computer player for the paddles.
+
+`ComputerOpponent` predicts where the ball will cross its paddle row and moves the
+paddle there. It plays the opponent in the game, and both sides in `tournament.py`.
+The prediction is closed form: the ball travels in a straight line, and its bounces
+off the side walls are solved by folding the horizontal position over the width the
+ball can travel in. Deciding costs the same at any ball speed, and nothing is
+simulated ahead.
+
+The difficulty comes from three handicaps: the paddle only re-plans after a
+reaction delay, the predicted position is off by a random error, and the paddle
+moves at a limited speed. The paddle is moved with `Match.move_paddle()`, the same
+clipping and tunneling rules that apply to touches.
+"""
+
+import random
+
+from engine import OPPONENT, Match
+
+# Difficulty name to (reaction delay in base ticks, prediction error in paddle
+# widths, paddle speed in units per base tick)
+DIFFICULTIES = {
+    "easy": (36.0, 0.6, 6.0),
+    "normal": (18.0, 0.3, 10.0),
+    "hard": (6.0, 0.1, 18.0),
+}
+
+
+def fold(x: float, span: float) -> float:
+    """Folds a position over a span, as if it were reflected at both ends.
+
+    Args:
+        x (float): Unbounded position.
+        span (float): Length of the span, positions run from 0 to `span`.
+
+    Returns:
+        float: The position reflected into the span.
+    """
+    if span <= 0:
+        return 0.0
+    x %= 2 * span
+    return 2 * span - x if x > span else x
+
+
+def predict_x(match: Match, side: int = OPPONENT) -> float:
+    """Predicts the ball center when it reaches the paddle row of a side.
+
+    The prediction is exact in continuous mode. In discrete mode the ball overshoots
+    the walls by up to one tick before it bounces, so long rallies off the walls
+    drift from it a little.
+
+    Args:
+        match (engine.Match): The match.
+        side (int, optional): Side of the paddle. Defaults to `OPPONENT`.
+
+    Returns:
+        float: Horizontal position of the ball center, or the center of the field
+        while the ball moves away from the side.
+    """
+    size = match.ball_size
+    if side == OPPONENT:
+        if match.vy <= 0:
+            return match.width / 2
+        ticks = max(match.opponent_y - size - match.ball_y, 0.0) / match.vy
+    else:
+        if match.vy >= 0:
+            return match.width / 2
+        paddle_top = match.player_y + match.paddle_height
+        ticks = max(match.ball_y - paddle_top, 0.0) / -match.vy
+    return fold(match.ball_x + match.vx * ticks, match.width - size) + size / 2
+
+
+class ComputerOpponent:
+    """Plays a paddle, the opponent's unless told otherwise.
+
+    Attributes:
+        side (int): Side of the paddle.
+        reaction (float): Base ticks between two predictions.
+        error (float): Standard deviation of the prediction error, in paddle widths.
+        speed (float): Largest paddle move, in units per base tick.
+        target (float | None): Paddle center the computer is heading for.
+    """
+
+    def __init__(
+        self, difficulty: str = "normal", seed: int = None, side: int = OPPONENT
+    ):
+        """Initializes the computer player.
+
+        Args:
+            difficulty (str, optional): Key of `DIFFICULTIES`. Defaults to "normal".
+            seed (int, optional): Seed of the prediction error. Defaults to None.
+            side (int, optional): Side of the paddle. Defaults to `OPPONENT`.
+        """
+        self.side = side
+        self.reaction, self.error, self.speed = DIFFICULTIES[difficulty]
+        self.target = None
+        self._timer = 0.0
+        self._random = random.Random(seed)
+
+    def update(self, match: Match, ticks: float):
+        """Re-plans if the reaction delay has passed and moves the paddle.
+
+        Args:
+            match (engine.Match): The match.
+            ticks (float): Base ticks since the previous update.
+
+        Returns:
+            float | None: Paddle center passed to `Match.move_paddle()` if the
+            paddle moved, otherwise None.
+        """
+        self._timer -= ticks
+        if self._timer <= 0 or self.target is None:
+            self._timer = self.reaction
+            error = self._random.gauss(0.0, self.error) * match.paddle_width
+            self.target = predict_x(match, self.side) + error
+
+        before = match.opponent_x if self.side == OPPONENT else match.player_x
+        center = before + match.paddle_width / 2
+        reach = self.speed * ticks
+        x = center + max(-reach, min(self.target - center, reach))
+        if match.move_paddle(self.side, x):
+            after = match.opponent_x if self.side == OPPONENT else match.player_x
+            if after != before:
+                return x
+        return None
@@ -0,0 +1,374 @@
+"""Vectorized batch simulation of many Pong matches.
+
+`BatchMatch` holds N independent matches as a structure of NumPy arrays and advances
+all of them with one set of array operations per tick. The rules are the ones of
+`engine.Match`, step for step, so a batch of one reproduces a single match exactly.
+The rule parameters (serve speed, speed multiplier, paddle size, field size) may be
+given per match, which turns a parameter sweep into a single batch.
+
+Run the module directly to measure throughput:
+
+    python batch.py --matches 10000
+"""
+
+import argparse
+from time import perf_counter
+
+import numpy as np
+
+from engine import (
+    GAME_OVER,
+    OPPONENT,
+    OPPONENT_HIT,
+    OPPONENT_SCORED,
+    PLAYER,
+    PLAYER_HIT,
+    PLAYER_SCORED,
+    SCORED,
+    SERVE_SPEED,
+    SPEED_MULTIPLIER,
+    WALL_HIT,
+    WIN_SCORE,
+)
+
+
+class BatchMatch:
+    """The state and rules of N Pong matches stored as arrays.
+
+    Every attribute below is an array of length `n`, indexed by match. The layout
+    defaults are the ones of `engine.Match`.
+
+    Attributes:
+        n (int): Number of matches.
+        width (numpy.ndarray): Width of each field.
+        height (numpy.ndarray): Height of each field.
+        ball_size (numpy.ndarray): Diameter of the ball.
+        paddle_width (numpy.ndarray): Width of both paddles.
+        paddle_height (numpy.ndarray): Height of both paddles.
+        player_y (numpy.ndarray): Bottom edge of the player's paddle.
+        opponent_y (numpy.ndarray): Bottom edge of the opponent's paddle.
+        ball_x (numpy.ndarray): Left edge of the ball.
+        ball_y (numpy.ndarray): Bottom edge of the ball.
+        vx (numpy.ndarray): Horizontal velocity of the ball, in units per tick.
+        vy (numpy.ndarray): Vertical velocity of the ball, in units per tick.
+        player_x (numpy.ndarray): Left edge of the player's paddle.
+        opponent_x (numpy.ndarray): Left edge of the opponent's paddle.
+        player_score (numpy.ndarray): The player's score.
+        opponent_score (numpy.ndarray): The opponent's score.
+        started (numpy.ndarray): Whether each match is running.
+        tick (numpy.ndarray): Number of ticks simulated while the match was running.
+        serve_speed (numpy.ndarray): Per-axis speed of a serve.
+        speed_multiplier (numpy.ndarray): Speed-up applied on every paddle hit.
+        win_score (numpy.ndarray): Score that ends the match.
+    """
+
+    def __init__(
+        self,
+        n: int,
+        width=1000.0,
+        height=1000.0,
+        serve_speed=SERVE_SPEED,
+        speed_multiplier=SPEED_MULTIPLIER,
+        win_score=WIN_SCORE,
+        paddle_width=None,
+        paddle_height=None,
+    ):
+        """Initializes the matches and serves every ball towards the player.
+
+        Each rule parameter is either a scalar shared by all matches or an array of
+        length `n` with one value per match.
+
+        Args:
+            n (int): Number of matches.
+            width (float | array_like, optional): Width of the fields. Defaults to
+                1000.
+            height (float | array_like, optional): Height of the fields. Defaults to
+                1000.
+            serve_speed (float | array_like, optional): Per-axis speed of a serve.
+                Defaults to 4.
+            speed_multiplier (float | array_like, optional): Speed-up applied on
+                paddle hits. Defaults to 1.2.
+            win_score (int | array_like, optional): Score that ends the match.
+                Defaults to 3.
+            paddle_width (float | array_like, optional): Width of the paddles.
+                Defaults to 1/6 of the field width.
+            paddle_height (float | array_like, optional): Height of the paddles.
+                Defaults to 1/36 of the field height.
+        """
+        self.n = n
+        self.width = self._column(width)
+        self.height = self._column(height)
+        self.serve_speed = self._column(serve_speed)
+        self.speed_multiplier = self._column(speed_multiplier)
+        self.win_score = self._column(win_score, np.int64)
+
+        height = self.height
+        self.ball_size = height / 30
+        if paddle_width is None:
+            self.paddle_width = self.width / 6
+        else:
+            self.paddle_width = self._column(paddle_width)
+        if paddle_height is None:
+            self.paddle_height = height / 2 / 18
+        else:
+            self.paddle_height = self._column(paddle_height)
+        self.player_y = height / 10
+        self.opponent_y = height - height / 10 - self.paddle_height
+        self.player_x = (self.width - self.paddle_width) / 2
+        self.opponent_x = self.player_x.copy()
+
+        self.ball_x = np.empty(n)
+        self.ball_y = np.empty(n)
+        self.vx = np.empty(n)
+        self.vy = np.empty(n)
+        self.player_score = np.zeros(n, np.int64)
+        self.opponent_score = np.zeros(n, np.int64)
+        self.started = np.zeros(n, bool)
+        self.tick = np.zeros(n, np.int64)
+        self.serve(PLAYER)
+
+    def _column(self, value, dtype=np.float64) -> np.ndarray:
+        """Broadcasts a scalar or per-match parameter to an owned array of length n.
+
+        Args:
+            value (float | array_like): The parameter.
+            dtype (numpy.dtype, optional): Type of the array. Defaults to float64.
+
+        Returns:
+            numpy.ndarray: A writable array of length `n`.
+        """
+        return np.broadcast_to(np.asarray(value, dtype), (self.n,)).copy()
+
+    def serve(self, towards: int = PLAYER, mask=None) -> None:
+        """Serves the balls from the center of their fields.
+
+        Args:
+            towards (int, optional): `PLAYER` serves downwards, `OPPONENT` serves
+                upwards. Defaults to `PLAYER`.
+            mask (numpy.ndarray, optional): Boolean array selecting the matches to
+                serve. Defaults to all matches.
+        """
+        if mask is None:
+            mask = np.ones(self.n, bool)
+        size = self.ball_size
+        np.copyto(self.ball_x, (self.width - size) / 2, where=mask)
+        np.copyto(self.ball_y, (self.height - size) / 2, where=mask)
+        np.copyto(self.vx, self.serve_speed, where=mask)
+        vy = -self.serve_speed if towards == PLAYER else self.serve_speed
+        np.copyto(self.vy, vy, where=mask)
+
+    def start(self, mask=None) -> None:
+        """Resets the scores and starts the matches.
+
+        Args:
+            mask (numpy.ndarray, optional): Boolean array selecting the matches to
+                start. Defaults to all matches.
+        """
+        if mask is None:
+            mask = np.ones(self.n, bool)
+        self.player_score[mask] = 0
+        self.opponent_score[mask] = 0
+        self.started |= mask
+
+    def move_paddles(self, side: int, target_x) -> np.ndarray:
+        """Centers the paddles of one side on `target_x`, clipped to the field.
+
+        Applies the rules of `engine.Match.move_paddle()` to every match.
+
+        Args:
+            side (int): `PLAYER` or `OPPONENT`.
+            target_x (float | array_like): Requested horizontal center of the paddle.
+
+        Returns:
+            numpy.ndarray: Boolean array, True where the paddle was moved.
+        """
+        radius = self.ball_size / 2
+        ball_center_y = self.ball_y + radius
+        if side == PLAYER:
+            paddles = self.player_x
+            free = ball_center_y - (self.player_y + self.paddle_height) > radius
+        else:
+            paddles = self.opponent_x
+            free = self.opponent_y - ball_center_y > radius
+
+        target_x = np.broadcast_to(np.asarray(target_x, np.float64), (self.n,))
+        half_paddle = self.paddle_width / 2
+        inside = (half_paddle < target_x) & (target_x < self.width - half_paddle)
+        left = target_x < half_paddle
+        right = target_x > self.width - half_paddle
+        x = np.where(
+            inside,
+            target_x - half_paddle,
+            np.where(left, 0.0, self.width - self.paddle_width),
+        )
+        moved = free & (inside | left | right)
+        np.copyto(paddles, x, where=moved)
+        return moved
+
+    def step(self) -> np.ndarray:
+        """Advances every running match by one tick.
+
+        Returns:
+            numpy.ndarray: Per-match bitwise OR of the event flags of the tick.
+        """
+        running = self.started.copy()
+        events = np.zeros(self.n, np.uint8)
+        if not running.any():
+            return events
+        np.add(self.ball_x, self.vx, out=self.ball_x, where=running)
+        np.add(self.ball_y, self.vy, out=self.ball_y, where=running)
+
+        # Bounce off paddles
+        hit = self._bounce(self.player_x, self.player_y, running)
+        events[hit] |= PLAYER_HIT
+        hit = self._bounce(self.opponent_x, self.opponent_y, running)
+        events[hit] |= OPPONENT_HIT
+
+        # Bounce off sides
+        wall = running & (
+            (self.ball_x < 0) | (self.ball_x + self.ball_size > self.width)
+        )
+        np.negative(self.vx, out=self.vx, where=wall)
+        events[wall] |= WALL_HIT
+
+        # Scoring
+        top = running & (self.ball_y + self.ball_size > self.height)
+        self.player_score += top
+        self.serve(OPPONENT, top)
+        events[top] |= PLAYER_SCORED
+        bottom = running & (self.ball_y < 0)
+        self.opponent_score += bottom
+        self.serve(PLAYER, bottom)
+        events[bottom] |= OPPONENT_SCORED
+
+        # Game end condition
+        over = ((events & SCORED) != 0) & (
+            (self.player_score == self.win_score)
+            | (self.opponent_score == self.win_score)
+        )
+        self.started &= ~over
+        events[over] |= GAME_OVER
+
+        self.tick += running
+        return events
+
+    def _bounce(self, paddle_x, paddle_y, running) -> np.ndarray:
+        """Reflects the balls off one row of paddles where they overlap.
+
+        Same math as `engine.Match._bounce()`, evaluated for every match and applied
+        where the ball overlaps the paddle.
+
+        Args:
+            paddle_x (numpy.ndarray): Left edges of the paddles.
+            paddle_y (numpy.ndarray): Bottom edges of the paddles.
+            running (numpy.ndarray): Boolean array of the running matches.
+
+        Returns:
+            numpy.ndarray: Boolean array, True where the ball was bounced.
+        """
+        size = self.ball_size
+        bx = self.ball_x
+        by = self.ball_y
+        paddle_right = paddle_x + self.paddle_width
+        paddle_top = paddle_y + self.paddle_height
+        hit = running & ~(
+            (paddle_right < bx)
+            | (paddle_x > bx + size)
+            | (paddle_top < by)
+            | (paddle_y > by + size)
+        )
+        if not hit.any():
+            return hit
+
+        # Normal from the closest point on the paddle to the ball center
+        cx = bx + size / 2
+        cy = by + size / 2
+        nx = cx - np.maximum(paddle_x, np.minimum(cx, paddle_right))
+        ny = cy - np.maximum(paddle_y, np.minimum(cy, paddle_top))
+        length = np.sqrt(nx * nx + ny * ny)
+        length[length == 0] = 1.0
+        nx /= length
+        ny /= length
+
+        # Reflect the velocity across the normal, assuming a stationary paddle
+        vx = self.vx
+        vy = self.vy
+        dot = vx * nx + vy * ny
+        rx = vx - 2 * dot * nx
+        ry = vy - 2 * dot * ny
+        faster = np.abs(ry) < self.paddle_height
+        rx = np.where(faster, rx * self.speed_multiplier, rx)
+        ry = np.where(faster, ry * self.speed_multiplier, ry)
+        np.copyto(self.vx, rx, where=hit)
+        np.copyto(self.vy, ry, where=hit)
+        return hit
+
+    def run(self, max_ticks: int) -> int:
+        """Steps the batch until every match is over or `max_ticks` is reached.
+
+        Args:
+            max_ticks (int): Upper bound on the number of steps.
+
+        Returns:
+            int: Number of steps taken.
+        """
+        for steps in range(max_ticks):
+            if not self.started.any():
+                return steps
+            self.step()
+        return max_ticks
+
+
+def benchmark(n: int, max_ticks: int = 100_000, **rules) -> dict:
+    """Runs `n` matches to completion and measures the throughput.
+
+    Args:
+        n (int): Number of matches in the batch.
+        max_ticks (int, optional): Upper bound on the number of steps. Defaults to
+            100000.
+        **rules: Rule parameters passed to `BatchMatch`.
+
+    Returns:
+        dict: Number of matches, finished matches, steps, elapsed seconds, finished
+        matches per second and simulated match ticks per second.
+    """
+    batch = BatchMatch(n, **rules)
+    batch.start()
+    start = perf_counter()
+    steps = batch.run(max_ticks)
+    elapsed = perf_counter() - start
+    finished = int(n - batch.started.sum())
+    return {
+        "matches": n,
+        "finished": finished,
+        "steps": steps,
+        "seconds": elapsed,
+        "matches_per_second": finished / elapsed,
+        "ticks_per_second": int(batch.tick.sum()) / elapsed,
+    }
+
+
+def main() -> None:
+    """Command line entry point, prints the throughput of a batch run."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--matches", type=int, default=10_000)
+    parser.add_argument("--max-ticks", type=int, default=100_000)
+    parser.add_argument("--serve-speed", type=float, default=SERVE_SPEED)
+    parser.add_argument("--speed-multiplier", type=float, default=SPEED_MULTIPLIER)
+    args = parser.parse_args()
+    result = benchmark(
+        args.matches,
+        args.max_ticks,
+        serve_speed=args.serve_speed,
+        speed_multiplier=args.speed_multiplier,
+    )
+    print(
+        f"{result['finished']}/{result['matches']} matches in {result['steps']} "
+        f"steps, {result['seconds']:.3f} s: "
+        f"{result['matches_per_second']:.0f} matches/s, "
+        f"{result['ticks_per_second']:.0f} ticks/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
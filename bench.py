@@ -0,0 +1,675 @@
+"""Reproducible benchmarks for the game's hot paths.
+
+Every benchmark runs headlessly and reports a rate (operations per second) over
+several rounds after a warm-up round, as the median, minimum, maximum and standard
+deviation of the rounds. Inputs are generated from fixed seeds, so two runs do the
+same work.
+
+Results are written as JSON. Given a baseline file from an earlier run, benchmarks
+whose median rate dropped by more than the threshold are reported as regressions
+and the script exits with status 1:
+
+    python bench.py --output baseline.json
+    python bench.py --baseline baseline.json
+
+Benchmarks that need Kivy or NumPy are skipped when the package is missing. The
+replay benchmark runs the recording named by the `PONG_RECORDING` environment
+variable, see `replay.py`, and is skipped without one.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+from time import perf_counter
+
+from engine import Match
+
+# Keep Kivy quiet and away from the command line arguments
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+os.environ.setdefault("KIVY_NO_CONSOLELOG", "1")
+
+# Seed of the synthetic inputs
+SEED = 2024
+
+# Benchmark name to function, filled by `benchmark()`
+BENCHMARKS = {}
+
+
+def benchmark(function):
+    """Registers a benchmark.
+
+    A benchmark takes the number of operations to run and returns the number of
+    operations it timed and the elapsed seconds.
+
+    Args:
+        function (callable): The benchmark.
+
+    Returns:
+        callable: The same function.
+    """
+    BENCHMARKS[function.__name__.removeprefix("bench_")] = function
+    return function
+
+
+def endless_match(**kwargs) -> Match:
+    """Returns a started match that never ends.
+
+    Args:
+        **kwargs: Passed to `engine.Match`.
+
+    Returns:
+        engine.Match: The match.
+    """
+    match = Match(1080.0, 1920.0, **kwargs)
+    match.win_score = float("inf")
+    match.start()
+    return match
+
+
+def touch_stream(n: int, width: float, height: float) -> list:
+    """Generates synthetic touches spread over both halves of the screen.
+
+    Args:
+        n (int): Number of touches.
+        width (float): Width of the screen.
+        height (float): Height of the screen.
+
+    Returns:
+        list[Touch]: The touches.
+    """
+    rng = random.Random(SEED)
+    return [Touch(rng.uniform(0, width), rng.uniform(0, height)) for _ in range(n)]
+
+
+class Touch:
+    """Minimal stand-in for a Kivy touch event.
+
+    Attributes:
+        x (float): Horizontal position.
+        y (float): Vertical position.
+        pos (tuple): Position.
+        uid (int): Touch identifier.
+    """
+
+    __slots__ = ("x", "y", "pos", "uid")
+
+    def __init__(self, x: float, y: float, uid: int = 0):
+        """Initializes the touch.
+
+        Args:
+            x (float): Horizontal position.
+            y (float): Vertical position.
+            uid (int, optional): Touch identifier. Defaults to 0.
+        """
+        self.x = x
+        self.y = y
+        self.pos = x, y
+        self.uid = uid
+
+
+@benchmark
+def bench_engine_step(n: int):
+    """Discrete `Match.step()` ticks."""
+    match = endless_match()
+    step = match.step
+    start = perf_counter()
+    for _ in range(n):
+        step()
+    return n, perf_counter() - start
+
+
+@benchmark
+def bench_engine_step_continuous(n: int):
+    """Continuous `Match.step()` ticks."""
+    match = endless_match(continuous=True)
+    step = match.step
+    start = perf_counter()
+    for _ in range(n):
+        step()
+    return n, perf_counter() - start
+
+
+@benchmark
+def bench_engine_step_fixed(n: int):
+    """Fixed-point `FixedMatch.step()` ticks, against the discrete float ticks."""
+    from fixedpoint import FixedMatch
+
+    match = FixedMatch(1080.0, 1920.0)
+    match.win_score = float("inf")
+    match.start()
+    step = match.step
+    start = perf_counter()
+    for _ in range(n):
+        step()
+    return n, perf_counter() - start
+
+
+@benchmark
+def bench_bounce(n: int):
+    """Paddle collision and reflection of an overlapping ball."""
+    match = endless_match()
+    match.ball_x = match.player_x + match.paddle_width / 3
+    match.ball_y = match.player_y + match.paddle_height / 2
+    bounce = match._bounce
+    x = match.player_x
+    y = match.player_y
+    start = perf_counter()
+    for _ in range(n):
+        match.vx = 4.0
+        match.vy = -4.0
+        bounce(x, y)
+    return n, perf_counter() - start
+
+
+@benchmark
+def bench_move_paddle(n: int):
+    """`Match.move_paddle()` under a synthetic touch stream."""
+    match = endless_match()
+    touches = touch_stream(n, match.width, match.height)
+    side_at = match.side_at
+    move_paddle = match.move_paddle
+    start = perf_counter()
+    for touch in touches:
+        side = side_at(touch.y)
+        if side is not None:
+            move_paddle(side, touch.x)
+    return n, perf_counter() - start
+
+
+@benchmark
+def bench_computer_update(n: int):
+    """`ComputerOpponent.update()` decisions, re-planning on every call."""
+    from ai import ComputerOpponent
+
+    match = endless_match()
+    computer = ComputerOpponent("hard", seed=SEED)
+    computer.reaction = 0.0
+    update = computer.update
+    rng = random.Random(SEED)
+    states = [
+        (rng.uniform(0, 1000), rng.uniform(200, 1600), rng.uniform(-40, 40))
+        for _ in range(1000)
+    ]
+    match.vy = 8.0
+    start = perf_counter()
+    for i in range(n):
+        match.ball_x, match.ball_y, match.vx = states[i % 1000]
+        update(match, 1.0)
+    return n, perf_counter() - start
+
+
+@benchmark
+def bench_batch_step(n: int):
+    """Match ticks of `BatchMatch.step()` over 1000 matches."""
+    try:
+        from batch import BatchMatch
+    except ImportError:
+        return None
+    batch = BatchMatch(1000, 1080.0, 1920.0, win_score=2**62)
+    batch.start()
+    steps = max(n // 1000, 1)
+    start = perf_counter()
+    for _ in range(steps):
+        batch.step()
+    return steps * 1000, perf_counter() - start
+
+
+@benchmark
+def bench_replay(n: int):
+    """Physics steps of a recorded session replayed headlessly."""
+    path = os.environ.get("PONG_RECORDING")
+    if not path:
+        return None
+    from replay import replay
+
+    steps = 0
+    elapsed = 0.0
+    while steps < n:
+        result = replay(path)
+        if not result["steps"]:
+            return None
+        steps += result["steps"]
+        elapsed += result["elapsed"]
+    return steps, elapsed
+
+
+def kivy_game(renderer: str = "widgets", **kwargs):
+    """Returns a laid out `PongGame` with a running match, or None without Kivy.
+
+    Args:
+        renderer (str, optional): Name of the renderer. Defaults to "widgets".
+        **kwargs: Passed to `main.PongGame`.
+
+    Returns:
+        main.PongGame | None: The game.
+    """
+    try:
+        import main
+    except ImportError:
+        return None
+    game = main.PongGame(renderer=renderer, **kwargs)
+    game.size = 1080, 1920
+    game.match.win_score = float("inf")
+    game.match.start()
+    game.enter_phase(main.PHASE_SERVE)
+    return game
+
+
+@benchmark
+def bench_game_update(n: int):
+    """`PongGame.update()` frames with one physics step each."""
+    game = kivy_game()
+    if game is None:
+        return None
+    update = game.update
+    dt = game.timestep.step
+    start = perf_counter()
+    for _ in range(n):
+        update(dt)
+    return n, perf_counter() - start
+
+
+@benchmark
+def bench_game_update_effects(n: int):
+    """`PongGame.update()` frames with one physics step each and the particles."""
+    game = kivy_game(effects=True)
+    if game is None:
+        return None
+    update = game.update
+    dt = game.timestep.step
+    start = perf_counter()
+    for _ in range(n):
+        update(dt)
+    return n, perf_counter() - start
+
+
+@benchmark
+def bench_game_touch_move(n: int):
+    """`PongGame.on_touch_move()` under a synthetic touch stream."""
+    game = kivy_game()
+    if game is None:
+        return None
+    # The stream's touch owns the player's paddle
+    game.on_touch_down(Touch(game.width / 2, game.height / 4))
+    touches = touch_stream(n, game.width, game.height)
+    on_touch_move = game.on_touch_move
+    start = perf_counter()
+    for touch in touches:
+        on_touch_move(touch)
+    return n, perf_counter() - start
+
+
+@benchmark
+def bench_game_resize(n: int):
+    """Rotations of the game between portrait and landscape, laid out in full."""
+    try:
+        import main
+    except ImportError:
+        return None
+    game = main.PongGame()
+    sizes = (1080, 1920), (1920, 1080)
+    n = max(n // 100, 1)
+    start = perf_counter()
+    for i in range(n):
+        game.size = sizes[i & 1]
+    return n, perf_counter() - start
+
+
+def bench_render(n: int, renderer: str):
+    """Draws of a renderer with a moving ball and paddles.
+
+    Args:
+        n (int): Number of draws.
+        renderer (str): Name of the renderer.
+
+    Returns:
+        tuple | None: Number of draws and elapsed seconds, None without Kivy.
+    """
+    game = kivy_game(renderer)
+    if game is None:
+        return None
+    match = game.match
+    draw = game.renderer.draw
+    start = perf_counter()
+    for i in range(n):
+        match.player_x = match.opponent_x = i % 100
+        draw(i % 500, i % 900, match)
+    return n, perf_counter() - start
+
+
+@benchmark
+def bench_render_widgets(n: int):
+    """Draws of the widget renderer."""
+    return bench_render(n, "widgets")
+
+
+@benchmark
+def bench_render_canvas(n: int):
+    """Draws of the canvas renderer."""
+    return bench_render(n, "canvas")
+
+
+@benchmark
+def bench_render_shader(n: int):
+    """Draws of the shader renderer, excluding the GPU upload."""
+    return bench_render(n, "shader")
+
+
+# Font sizes of the scores in portrait and landscape 1080x1920
+SCORE_FONT_SIZES = 1920 / 30, 1080 / 30
+
+
+def score_widget(kind: str):
+    """Returns a score widget of the game's layout, or None without Kivy.
+
+    Args:
+        kind (str): "label" for a Kivy `Label`, "atlas" for a `scoreboard.ScoreLabel`.
+
+    Returns:
+        tuple | None: The widget and a function setting its score and font size
+        and bringing its texture up to date.
+    """
+    try:
+        from kivy.core.window import Window  # noqa: F401, creates the GL context
+        from kivy.uix.label import Label
+
+        from scoreboard import ScoreLabel
+    except ImportError:
+        return None
+    if kind == "label":
+        label = Label(font_size=SCORE_FONT_SIZES[0], text="0")
+
+        def show(score: int, font_size: float) -> None:
+            label.text = str(score)
+            label.font_size = font_size
+            # Labels update their texture on the next frame, done here instead
+            label.texture_update()
+            label.size = label.texture_size
+
+        return label, show
+
+    label = ScoreLabel(font_size=SCORE_FONT_SIZES[0])
+
+    def show(score: int, font_size: float) -> None:
+        label.score = score
+        label.font_size = font_size
+
+    return label, show
+
+
+def bench_score(n: int, kind: str, resize: bool):
+    """Score changes, or rotations flipping the font size, of a score widget.
+
+    Args:
+        n (int): Number of changes.
+        kind (str): See `score_widget()`.
+        resize (bool): Flip the font size instead of the score.
+
+    Returns:
+        tuple | None: Number of changes and elapsed seconds, None without Kivy.
+    """
+    widget = score_widget(kind)
+    if widget is None:
+        return None
+    _, show = widget
+    # Rasterizing text is slow, the label paths time fewer changes
+    n = max(n // 100, 1) if kind == "label" else n
+    sizes = SCORE_FONT_SIZES
+    start = perf_counter()
+    if resize:
+        for i in range(n):
+            show(1, sizes[i & 1])
+    else:
+        for i in range(n):
+            show(i % 10, sizes[0])
+    return n, perf_counter() - start
+
+
+@benchmark
+def bench_score_label(n: int):
+    """Score changes of a Kivy `Label`, rasterizing the text."""
+    return bench_score(n, "label", False)
+
+
+@benchmark
+def bench_score_atlas(n: int):
+    """Score changes of a `ScoreLabel`, swapping atlas regions."""
+    return bench_score(n, "atlas", False)
+
+
+@benchmark
+def bench_score_resize_label(n: int):
+    """Rotations of a Kivy `Label`, rasterizing the text at the new size."""
+    return bench_score(n, "label", True)
+
+
+@benchmark
+def bench_score_resize_atlas(n: int):
+    """Rotations of a `ScoreLabel`, reusing the cached atlas of each size."""
+    return bench_score(n, "atlas", True)
+
+
+@benchmark
+def bench_particles(n: int):
+    """Particle frames of a trail, sparks and bursts, updated and drawn."""
+    try:
+        from kivy.core.window import Window  # noqa: F401, creates the GL context
+        from kivy.graphics import InstructionGroup
+    except ImportError:
+        return None
+    from particles import BURST, SPARKS, TRAIL, ParticleRenderer, ParticleSystem
+
+    particles = ParticleSystem(seed=SEED)
+    renderer = ParticleRenderer(InstructionGroup(), particles)
+    frames = max(n // 100, 1)
+    dt = 1 / 120
+    start = perf_counter()
+    for frame in range(frames):
+        particles.effect(TRAIL, 280.0, 500.0 + frame % 200, 33.0)
+        if frame % 30 == 0:
+            particles.effect(SPARKS, 280.0, 120.0, 33.0)
+        if frame % 240 == 0:
+            particles.effect(BURST, 280.0, 980.0, 33.0)
+        particles.update(dt)
+        renderer.draw(500.0)
+    return frames, perf_counter() - start
+
+
+def telemetry_log(path: str, n: int) -> float:
+    """Writes a telemetry log of synthetic paddle hits and points.
+
+    Args:
+        path (str): Destination of the log.
+        n (int): Number of events.
+
+    Returns:
+        float: Seconds spent in `TelemetryWriter.write()`, the game's share.
+    """
+    from telemetry import TelemetryWriter
+
+    rng = random.Random(SEED)
+    writer = TelemetryWriter(path, 1.0)
+    write = writer.write
+    rally = 0
+    start = perf_counter()
+    for tick in range(n):
+        rally += 1
+        if rally > 8 and rng.random() < 0.2:
+            write(tick, 8 << (tick & 1), rally, 0.0, 900.0, rally * 0.8)
+            rally = 0
+        else:
+            write(tick, 1 + (tick & 1), rally, rng.uniform(-1, 1), 900.0, 0.8)
+    elapsed = perf_counter() - start
+    writer.close()
+    return elapsed
+
+
+@benchmark
+def bench_telemetry_write(n: int):
+    """Telemetry events logged by the game thread."""
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as directory:
+        return n, telemetry_log(os.path.join(directory, "bench.pongtel"), n)
+
+
+@benchmark
+def bench_telemetry_summary(n: int):
+    """Telemetry events aggregated from a memory-mapped log."""
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return None
+    import tempfile
+
+    from telemetry import summarize
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.pongtel")
+        telemetry_log(path, n * 10)
+        start = perf_counter()
+        summarize([path])
+        return n * 10, perf_counter() - start
+
+
+@benchmark
+def bench_cold_start(n: int):
+    """Fresh interpreters launching `PongApp` up to its first drawn frame."""
+    script = (
+        "from time import perf_counter\n"
+        "start = perf_counter()\n"
+        "import main\n"
+        "app = main.PongApp()\n"
+        "first_frame = app.on_first_frame\n"
+        "def on_first_frame(dt):\n"
+        "    first_frame(dt)\n"
+        "    print(perf_counter() - start, flush=True)\n"
+        "    app.stop()\n"
+        "app.on_first_frame = on_first_frame\n"
+        "app.run()\n"
+    )
+    runs = max(n // 100_000, 1)
+    elapsed = 0.0
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", script],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        if result.returncode:
+            return None
+        elapsed += float(result.stdout.split()[-1])
+    return runs, elapsed
+
+
+def run(names, n: int, rounds: int) -> dict:
+    """Runs benchmarks and summarizes their rates.
+
+    Args:
+        names (list[str]): Names of the benchmarks.
+        n (int): Operations per round.
+        rounds (int): Timed rounds, after one warm-up round.
+
+    Returns:
+        dict: Benchmark name to statistics, or to None if it was skipped because
+        one of its rounds, the warm-up included, could not run.
+    """
+    results = {}
+    for name in names:
+        function = BENCHMARKS[name]
+        results[name] = None
+        if function(max(n // 10, 1)) is None:
+            continue
+        rates = []
+        for _ in range(rounds):
+            result = function(n)
+            if result is None:
+                # Whatever stopped it, e.g. a failing subprocess, skips the benchmark
+                print(f"{name}: skipped, a timed round could not run")
+                break
+            count, elapsed = result
+            rates.append(count / elapsed)
+        else:
+            results[name] = {
+                "median": statistics.median(rates),
+                "min": min(rates),
+                "max": max(rates),
+                "stdev": statistics.stdev(rates) if len(rates) > 1 else 0.0,
+                "rounds": rounds,
+                "unit": "ops/s",
+            }
+    # The games of the benchmarks share the platform services worker
+    services = sys.modules.get("services")
+    if services is not None:
+        services.close()
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Compares results against a baseline.
+
+    Args:
+        results (dict): Output of `run()`.
+        baseline (dict): Output of an earlier `run()`.
+        threshold (float): Largest tolerated relative drop of the median rate.
+
+    Returns:
+        list[str]: Names of the regressed benchmarks.
+    """
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not result or not before:
+            continue
+        ratio = result["median"] / before["median"]
+        result["baseline_ratio"] = ratio
+        if ratio < 1 - threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main() -> None:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("names", nargs="*", help="benchmarks to run, default all")
+    parser.add_argument("-n", type=int, default=200_000, help="operations per round")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="compare with earlier results")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    names = args.names or list(BENCHMARKS)
+    results = run(names, args.n, args.rounds)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.threshold)
+
+    for name, result in results.items():
+        if result is None:
+            print(f"{name:24} skipped")
+            continue
+        line = (
+            f"{name:24} {result['median']:14,.0f} ops/s "
+            f"(min {result['min']:,.0f}, stdev {result['stdev']:,.0f})"
+        )
+        if "baseline_ratio" in result:
+            line += f" x{result['baseline_ratio']:.2f}"
+        if name in regressions:
+            line += " REGRESSION"
+        print(line)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1047 @@
+"""Live broadcast of a match to spectator screens.
+
+The game hands the state of every physics step to `Publisher`: the tick, the
+geometry of the field, the ball and paddle positions and the scores, packed into a
+fixed-size record. The records of a frame are written to a pipe at once, without
+blocking, and records the pipe can't take right away are dropped rather than
+waited for. The pipe feeds a broadcast
+server in its own lower-priority process, so encoding the stream and writing it to
+hundreds of sockets never competes with the game loop for the interpreter.
+
+`BroadcastServer` encodes each state once for all spectators over TCP. Positions are
+quantized to 1/`QUANTUM` of a field unit. A delta carries the ticks elapsed and, for
+the positions and scores that changed, the difference from the previous state as a
+zigzag varint, so a typical step costs a handful of bytes. A keyframe carries the
+whole state and is sent every `KEYFRAME_INTERVAL` states, whenever the geometry
+changes, and to each spectator as it joins, so late joiners sync at once. A
+spectator whose send queue grows past `MAX_QUEUE` bytes is disconnected instead of
+buffering a stream it can't keep up with.
+
+`SpectatorClient` decodes the stream and plays it back `INTERPOLATION_DELAY` behind
+the latest state, interpolating the positions between the two states around the
+playback time so the picture stays smooth at any render rate.
+
+Run the server with a headless self-play match and hundreds of localhost
+spectators, one of them too slow to keep up, and check they all stay in sync:
+
+    python broadcast.py --test --spectators 300
+
+Or broadcast a game from `main.py` by setting `port` in the `[broadcast]` section
+of `pong.ini`, and watch it from other machines:
+
+    python broadcast.py --watch 192.168.1.10:9100
+
+Broadcasting is for desktop builds. The server is launched with `sys.executable`,
+which isn't a Python interpreter in an Android package, and the pipe to it needs
+`os.set_blocking()`, which Windows only supports for pipes from Python 3.12 on.
+`Publisher` raises `OSError` where it can't start, and the game plays on without
+the broadcast.
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import struct
+import subprocess
+import sys
+from collections import deque
+from operator import attrgetter
+from time import perf_counter
+
+from engine import OPPONENT, PLAYER, SCORED, Match
+from timestep import PHYSICS_RATE, FixedTimestep
+
+# Default port of the broadcast server
+PORT = 9100
+
+# Geometry of the field, sent in keyframes only
+GEOMETRY = (
+    "width",
+    "height",
+    "ball_size",
+    "paddle_width",
+    "paddle_height",
+    "player_y",
+    "opponent_y",
+)
+
+# Positions and scores, sent as deltas
+MOTION = ("ball_x", "ball_y", "player_x", "opponent_x")
+SCORES = ("player_score", "opponent_score")
+DYNAMIC = MOTION + SCORES
+
+# State of a physics step, from the game to the server: the tick, then the fields
+FIELDS = GEOMETRY + DYNAMIC
+STATE = struct.Struct("<q11d2q")
+read_state = attrgetter("tick", *FIELDS)
+
+# Bytes of records written to the pipe at once, writes up to PIPE_BUF are atomic
+MAX_WRITE = 4096 // STATE.size * STATE.size
+
+# Quantization steps per field unit of the encoded positions
+QUANTUM = 8
+
+# Length of the message that follows, in the stream to the spectators
+LENGTH = struct.Struct("<H")
+
+# Message kinds
+KEYFRAME = 1
+DELTA = 2
+
+# Kind, tick, physics rate, quantized geometry and positions, scores
+KEYFRAME_BODY = struct.Struct("<BqH11i2H")
+
+# Kind, ticks since the previous state, bit mask of the changed `DYNAMIC` fields,
+# followed by one zigzag varint per changed field
+DELTA_BODY = struct.Struct("<BBB")
+
+# States between two periodic keyframes, 1 second at 120 Hz
+KEYFRAME_INTERVAL = 120
+
+# Bytes a spectator may have waiting to be sent before it is dropped
+MAX_QUEUE = 8192
+
+# Linger option of a dropped spectator socket, closing it with a reset so the
+# spectator can tell a drop from the end of the broadcast
+RESET = struct.pack("ii", 1, 0)
+
+# Kernel send buffer of a spectator socket, small so a stalled spectator shows up
+# in its send queue within seconds
+SEND_BUFFER = 8192
+
+# Scheduling priority of the server process, below the game's so that on a busy
+# CPU the fan-out waits for the game rather than the other way round
+NICENESS = 10
+
+# Delay of the spectator playback behind the latest state, in seconds
+INTERPOLATION_DELAY = 0.1
+
+# Playback lag beyond which the client jumps to the stream, in seconds
+RESYNC_LAG = 0.5
+
+# Share of the playback lag caught up per frame
+CATCH_UP = 0.1
+
+# States kept by a client for interpolation
+HISTORY = 64
+
+
+def quantize(state: tuple) -> tuple:
+    """Quantizes the fields of a state.
+
+    Args:
+        state (tuple): Values of `FIELDS`, in field units.
+
+    Returns:
+        tuple: Positions in 1/`QUANTUM` units, and the scores.
+    """
+    positions = len(GEOMETRY) + len(MOTION)
+    return tuple(round(value * QUANTUM) for value in state[:positions]) + tuple(
+        int(score) for score in state[positions:]
+    )
+
+
+def dequantize(tick: int, values) -> tuple:
+    """Turns a tick and quantized fields back into a state.
+
+    Args:
+        tick (int): The tick.
+        values (tuple | list): Output of `quantize()`.
+
+    Returns:
+        tuple: The tick followed by the values of `FIELDS` in field units.
+    """
+    positions = len(GEOMETRY) + len(MOTION)
+    return (
+        (tick,)
+        + tuple(value / QUANTUM for value in values[:positions])
+        + tuple(values[positions:])
+    )
+
+
+def put_varint(buffer: bytearray, value: int) -> None:
+    """Appends a signed integer as a zigzag varint.
+
+    Args:
+        buffer (bytearray): Destination.
+        value (int): The integer.
+    """
+    value = value * 2 if value >= 0 else -value * 2 - 1
+    while value > 0x7F:
+        buffer.append(value & 0x7F | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def get_varint(data, offset: int) -> tuple:
+    """Reads a zigzag varint.
+
+    Args:
+        data (bytes-like): Source.
+        offset (int): Position of the varint.
+
+    Returns:
+        tuple: The integer and the position after it.
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            break
+        shift += 7
+    return (value >> 1 if not value & 1 else -(value >> 1) - 1), offset
+
+
+class StateEncoder:
+    """Encodes states as keyframes and deltas.
+
+    Attributes:
+        rate (float): Physics steps per second.
+        keyframe_interval (int): States between two periodic keyframes.
+        previous (tuple | None): Tick and quantized fields of the last state
+            encoded, None before the first one.
+        keyframes (int): Keyframes encoded, not counting `keyframe()` calls.
+        deltas (int): Deltas encoded.
+    """
+
+    def __init__(self, rate: float, keyframe_interval: int = KEYFRAME_INTERVAL):
+        """Initializes the encoder.
+
+        Args:
+            rate (float): Physics steps per second.
+            keyframe_interval (int, optional): States between two periodic
+                keyframes. Defaults to `KEYFRAME_INTERVAL`.
+        """
+        self.rate = rate
+        self.keyframe_interval = keyframe_interval
+        self.previous = None
+        self.keyframes = 0
+        self.deltas = 0
+        self._since_keyframe = 0
+
+    def encode(self, state: tuple) -> bytes:
+        """Encodes a state, as a delta from the previous one when possible.
+
+        Args:
+            state (tuple): The tick and the values of `FIELDS`, in field units.
+
+        Returns:
+            bytes: The length-prefixed message.
+        """
+        tick = state[0]
+        values = quantize(state[1:])
+        previous = self.previous
+        self.previous = tick, values
+        geometry = len(GEOMETRY)
+        if (
+            previous is None
+            or self._since_keyframe >= self.keyframe_interval
+            or not 0 <= tick - previous[0] <= 0xFF
+            or values[:geometry] != previous[1][:geometry]
+        ):
+            self._since_keyframe = 0
+            self.keyframes += 1
+            return self.keyframe()
+
+        self._since_keyframe += 1
+        self.deltas += 1
+        mask = 0
+        payload = bytearray()
+        before = previous[1]
+        for i in range(geometry, len(values)):
+            change = values[i] - before[i]
+            if change:
+                mask |= 1 << (i - geometry)
+                put_varint(payload, change)
+        body = DELTA_BODY.pack(DELTA, tick - previous[0], mask) + payload
+        return LENGTH.pack(len(body)) + body
+
+    def keyframe(self) -> bytes:
+        """Encodes the last state as a keyframe.
+
+        Returns:
+            bytes: The length-prefixed message, empty before the first state.
+        """
+        if self.previous is None:
+            return b""
+        tick, values = self.previous
+        body = KEYFRAME_BODY.pack(KEYFRAME, tick, round(self.rate), *values)
+        return LENGTH.pack(len(body)) + body
+
+
+class StateDecoder:
+    """Decodes the stream of a `StateEncoder`.
+
+    Attributes:
+        rate (float): Physics steps per second, from the last keyframe.
+        tick (int | None): Tick of the last state, None before the first keyframe.
+        values (tuple | None): Quantized fields of the last state.
+        keyframes (int): Keyframes decoded.
+        deltas (int): Deltas decoded.
+    """
+
+    def __init__(self):
+        """Initializes the decoder, waiting for a keyframe."""
+        self.rate = PHYSICS_RATE
+        self.tick = None
+        self.values = None
+        self.keyframes = 0
+        self.deltas = 0
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> list:
+        """Decodes the complete messages received so far.
+
+        Deltas received before the first keyframe are skipped.
+
+        Args:
+            data (bytes): Bytes received from the stream.
+
+        Returns:
+            list[tuple]: The decoded states, each the tick followed by the values
+            of `FIELDS` in field units.
+        """
+        buffer = self._buffer
+        buffer += data
+        states = []
+        offset = 0
+        geometry = len(GEOMETRY)
+        while offset + LENGTH.size <= len(buffer):
+            (length,) = LENGTH.unpack_from(buffer, offset)
+            start = offset + LENGTH.size
+            end = start + length
+            if end > len(buffer):
+                break
+            offset = end
+            if buffer[start] == KEYFRAME:
+                _, self.tick, self.rate, *values = KEYFRAME_BODY.unpack_from(
+                    buffer, start
+                )
+                self.values = values
+                self.keyframes += 1
+            elif self.values is not None:
+                _, ticks, mask = DELTA_BODY.unpack_from(buffer, start)
+                position = start + DELTA_BODY.size
+                values = self.values
+                for i in range(len(DYNAMIC)):
+                    if mask & 1 << i:
+                        change, position = get_varint(buffer, position)
+                        values[geometry + i] += change
+                self.tick += ticks
+                self.deltas += 1
+            else:
+                continue
+            states.append(self.state())
+        del buffer[:offset]
+        return states
+
+    def state(self) -> tuple:
+        """Returns the last state.
+
+        Returns:
+            tuple: The tick followed by the values of `FIELDS` in field units.
+        """
+        return dequantize(self.tick, self.values)
+
+
+class Publisher:
+    """Hands the states of a match to a broadcast server process.
+
+    Attributes:
+        port (int): Port the server listens on.
+        published (int): States written to the server.
+        dropped (int): States dropped because the pipe was full.
+        process (subprocess.Popen): The server process.
+    """
+
+    def __init__(
+        self,
+        port: int = PORT,
+        rate: float = PHYSICS_RATE,
+        host: str = "0.0.0.0",
+        max_queue: int = MAX_QUEUE,
+    ):
+        """Starts the server process.
+
+        Args:
+            port (int, optional): Port to listen on. Defaults to `PORT`.
+            rate (float, optional): Physics steps per second. Defaults to
+                `timestep.PHYSICS_RATE`.
+            host (str, optional): Address to listen on. Defaults to all
+                interfaces.
+            max_queue (int, optional): Bytes a spectator may have waiting before it
+                is dropped. Defaults to `MAX_QUEUE`.
+
+        Raises:
+            OSError: If the server can't be launched, or written to without
+                blocking.
+        """
+        self.port = port
+        self.published = 0
+        self.dropped = 0
+        try:
+            self.process = subprocess.Popen(
+                [
+                    sys.executable, os.path.abspath(__file__), "--serve",
+                    "--host", host, "--port", str(port), "--rate", str(rate),
+                    "--max-queue", str(max_queue),
+                ],
+                stdin=subprocess.PIPE,
+            )
+        except (OSError, ValueError) as e:
+            raise OSError(f"can't launch the server with {sys.executable!r}: {e}")
+        self._fd = self.process.stdin.fileno()
+        try:
+            os.set_blocking(self._fd, False)
+        except (AttributeError, OSError) as e:
+            self.process.kill()
+            self.process.wait()
+            raise OSError(f"can't write to the server without blocking: {e}")
+        self._records = bytearray()
+
+    def publish(self, match) -> None:
+        """Queues the state of the match for the next `flush()`.
+
+        Args:
+            match (engine.Match | fixedpoint.FixedMatch): The match.
+        """
+        self._records += STATE.pack(*read_state(match))
+        if len(self._records) >= MAX_WRITE:
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes the queued states, dropping them if the pipe is full."""
+        records = self._records
+        if not records:
+            return
+        count = len(records) // STATE.size
+        if self._fd is not None:
+            try:
+                # Writes up to PIPE_BUF are all or nothing
+                os.write(self._fd, records)
+                self.published += count
+            except BlockingIOError:
+                self.dropped += count
+            except OSError:
+                print("Broadcast: the server stopped.")
+                self._fd = None
+        records.clear()
+
+    def close(self, timeout: float = 2.0) -> None:
+        """Stops the server once it has sent the published states.
+
+        Args:
+            timeout (float, optional): Longest wait for the server, in seconds.
+                Defaults to 2.
+        """
+        self.flush()
+        self._fd = None
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+class Spectator(asyncio.Protocol):
+    """Connection of a spectator to the `BroadcastServer`.
+
+    Attributes:
+        server (BroadcastServer): The server.
+        transport (asyncio.Transport | None): The socket.
+    """
+
+    def __init__(self, server):
+        """Initializes the connection.
+
+        Args:
+            server (BroadcastServer): The server.
+        """
+        self.server = server
+        self.transport = None
+
+    def connection_made(self, transport) -> None:
+        """Joins the broadcast.
+
+        Args:
+            transport (asyncio.Transport): The socket.
+        """
+        self.transport = transport
+        sock = transport.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER)
+        self.server.join(self)
+
+    # noinspection PyUnusedLocal
+    def connection_lost(self, exc) -> None:
+        """Leaves the broadcast.
+
+        Args:
+            exc (Exception | None): Why the connection was lost.
+        """
+        self.server.leave(self)
+
+    def send(self, data: bytes) -> None:
+        """Queues data, or drops the spectator if its queue is full.
+
+        Args:
+            data (bytes): The data.
+        """
+        transport = self.transport
+        if transport.is_closing():
+            return
+        if transport.get_write_buffer_size() + len(data) > self.server.max_queue:
+            self.server.dropped += 1
+            sock = transport.get_extra_info("socket")
+            if sock is not None:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, RESET)
+            transport.abort()
+            return
+        transport.write(data)
+
+
+class StateReader(asyncio.Protocol):
+    """Reads the states written by `Publisher` into the `BroadcastServer`.
+
+    Attributes:
+        server (BroadcastServer): The server.
+        done (asyncio.Future): Resolved when the game closes the pipe.
+    """
+
+    def __init__(self, server, done):
+        """Initializes the reader.
+
+        Args:
+            server (BroadcastServer): The server.
+            done (asyncio.Future): Resolved when the game closes the pipe.
+        """
+        self.server = server
+        self.done = done
+
+    def data_received(self, data: bytes) -> None:
+        """Broadcasts the states received.
+
+        Args:
+            data (bytes): Part of the stream of `STATE` records.
+        """
+        self.server.feed(data)
+
+    # noinspection PyUnusedLocal
+    def connection_lost(self, exc) -> None:
+        """Reports the end of the game.
+
+        Args:
+            exc (Exception | None): Why the pipe was closed.
+        """
+        if not self.done.done():
+            self.done.set_result(None)
+
+
+class BroadcastServer:
+    """Encodes states once and fans them out to the spectators.
+
+    Attributes:
+        encoder (StateEncoder): Encodes the states.
+        max_queue (int): Bytes a spectator may have waiting before it is dropped.
+        spectators (set[Spectator]): Connected spectators.
+        states (int): States received.
+        joined (int): Spectators that connected.
+        dropped (int): Spectators dropped for a full send queue.
+        peak (int): Most spectators connected at once.
+        sent (int): Bytes of stream, counted once for all spectators.
+    """
+
+    def __init__(
+        self,
+        rate: float = PHYSICS_RATE,
+        keyframe_interval: int = KEYFRAME_INTERVAL,
+        max_queue: int = MAX_QUEUE,
+    ):
+        """Initializes the server.
+
+        Args:
+            rate (float, optional): Physics steps per second. Defaults to
+                `timestep.PHYSICS_RATE`.
+            keyframe_interval (int, optional): States between two periodic
+                keyframes. Defaults to `KEYFRAME_INTERVAL`.
+            max_queue (int, optional): Bytes a spectator may have waiting before it
+                is dropped. Defaults to `MAX_QUEUE`.
+        """
+        self.encoder = StateEncoder(rate, keyframe_interval)
+        self.max_queue = max_queue
+        self.spectators = set()
+        self.states = 0
+        self.joined = 0
+        self.dropped = 0
+        self.peak = 0
+        self.sent = 0
+        self._records = bytearray()
+
+    def feed(self, data: bytes) -> None:
+        """Encodes the complete states received and sends them.
+
+        Args:
+            data (bytes): Part of the stream of `STATE` records.
+        """
+        records = self._records
+        records += data
+        count = len(records) // STATE.size
+        if not count:
+            return
+        encode = self.encoder.encode
+        message = b"".join(
+            encode(state) for state in STATE.iter_unpack(records[: count * STATE.size])
+        )
+        del records[: count * STATE.size]
+        self.states += count
+        self.sent += len(message)
+        for spectator in list(self.spectators):
+            spectator.send(message)
+
+    def join(self, spectator: Spectator) -> None:
+        """Adds a spectator, starting its stream with a keyframe.
+
+        Args:
+            spectator (Spectator): The spectator.
+        """
+        self.spectators.add(spectator)
+        self.joined += 1
+        self.peak = max(self.peak, len(self.spectators))
+        keyframe = self.encoder.keyframe()
+        if keyframe:
+            spectator.send(keyframe)
+
+    def leave(self, spectator: Spectator) -> None:
+        """Removes a spectator.
+
+        Args:
+            spectator (Spectator): The spectator.
+        """
+        self.spectators.discard(spectator)
+
+    async def close(self, timeout: float = 1.0) -> None:
+        """Closes the connections once their queues are sent.
+
+        Args:
+            timeout (float, optional): Longest wait for the queues, in seconds.
+                Defaults to 1.
+        """
+        for spectator in list(self.spectators):
+            spectator.transport.close()
+        start = perf_counter()
+        while self.spectators and perf_counter() - start < timeout:
+            await asyncio.sleep(0.01)
+
+    def stats(self) -> str:
+        """Returns a summary of the broadcast.
+
+        Returns:
+            str: States, keyframes, bytes per state and spectator counts.
+        """
+        encoder = self.encoder
+        per_state = self.sent / self.states if self.states else 0.0
+        return (
+            f"{self.states} states ({encoder.keyframes} keyframes), "
+            f"{per_state:.1f} bytes/state, {self.joined} spectators joined, "
+            f"peak {self.peak}, {self.dropped} dropped"
+        )
+
+
+async def serve(args) -> None:
+    """Runs the broadcast server until the game closes the pipe.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments.
+    """
+    if hasattr(os, "nice"):
+        os.nice(NICENESS)
+    loop = asyncio.get_running_loop()
+    server = BroadcastServer(args.rate, max_queue=args.max_queue)
+    listener = await loop.create_server(
+        lambda: Spectator(server), args.host, args.port, backlog=1024
+    )
+    done = loop.create_future()
+    await loop.connect_read_pipe(lambda: StateReader(server, done), sys.stdin.buffer)
+    await done
+    listener.close()
+    await server.close()
+    print(f"broadcast: {server.stats()}", flush=True)
+
+
+class SpectatorClient(asyncio.Protocol):
+    """Receives a broadcast and plays it back with interpolation.
+
+    Attributes:
+        decoder (StateDecoder): Decodes the stream.
+        states (collections.deque): Latest states, oldest first.
+        received (int): Bytes received.
+        playback (float | None): Tick shown, None before the first state.
+        connected (bool): Whether the connection is open.
+        closed (asyncio.Future): Resolved with the reason of the disconnection, a
+            `ConnectionResetError` when the server dropped the client.
+    """
+
+    def __init__(self, delay: float = INTERPOLATION_DELAY):
+        """Initializes the client.
+
+        Args:
+            delay (float, optional): Playback delay behind the latest state, in
+                seconds. Defaults to `INTERPOLATION_DELAY`.
+        """
+        self.decoder = StateDecoder()
+        self.states = deque(maxlen=HISTORY)
+        self.received = 0
+        self.playback = None
+        self.connected = False
+        self.closed = asyncio.get_running_loop().create_future()
+        self._delay = delay
+
+    def connection_made(self, transport) -> None:
+        """Marks the client connected.
+
+        Args:
+            transport (asyncio.Transport): The socket.
+        """
+        self.connected = True
+
+    def data_received(self, data: bytes) -> None:
+        """Decodes the states received.
+
+        Args:
+            data (bytes): Part of the stream.
+        """
+        self.received += len(data)
+        self.states.extend(self.decoder.feed(data))
+
+    # noinspection PyUnusedLocal
+    def connection_lost(self, exc) -> None:
+        """Marks the client disconnected.
+
+        Args:
+            exc (Exception | None): Why the connection was lost.
+        """
+        self.connected = False
+        if not self.closed.done():
+            self.closed.set_result(exc)
+
+    def sample(self, dt: float):
+        """Advances the playback and returns the state shown.
+
+        The playback runs at the physics rate and eases towards its delay behind
+        the latest state, or jumps there when it lags by more than `RESYNC_LAG`.
+        Positions are interpolated between the states around the playback tick,
+        except across a point, where the ball is served from the center.
+
+        Args:
+            dt (float): Real time since the previous sample, in seconds.
+
+        Returns:
+            tuple | None: The tick followed by the values of `FIELDS`, None before
+            the first state.
+        """
+        states = self.states
+        if not states:
+            return None
+        rate = self.decoder.rate
+        target = states[-1][0] - self._delay * rate
+        if self.playback is None or abs(target - self.playback) > RESYNC_LAG * rate:
+            self.playback = target
+        else:
+            self.playback += dt * rate
+            self.playback += (target - self.playback) * CATCH_UP
+        playback = self.playback
+
+        after = states[-1]
+        for before in reversed(states):
+            if before[0] <= playback:
+                break
+            after = before
+        else:
+            return states[0]
+        if after is before or after[-2:] != before[-2:]:
+            return before
+        alpha = (playback - before[0]) / (after[0] - before[0])
+        motion = len(GEOMETRY) + 1
+        end = motion + len(MOTION)
+        return (
+            before[:motion]
+            + tuple(
+                a + (b - a) * alpha
+                for a, b in zip(before[motion:end], after[motion:end])
+            )
+            + before[end:]
+        )
+
+
+async def connect(host: str, port: int, attempts: int = 50, **kwargs):
+    """Connects a `SpectatorClient`, retrying while the server starts.
+
+    Args:
+        host (str): Address of the server.
+        port (int): Port of the server.
+        attempts (int, optional): Connection attempts, 50 ms apart. Defaults
+            to 50.
+        **kwargs: Passed to `loop.create_connection()`.
+
+    Returns:
+        tuple: The transport and the client.
+    """
+    loop = asyncio.get_running_loop()
+    for attempt in range(attempts):
+        try:
+            return await loop.create_connection(SpectatorClient, host, port, **kwargs)
+        except ConnectionRefusedError:
+            if attempt == attempts - 1:
+                raise
+            await asyncio.sleep(0.05)
+
+
+async def run_test(args) -> bool:
+    """Broadcasts a headless self-play match to localhost spectators.
+
+    The match runs `--speed` times faster than the physics rate. One more spectator
+    never reads and must be dropped, the others must end on the last state of the
+    match.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments.
+
+    Returns:
+        bool: True if the spectators are in sync and the slow one was dropped.
+    """
+    from ai import ComputerOpponent
+
+    loop = asyncio.get_running_loop()
+    publisher = Publisher(args.port, PHYSICS_RATE, "127.0.0.1", args.max_queue)
+    clients = [await connect("127.0.0.1", args.port)]
+    clients += await asyncio.gather(
+        *(connect("127.0.0.1", args.port) for _ in range(args.spectators - 1))
+    )
+
+    # A spectator behind a tiny receive buffer that stops reading
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024)
+    sock.setblocking(False)
+    await loop.sock_connect(sock, ("127.0.0.1", args.port))
+    slow_transport, slow = await loop.create_connection(SpectatorClient, sock=sock)
+    slow_transport.pause_reading()
+
+    match = Match(1080.0, 1920.0)
+    match.win_score = float("inf")
+    match.start()
+    computers = (
+        ComputerOpponent("hard", seed=args.seed, side=PLAYER),
+        ComputerOpponent("hard", seed=args.seed + 1, side=OPPONENT),
+    )
+    timestep = FixedTimestep(PHYSICS_RATE * args.speed)
+    timestep.max_steps = args.speed * 4
+    publish = publisher.publish
+    frames = 0
+    total = 0.0
+    worst = 0.0
+    points = 0
+    last = perf_counter()
+    while match.tick < args.ticks:
+        await asyncio.sleep(1.0 / PHYSICS_RATE)
+        now = perf_counter()
+        steps = min(timestep.advance(now - last), args.ticks - match.tick)
+        last = now
+        elapsed = 0.0
+        for _ in range(steps):
+            for computer in computers:
+                x = computer.update(match, 1.0)
+                if x is not None:
+                    match.move_paddle(computer.side, x)
+            if match.step() & SCORED:
+                points += 1
+            start = perf_counter()
+            publish(match)
+            elapsed += perf_counter() - start
+        start = perf_counter()
+        publisher.flush()
+        elapsed += perf_counter() - start
+        frames += 1
+        total += elapsed
+        worst = max(worst, elapsed)
+
+    expected = dequantize(match.tick, quantize(read_state(match)[1:]))
+    publisher.close()
+    await asyncio.wait([client.closed for _, client in clients], timeout=5.0)
+    slow_transport.resume_reading()
+    await asyncio.wait([slow.closed], timeout=5.0)
+
+    synced = sum(
+        bool(client.states) and client.states[-1] == expected for _, client in clients
+    )
+    dropped = slow.closed.done() and isinstance(
+        slow.closed.result(), ConnectionResetError
+    )
+    received = sum(client.received for _, client in clients) / len(clients)
+    print(
+        f"{match.tick} ticks, {points} points, {publisher.published} states "
+        f"published, {publisher.dropped} dropped, publishing "
+        f"{total / frames * 1e6:.1f} us per frame, {worst * 1e6:.1f} us worst"
+    )
+    print(
+        f"{synced}/{len(clients)} spectators in sync, {received:,.0f} bytes each, "
+        f"slow spectator {'dropped' if dropped else 'NOT DROPPED'}"
+    )
+    return synced == len(clients) and dropped
+
+
+def run_viewer(args) -> None:
+    """Shows a broadcast in a window.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments.
+    """
+    from kivy.app import App
+    from kivy.clock import Clock
+    from kivy.graphics import Color, Ellipse, Rectangle
+    from kivy.uix.widget import Widget
+
+    from scoreboard import ScoreLabel
+
+    class SpectatorView(Widget):
+        """Draws the state sampled from a `SpectatorClient`."""
+
+        def __init__(self, **kwargs):
+            """Creates the drawing of the field."""
+            super().__init__(**kwargs)
+            self.client = None
+            with self.canvas:
+                Color(0, 0, 0, 1)
+                self.player_background = Rectangle()
+                Color(1, 1, 1, 1)
+                self.opponent_background = Rectangle()
+                self.player = Rectangle()
+                Color(0, 0, 0, 1)
+                self.opponent = Rectangle()
+                self.ball_color = Color(1, 1, 1, 1)
+                self.ball = Ellipse()
+            self.player_score = ScoreLabel(color=(1, 1, 1, 1))
+            self.opponent_score = ScoreLabel(color=(0, 0, 0, 1))
+            self.add_widget(self.player_score)
+            self.add_widget(self.opponent_score)
+
+        def draw(self, dt: float) -> None:
+            """Draws the next sample of the playback.
+
+            Args:
+                dt (float): Real time since the previous frame.
+            """
+            state = self.client.sample(dt) if self.client is not None else None
+            if state is None:
+                return
+            (
+                _, width, height, ball_size, paddle_width, paddle_height, player_y,
+                opponent_y, ball_x, ball_y, player_x, opponent_x, player_score,
+                opponent_score,
+            ) = state
+            scale = self.height / height
+            offset = (self.width - width * scale) / 2
+            half = self.height / 2
+            self.player_background.pos = 0, 0
+            self.player_background.size = self.width, half
+            self.opponent_background.pos = 0, half
+            self.opponent_background.size = self.width, half
+            paddle_size = paddle_width * scale, paddle_height * scale
+            self.player.pos = offset + player_x * scale, player_y * scale
+            self.player.size = paddle_size
+            self.opponent.pos = offset + opponent_x * scale, opponent_y * scale
+            self.opponent.size = paddle_size
+            self.ball.pos = offset + ball_x * scale, ball_y * scale
+            self.ball.size = ball_size * scale, ball_size * scale
+            below = ball_y + ball_size / 2 < height / 2
+            self.ball_color.rgba = (1, 1, 1, 1) if below else (0, 0, 0, 1)
+            font_size = self.height / 2 / 15
+            for label, score, y in (
+                (self.player_score, player_score, 0),
+                (self.opponent_score, opponent_score, self.height),
+            ):
+                label.font_size = font_size
+                label.score = score
+                label.center_x = self.width / 2
+                label.y = label.height if y == 0 else y - label.height * 2
+
+    class SpectatorApp(App):
+        """Window of a spectator."""
+
+        def build(self) -> SpectatorView:
+            """Creates the view and draws it at the render rate.
+
+            Returns:
+                SpectatorView: The view.
+            """
+            self.title = "Pong spectator"
+            view = SpectatorView()
+            Clock.schedule_interval(view.draw, 0)
+            return view
+
+    app = SpectatorApp()
+    host, port = parse_address(args.watch)
+
+    # noinspection PyUnusedLocal
+    def on_start(*largs) -> None:
+        async def join() -> None:
+            _, app.root.client = await connect(host, port)
+
+        asyncio.ensure_future(join())
+
+    app.bind(on_start=on_start)
+    asyncio.run(app.async_run(async_lib="asyncio"))
+
+
+def parse_address(text: str) -> tuple:
+    """Parses a "host:port" address.
+
+    Args:
+        text (str): The address.
+
+    Returns:
+        tuple: Host and port, the port defaulting to `PORT`.
+    """
+    host, _, port = text.rpartition(":")
+    if not _:
+        return text or "127.0.0.1", PORT
+    return host or "127.0.0.1", int(port)
+
+
+def main() -> None:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Spectator broadcast of Pong.")
+    parser.add_argument("--watch", metavar="HOST:PORT", help="watch a broadcast")
+    parser.add_argument("--test", action="store_true",
+                        help="broadcast a headless match to localhost spectators")
+    parser.add_argument("--serve", action="store_true",
+                        help="serve the states written to stdin, run by the game")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--rate", type=float, default=PHYSICS_RATE)
+    parser.add_argument("--max-queue", type=int, default=MAX_QUEUE, help="bytes")
+    parser.add_argument("--spectators", type=int, default=200, help="test spectators")
+    parser.add_argument("--ticks", type=int, default=12000, help="test length")
+    parser.add_argument("--speed", type=int, default=8,
+                        help="test physics steps per real step")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.serve:
+        asyncio.run(serve(args))
+    elif args.watch:
+        run_viewer(args)
+    elif args.test:
+        sys.exit(0 if asyncio.run(run_test(args)) else 1)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
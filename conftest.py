@@ -0,0 +1,14 @@
+"""pytest setup shared by the tests in `tests/`.
+
+Being at the root of the repository, this file puts the game modules on the
+import path of the tests.
+"""
+
+import os
+
+# Keep Kivy away from the pytest arguments and quiet
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+os.environ.setdefault("KIVY_NO_CONSOLELOG", "1")
+
+# A Kivy demo app, not a test module, its kv rules would clash with the game's
+collect_ignore = ["glsl_test.py"]
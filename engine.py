@@ -0,0 +1,569 @@
+"""Headless simulation core for the Pong game.
+
+The engine holds the whole match state in plain Python attributes and advances it
+one tick at a time. It does not import Kivy, so it can run bots, tests and tuning
+jobs without a window or a GL context. `PongGame` in `main.py` only copies the
+state into its widgets once per frame.
+
+Coordinates follow the Kivy convention: the origin is the bottom left corner of
+the field, the player defends the bottom edge and the opponent defends the top.
+"""
+
+from math import sqrt
+
+# Paddle sides
+PLAYER = 0
+OPPONENT = 1
+
+# Event flags returned by `Match.step()`
+PLAYER_HIT = 1
+OPPONENT_HIT = 2
+WALL_HIT = 4
+PLAYER_SCORED = 8
+OPPONENT_SCORED = 16
+GAME_OVER = 32
+SCORED = PLAYER_SCORED | OPPONENT_SCORED
+
+# Velocities are in units per base tick, the original 1/120 s Clock interval
+BASE_TICK_RATE = 120.0
+
+# Game rules
+SPEED_MULTIPLIER = 1.2
+SERVE_SPEED = 4.0
+WIN_SCORE = 3
+
+# Height of the field in field units, the view maps them to pixels when drawing.
+# The width follows the aspect ratio of the screen, so a match plays the same at
+# every resolution.
+FIELD_HEIGHT = 1000.0
+
+# Upper bound on the bounces resolved within one tick in continuous mode
+MAX_BOUNCES = 8
+
+
+class Match:
+    """The state and rules of a single Pong match.
+
+    The layout defaults mirror the kv rules in `main.py`: the ball is 1/30 of the
+    field height, paddles are 1/6 of the field width and 1/36 of the field height,
+    and both paddles sit 1/10 of the field height away from their edge (where the
+    score labels are). The view passes the real paddle rows to `resize()` once the
+    labels are laid out.
+
+    By default a tick moves the ball and then tests for overlaps, like the original
+    widget code did. In continuous mode the ball is swept along its path instead:
+    the exact time of impact with the walls and paddles is solved within the tick,
+    and several bounces per tick are resolved in order. The ball can't tunnel
+    through a paddle at any speed, so ticks can be long and the paddles may move
+    freely while the ball is close to them.
+
+    Attributes:
+        width (float): Width of the field.
+        height (float): Height of the field.
+        ball_size (float): Diameter of the ball.
+        paddle_width (float): Width of both paddles.
+        paddle_height (float): Height of both paddles.
+        player_y (float): Bottom edge of the player's paddle.
+        opponent_y (float): Bottom edge of the opponent's paddle.
+        ball_x (float): Left edge of the ball.
+        ball_y (float): Bottom edge of the ball.
+        vx (float): Horizontal velocity of the ball, in units per tick.
+        vy (float): Vertical velocity of the ball, in units per tick.
+        hit_x (float): Horizontal center of the ball where it touched a paddle,
+            at the latest paddle hit.
+        player_x (float): Left edge of the player's paddle.
+        opponent_x (float): Left edge of the opponent's paddle.
+        player_score (int): The player's score.
+        opponent_score (int): The opponent's score.
+        started (bool): Whether the match is running.
+        tick (int): Number of ticks simulated while the match was running.
+        serve_speed (float): Per-axis speed of a serve.
+        speed_multiplier (float): Speed-up applied on every paddle hit.
+        win_score (int): Score that ends the match.
+        continuous (bool): Whether collisions are swept along the ball path.
+    """
+
+    __slots__ = (
+        "width",
+        "height",
+        "ball_size",
+        "paddle_width",
+        "paddle_height",
+        "player_y",
+        "opponent_y",
+        "ball_x",
+        "ball_y",
+        "vx",
+        "vy",
+        "hit_x",
+        "player_x",
+        "opponent_x",
+        "player_score",
+        "opponent_score",
+        "started",
+        "tick",
+        "serve_speed",
+        "speed_multiplier",
+        "win_score",
+        "continuous",
+    )
+
+    def __init__(
+        self,
+        width: float = 1000.0,
+        height: float = FIELD_HEIGHT,
+        serve_speed: float = SERVE_SPEED,
+        speed_multiplier: float = SPEED_MULTIPLIER,
+        win_score: int = WIN_SCORE,
+        continuous: bool = False,
+    ):
+        """Initializes the match and serves the ball towards the player.
+
+        Args:
+            width (float, optional): Width of the field. Defaults to 1000.
+            height (float, optional): Height of the field. Defaults to 1000.
+            serve_speed (float, optional): Per-axis speed of a serve. Defaults to 4.
+            speed_multiplier (float, optional): Speed-up applied on paddle hits.
+                Defaults to 1.2.
+            win_score (int, optional): Score that ends the match. Defaults to 3.
+            continuous (bool, optional): Sweep collisions along the ball path.
+                Defaults to False.
+        """
+        self.width = 0.0
+        self.height = 0.0
+        self.serve_speed = serve_speed
+        self.speed_multiplier = speed_multiplier
+        self.win_score = win_score
+        self.continuous = continuous
+        self.player_score = 0
+        self.opponent_score = 0
+        self.started = False
+        self.tick = 0
+        self.vx = 0.0
+        self.vy = 0.0
+        self.hit_x = 0.0
+        self.resize(width, height)
+        self.serve(PLAYER)
+
+    def resize(
+        self,
+        width: float,
+        height: float,
+        player_y: float = None,
+        opponent_y: float = None,
+    ) -> None:
+        """Updates the field geometry.
+
+        A change of the field size recentres the ball and both paddles, the same way
+        the kv bindings do for the widgets.
+
+        Args:
+            width (float): Width of the field.
+            height (float): Height of the field.
+            player_y (float, optional): Bottom edge of the player's paddle. Defaults
+                to 1/10 of the field height.
+            opponent_y (float, optional): Bottom edge of the opponent's paddle.
+                Defaults to 1/10 of the field height below the top edge.
+        """
+        self.ball_size = height / 30
+        self.paddle_width = width / 6
+        self.paddle_height = height / 2 / 18
+        self.player_y = height / 10 if player_y is None else player_y
+        if opponent_y is None:
+            opponent_y = height - height / 10 - self.paddle_height
+        self.opponent_y = opponent_y
+        if width != self.width or height != self.height:
+            self.width = width
+            self.height = height
+            self.center_ball()
+            self.player_x = self.opponent_x = (width - self.paddle_width) / 2
+
+    def center_ball(self) -> None:
+        """Moves the ball to the center of the field."""
+        self.ball_x = (self.width - self.ball_size) / 2
+        self.ball_y = (self.height - self.ball_size) / 2
+
+    def serve(self, towards: int = PLAYER) -> None:
+        """Serves the ball from the center of the field.
+
+        Args:
+            towards (int, optional): `PLAYER` serves downwards, `OPPONENT` serves
+                upwards. Defaults to `PLAYER`.
+        """
+        self.center_ball()
+        self.vx = self.serve_speed
+        self.vy = -self.serve_speed if towards == PLAYER else self.serve_speed
+
+    def start(self) -> None:
+        """Resets the scores and starts the match."""
+        self.player_score = 0
+        self.opponent_score = 0
+        self.started = True
+
+    def side_at(self, y: float):
+        """Returns the side of the field a vertical position belongs to.
+
+        Args:
+            y (float): Vertical position, e.g. of a touch.
+
+        Returns:
+            int | None: `PLAYER`, `OPPONENT` or None exactly on the center line.
+        """
+        half = self.height / 2
+        if y < half:
+            return PLAYER
+        if y > half:
+            return OPPONENT
+        return None
+
+    def move_paddle(self, side: int, target_x: float) -> bool:
+        """Centers a paddle on `target_x`, clipped to the field.
+
+        In discrete mode the paddle stays put while the ball is within one radius of
+        its inner edge, otherwise the paddle could be moved over the ball and tunnel
+        it. Continuous mode resolves such overlaps, so the paddle always follows.
+
+        Args:
+            side (int): `PLAYER` or `OPPONENT`.
+            target_x (float): Requested horizontal center of the paddle.
+
+        Returns:
+            bool: True if the paddle was moved.
+        """
+        if not self.continuous:
+            radius = self.ball_size / 2
+            ball_center_y = self.ball_y + radius
+            if side == PLAYER:
+                if ball_center_y - (self.player_y + self.paddle_height) <= radius:
+                    return False
+            elif self.opponent_y - ball_center_y <= radius:
+                return False
+
+        half_paddle = self.paddle_width / 2
+        if half_paddle < target_x < self.width - half_paddle:
+            x = target_x - half_paddle
+        elif target_x < half_paddle:
+            x = 0.0
+        elif target_x > self.width - half_paddle:
+            x = self.width - self.paddle_width
+        else:
+            return False
+
+        if side == PLAYER:
+            self.player_x = x
+        else:
+            self.opponent_x = x
+        return True
+
+    def step(self, dt: float = 1.0) -> int:
+        """Advances the match by one tick.
+
+        Moves the ball, bounces it off the paddles and the side walls, and handles
+        scoring and the end of the match.
+
+        Args:
+            dt (float, optional): Length of the tick in units of the base tick, the
+                ball moves `dt` times its velocity. Values above 1 are only safe in
+                continuous mode. Defaults to 1.
+
+        Returns:
+            int: Bitwise OR of the event flags that happened during the tick.
+        """
+        if not self.started:
+            return 0
+        if self.continuous:
+            events = self._sweep(dt)
+        else:
+            events = 0
+            self.ball_x += self.vx * dt
+            self.ball_y += self.vy * dt
+
+            # Bounce off paddles
+            if self._bounce(self.player_x, self.player_y):
+                events |= PLAYER_HIT
+            if self._bounce(self.opponent_x, self.opponent_y):
+                events |= OPPONENT_HIT
+
+            # Bounce off sides
+            if self.ball_x < 0 or self.ball_x + self.ball_size > self.width:
+                self.vx = -self.vx
+                events |= WALL_HIT
+
+        # Scoring
+        if self.ball_y + self.ball_size > self.height:
+            self.player_score += 1
+            self.serve(OPPONENT)
+            events |= PLAYER_SCORED
+        if self.ball_y < 0:
+            self.opponent_score += 1
+            self.serve(PLAYER)
+            events |= OPPONENT_SCORED
+
+        # Game end condition
+        if events & SCORED and (
+            self.player_score == self.win_score
+            or self.opponent_score == self.win_score
+        ):
+            self.started = False
+            events |= GAME_OVER
+
+        self.tick += 1
+        return events
+
+    def snapshot(self) -> tuple:
+        """Returns the whole match state, for `restore()`.
+
+        Returns:
+            tuple: Values of all the attributes, in `__slots__` order.
+        """
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def restore(self, state: tuple) -> None:
+        """Puts the match back into a state returned by `snapshot()`.
+
+        Args:
+            state (tuple): The state.
+        """
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+    def _bounce(self, paddle_x: float, paddle_y: float) -> bool:
+        """Reflects the ball off a paddle if they overlap.
+
+        The ball velocity is reflected across the normal from the closest point of
+        the paddle rectangle to the ball center, and sped up unless the reflection
+        is nearly vertical relative to the paddle height.
+
+        Args:
+            paddle_x (float): Left edge of the paddle.
+            paddle_y (float): Bottom edge of the paddle.
+
+        Returns:
+            bool: True if the ball was bounced.
+        """
+        size = self.ball_size
+        bx = self.ball_x
+        by = self.ball_y
+        paddle_right = paddle_x + self.paddle_width
+        paddle_top = paddle_y + self.paddle_height
+        if (
+            paddle_right < bx
+            or paddle_x > bx + size
+            or paddle_top < by
+            or paddle_y > by + size
+        ):
+            return False
+
+        # Normal from the closest point on the paddle to the ball center
+        cx = bx + size / 2
+        cy = by + size / 2
+        nx = cx - max(paddle_x, min(cx, paddle_right))
+        ny = cy - max(paddle_y, min(cy, paddle_top))
+        self.hit_x = cx
+        self._reflect(nx, ny)
+        return True
+
+    def _reflect(self, nx: float, ny: float) -> None:
+        """Reflects the ball velocity across a paddle normal.
+
+        The velocity is sped up unless the reflection is nearly vertical relative to
+        the paddle height.
+
+        Args:
+            nx (float): Horizontal component of the normal, need not be normalized.
+            ny (float): Vertical component of the normal, need not be normalized.
+        """
+        if nx or ny:
+            length = sqrt(nx * nx + ny * ny)
+            nx /= length
+            ny /= length
+
+        # Reflect the velocity across the normal, assuming a stationary paddle
+        vx = self.vx
+        vy = self.vy
+        dot = vx * nx + vy * ny
+        rx = vx - 2 * dot * nx
+        ry = vy - 2 * dot * ny
+        if abs(ry) < self.paddle_height:
+            rx *= self.speed_multiplier
+            ry *= self.speed_multiplier
+        self.vx = rx
+        self.vy = ry
+
+    def _sweep(self, dt: float) -> int:
+        """Moves the ball along its path for `dt`, bouncing at each exact impact.
+
+        Every iteration finds the earliest impact with a side wall or a paddle within
+        the rest of the tick, moves the ball there and reflects it. At most
+        `MAX_BOUNCES` impacts are resolved, the ball then moves freely for the rest of
+        the tick.
+
+        Args:
+            dt (float): Length of the tick in units of the base tick.
+
+        Returns:
+            int: Bitwise OR of the hit flags that happened during the tick.
+        """
+        events = 0
+        radius = self.ball_size / 2
+        cx = self.ball_x + radius
+        cy = self.ball_y + radius
+        remaining = dt
+        paddles = (
+            (PLAYER_HIT, self.player_x, self.player_y),
+            (OPPONENT_HIT, self.opponent_x, self.opponent_y),
+        )
+        for _ in range(MAX_BOUNCES):
+            vx = self.vx
+            vy = self.vy
+            impact = remaining
+            hit = 0
+
+            # Side walls
+            if vx < 0:
+                t = (radius - cx) / vx
+            elif vx > 0:
+                t = (self.width - radius - cx) / vx
+            else:
+                t = impact
+            if t < impact:
+                impact = max(t, 0.0)
+                hit = WALL_HIT
+
+            # Paddles
+            for flag, paddle_x, paddle_y in paddles:
+                t = self._time_of_impact(cx, cy, radius, paddle_x, paddle_y, impact)
+                if t is not None and (t < impact or not hit):
+                    impact = t
+                    hit = flag
+                    hit_x = paddle_x
+                    hit_y = paddle_y
+
+            cx += vx * impact
+            cy += vy * impact
+            remaining -= impact
+            if not hit:
+                break
+            events |= hit
+            if hit == WALL_HIT:
+                self.vx = -vx
+            else:
+                self.hit_x = cx
+                self._reflect(*self._normal(cx, cy, hit_x, hit_y))
+        else:
+            cx += self.vx * remaining
+            cy += self.vy * remaining
+
+        self.ball_x = cx - radius
+        self.ball_y = cy - radius
+        return events
+
+    def _normal(self, cx: float, cy: float, paddle_x: float, paddle_y: float):
+        """Returns the collision normal of a paddle at a ball center.
+
+        The normal points from the closest point on the paddle to the ball center.
+        If the center is inside the paddle it points vertically away from the
+        paddle's middle.
+
+        Args:
+            cx (float): Horizontal position of the ball center.
+            cy (float): Vertical position of the ball center.
+            paddle_x (float): Left edge of the paddle.
+            paddle_y (float): Bottom edge of the paddle.
+
+        Returns:
+            tuple[float, float]: The normal, not normalized.
+        """
+        nx = cx - max(paddle_x, min(cx, paddle_x + self.paddle_width))
+        ny = cy - max(paddle_y, min(cy, paddle_y + self.paddle_height))
+        if not (nx or ny):
+            ny = 1.0 if cy >= paddle_y + self.paddle_height / 2 else -1.0
+        return nx, ny
+
+    def _time_of_impact(
+        self,
+        cx: float,
+        cy: float,
+        radius: float,
+        paddle_x: float,
+        paddle_y: float,
+        limit: float,
+    ):
+        """Solves when the moving ball first touches a paddle.
+
+        The ball center is traced as a ray against the paddle rectangle grown by the
+        ball radius. Hits on the grown faces are final; hits in a corner region are
+        solved against the circle around that corner of the paddle. A ball that
+        already touches the paddle hits it immediately if it moves towards it.
+
+        Args:
+            cx (float): Horizontal position of the ball center.
+            cy (float): Vertical position of the ball center.
+            radius (float): Radius of the ball.
+            paddle_x (float): Left edge of the paddle.
+            paddle_y (float): Bottom edge of the paddle.
+            limit (float): Latest time of interest.
+
+        Returns:
+            float | None: Time of impact in `[0, limit]`, or None if the ball does not
+            reach the paddle in time.
+        """
+        vx = self.vx
+        vy = self.vy
+        right = paddle_x + self.paddle_width
+        top = paddle_y + self.paddle_height
+
+        # The path doesn't reach the paddle row
+        reach = vy * limit
+        if (
+            cy + radius + max(reach, 0.0) < paddle_y
+            or cy - radius + min(reach, 0.0) > top
+        ):
+            return None
+
+        # Already touching
+        nx, ny = self._normal(cx, cy, paddle_x, paddle_y)
+        if nx * nx + ny * ny <= radius * radius:
+            return 0.0 if vx * nx + vy * ny < 0 else None
+
+        # Slabs of the grown rectangle
+        enter = float("-inf")
+        leave = float("inf")
+        for c, v, low, high in (
+            (cx, vx, paddle_x - radius, right + radius),
+            (cy, vy, paddle_y - radius, top + radius),
+        ):
+            if v:
+                t1 = (low - c) / v
+                t2 = (high - c) / v
+                if t1 > t2:
+                    t1, t2 = t2, t1
+                enter = max(enter, t1)
+                leave = min(leave, t2)
+            elif c < low or c > high:
+                return None
+        if enter > leave or enter > limit or leave < 0:
+            return None
+
+        t = max(enter, 0.0)
+        hx = cx + vx * t
+        hy = cy + vy * t
+        if paddle_x <= hx <= right or paddle_y <= hy <= top:
+            if enter < 0:
+                # Inside the grown faces, i.e. touching up to rounding
+                return 0.0 if vx * nx + vy * ny < 0 else None
+            return t
+
+        # Corner region, solve against the circle around the corner
+        dx = cx - (paddle_x if hx < paddle_x else right)
+        dy = cy - (paddle_y if hy < paddle_y else top)
+        a = vx * vx + vy * vy
+        b = dx * vx + dy * vy
+        c = dx * dx + dy * dy - radius * radius
+        discriminant = b * b - a * c
+        if discriminant < 0:
+            return None
+        t = (-b - sqrt(discriminant)) / a
+        if 0 <= t <= limit:
+            return t
+        return None
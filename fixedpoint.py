@@ -0,0 +1,556 @@
+"""Deterministic fixed-point physics for lockstep play across devices.
+
+`engine.Match` simulates in floats. Its results can differ in the last bits between
+devices, e.g. when a compiler fuses a multiply and an add on ARM but not on x86 or
+when a square root is computed differently, and a networked match then slowly
+drifts apart. `FixedMatch` plays the discrete rules of `engine.Match` with the whole
+state held as integers in fixed point, `ONE` per field unit:
+
+- the ball moves by whole fixed-point steps,
+- the closest-point reflection is solved exactly on integer vectors, without
+  normalizing the normal, and rounded half away from zero,
+- the speed-up is the speed multiplier as an exact fraction, 6/5 for 1.2.
+
+Python integers never overflow or round differently, so a match fed the same inputs
+ends in the same state, bit for bit, on every device. Peers then only need to
+exchange inputs plus a hash of the state now and then, see `state_hash()`.
+
+`FixedMatch` has the interface of `engine.Match`, and its geometry, ball and paddle
+attributes read as floats in field units, so the view, the computer opponent and
+`netplay.py` use it unchanged. Inputs are rounded to the fixed-point grid.
+
+Compare the throughput of both paths and check that fresh interpreters reach the
+same state hashes as the reference:
+
+    python fixedpoint.py --runs 3
+"""
+
+import argparse
+import random
+import subprocess
+import sys
+from fractions import Fraction
+from hashlib import sha1
+from time import perf_counter
+
+from engine import (
+    FIELD_HEIGHT,
+    GAME_OVER,
+    OPPONENT,
+    OPPONENT_HIT,
+    OPPONENT_SCORED,
+    PLAYER,
+    PLAYER_HIT,
+    PLAYER_SCORED,
+    SCORED,
+    SERVE_SPEED,
+    SPEED_MULTIPLIER,
+    WALL_HIT,
+    WIN_SCORE,
+    Match,
+)
+
+# Fixed-point resolution, 16 fractional bits per field unit
+SHIFT = 16
+ONE = 1 << SHIFT
+
+# Largest denominator of the speed multiplier fraction
+MAX_DENOMINATOR = 1000
+
+# Ticks between two state hashes of `play()`
+HASH_INTERVAL = 1200
+
+# Chained state hash of `play()` with the command line defaults, on every device
+REFERENCE_HASH = "6ff4ac95fc79e102"
+
+
+def to_fixed(value: float) -> int:
+    """Rounds a value in field units to the fixed-point grid.
+
+    Multiplying by a power of two is exact, so the result only depends on the value.
+
+    Args:
+        value (float): The value.
+
+    Returns:
+        int: The value in fixed point.
+    """
+    return round(value * ONE)
+
+
+def divide(a: int, b: int) -> int:
+    """Divides integers, rounding half away from zero.
+
+    Unlike floor division, the rounding is symmetric, so mirrored situations stay
+    mirrored.
+
+    Args:
+        a (int): Dividend.
+        b (int): Divisor, positive.
+
+    Returns:
+        int: The rounded quotient.
+    """
+    quotient = (abs(a) * 2 + b) // (b * 2)
+    return quotient if a >= 0 else -quotient
+
+
+def _field_units(name: str) -> property:
+    """Returns a property reading a fixed-point slot in field units.
+
+    Args:
+        name (str): Name of the slot.
+
+    Returns:
+        property: The read-only property.
+    """
+    return property(lambda self: getattr(self, name) / ONE)
+
+
+class FixedMatch:
+    """The discrete rules of `engine.Match` in integer fixed point.
+
+    The fixed-point state is held in the underscored slots, `ONE` per field unit.
+    The attributes below read it in field units, see `engine.Match` for their
+    meaning.
+
+    Attributes:
+        width (float): Width of the field.
+        height (float): Height of the field.
+        ball_size (float): Diameter of the ball.
+        paddle_width (float): Width of both paddles.
+        paddle_height (float): Height of both paddles.
+        player_y (float): Bottom edge of the player's paddle.
+        opponent_y (float): Bottom edge of the opponent's paddle.
+        ball_x (float): Left edge of the ball.
+        ball_y (float): Bottom edge of the ball.
+        vx (float): Horizontal velocity of the ball, in units per tick.
+        vy (float): Vertical velocity of the ball, in units per tick.
+        hit_x (float): Horizontal center of the ball where it touched a paddle,
+            read after the step of the hit, which leaves the ball there.
+        player_x (float): Left edge of the player's paddle.
+        opponent_x (float): Left edge of the opponent's paddle.
+        serve_speed (float): Per-axis speed of a serve.
+        player_score (int): The player's score.
+        opponent_score (int): The opponent's score.
+        started (bool): Whether the match is running.
+        tick (int): Number of ticks simulated while the match was running.
+        speed_multiplier (float): Speed-up applied on every paddle hit.
+        win_score (int): Score that ends the match.
+        continuous (bool): Always False, there is no continuous mode.
+    """
+
+    __slots__ = (
+        "_width",
+        "_height",
+        "_ball_size",
+        "_paddle_width",
+        "_paddle_height",
+        "_player_y",
+        "_opponent_y",
+        "_ball_x",
+        "_ball_y",
+        "_vx",
+        "_vy",
+        "_player_x",
+        "_opponent_x",
+        "_serve_speed",
+        "_numerator",
+        "_denominator",
+        "_dt",
+        "player_score",
+        "opponent_score",
+        "started",
+        "tick",
+        "speed_multiplier",
+        "win_score",
+    )
+
+    continuous = False
+
+    width = _field_units("_width")
+    height = _field_units("_height")
+    ball_size = _field_units("_ball_size")
+    paddle_width = _field_units("_paddle_width")
+    paddle_height = _field_units("_paddle_height")
+    player_y = _field_units("_player_y")
+    opponent_y = _field_units("_opponent_y")
+    ball_x = _field_units("_ball_x")
+    ball_y = _field_units("_ball_y")
+    vx = _field_units("_vx")
+    vy = _field_units("_vy")
+    player_x = _field_units("_player_x")
+    opponent_x = _field_units("_opponent_x")
+    serve_speed = _field_units("_serve_speed")
+
+    @property
+    def hit_x(self) -> float:
+        """Horizontal center of the ball, where a paddle hit leaves it."""
+        return (self._ball_x * 2 + self._ball_size) / (ONE * 2)
+
+    def __init__(
+        self,
+        width: float = 1000.0,
+        height: float = FIELD_HEIGHT,
+        serve_speed: float = SERVE_SPEED,
+        speed_multiplier: float = SPEED_MULTIPLIER,
+        win_score: int = WIN_SCORE,
+    ):
+        """Initializes the match and serves the ball towards the player.
+
+        Args:
+            width (float, optional): Width of the field. Defaults to 1000.
+            height (float, optional): Height of the field. Defaults to 1000.
+            serve_speed (float, optional): Per-axis speed of a serve. Defaults to 4.
+            speed_multiplier (float, optional): Speed-up applied on paddle hits,
+                as the nearest fraction with a denominator up to 1000. Defaults
+                to 1.2.
+            win_score (int, optional): Score that ends the match. Defaults to 3.
+        """
+        fraction = Fraction(speed_multiplier).limit_denominator(MAX_DENOMINATOR)
+        self._numerator = fraction.numerator
+        self._denominator = fraction.denominator
+        self.speed_multiplier = speed_multiplier
+        self._serve_speed = to_fixed(serve_speed)
+        self.win_score = win_score
+        self._width = 0
+        self._height = 0
+        self._dt = (1.0, ONE)
+        self.player_score = 0
+        self.opponent_score = 0
+        self.started = False
+        self.tick = 0
+        self._vx = 0
+        self._vy = 0
+        self.resize(width, height)
+        self.serve(PLAYER)
+
+    def resize(
+        self,
+        width: float,
+        height: float,
+        player_y: float = None,
+        opponent_y: float = None,
+    ) -> None:
+        """Updates the field geometry, see `engine.Match.resize()`.
+
+        Args:
+            width (float): Width of the field.
+            height (float): Height of the field.
+            player_y (float, optional): Bottom edge of the player's paddle. Defaults
+                to 1/10 of the field height.
+            opponent_y (float, optional): Bottom edge of the opponent's paddle.
+                Defaults to 1/10 of the field height below the top edge.
+        """
+        width = to_fixed(width)
+        height = to_fixed(height)
+        self._ball_size = height // 30
+        self._paddle_width = width // 6
+        self._paddle_height = height // 36
+        if player_y is None:
+            self._player_y = height // 10
+        else:
+            self._player_y = to_fixed(player_y)
+        if opponent_y is None:
+            self._opponent_y = height - height // 10 - self._paddle_height
+        else:
+            self._opponent_y = to_fixed(opponent_y)
+        if width != self._width or height != self._height:
+            self._width = width
+            self._height = height
+            self.center_ball()
+            self._player_x = self._opponent_x = (width - self._paddle_width) // 2
+
+    def center_ball(self) -> None:
+        """Moves the ball to the center of the field."""
+        self._ball_x = (self._width - self._ball_size) // 2
+        self._ball_y = (self._height - self._ball_size) // 2
+
+    def serve(self, towards: int = PLAYER) -> None:
+        """Serves the ball from the center of the field.
+
+        Args:
+            towards (int, optional): `PLAYER` serves downwards, `OPPONENT` serves
+                upwards. Defaults to `PLAYER`.
+        """
+        self.center_ball()
+        self._vx = self._serve_speed
+        self._vy = -self._serve_speed if towards == PLAYER else self._serve_speed
+
+    def start(self) -> None:
+        """Resets the scores and starts the match."""
+        self.player_score = 0
+        self.opponent_score = 0
+        self.started = True
+
+    def side_at(self, y: float):
+        """Returns the side of the field a vertical position belongs to.
+
+        Args:
+            y (float): Vertical position, e.g. of a touch.
+
+        Returns:
+            int | None: `PLAYER`, `OPPONENT` or None exactly on the center line.
+        """
+        y = to_fixed(y) * 2
+        if y < self._height:
+            return PLAYER
+        if y > self._height:
+            return OPPONENT
+        return None
+
+    def move_paddle(self, side: int, target_x: float) -> bool:
+        """Centers a paddle on `target_x`, clipped to the field.
+
+        The paddle stays put while the ball is level with or behind its inner edge,
+        like in the discrete mode of `engine.Match`.
+
+        Args:
+            side (int): `PLAYER` or `OPPONENT`.
+            target_x (float): Requested horizontal center of the paddle.
+
+        Returns:
+            bool: True if the paddle was moved.
+        """
+        if side == PLAYER:
+            if self._ball_y <= self._player_y + self._paddle_height:
+                return False
+        elif self._opponent_y <= self._ball_y + self._ball_size:
+            return False
+
+        x = to_fixed(target_x) - self._paddle_width // 2
+        x = max(0, min(x, self._width - self._paddle_width))
+        if side == PLAYER:
+            self._player_x = x
+        else:
+            self._opponent_x = x
+        return True
+
+    def step(self, dt: float = 1.0) -> int:
+        """Advances the match by one tick.
+
+        Args:
+            dt (float, optional): Length of the tick in units of the base tick,
+                rounded to the fixed-point grid. Defaults to 1.
+
+        Returns:
+            int: Bitwise OR of the event flags that happened during the tick.
+        """
+        if not self.started:
+            return 0
+        events = 0
+        if dt == 1.0:
+            self._ball_x += self._vx
+            self._ball_y += self._vy
+        else:
+            if self._dt[0] != dt:
+                self._dt = dt, to_fixed(dt)
+            fixed_dt = self._dt[1]
+            # Rounded like the reflections, a shift would floor towards -inf and
+            # drift the ball left and down
+            self._ball_x += divide(self._vx * fixed_dt, ONE)
+            self._ball_y += divide(self._vy * fixed_dt, ONE)
+
+        # Bounce off paddles
+        if self._bounce(self._player_x, self._player_y):
+            events |= PLAYER_HIT
+        if self._bounce(self._opponent_x, self._opponent_y):
+            events |= OPPONENT_HIT
+
+        # Bounce off sides
+        if self._ball_x < 0 or self._ball_x + self._ball_size > self._width:
+            self._vx = -self._vx
+            events |= WALL_HIT
+
+        # Scoring
+        if self._ball_y + self._ball_size > self._height:
+            self.player_score += 1
+            self.serve(OPPONENT)
+            events |= PLAYER_SCORED
+        if self._ball_y < 0:
+            self.opponent_score += 1
+            self.serve(PLAYER)
+            events |= OPPONENT_SCORED
+
+        # Game end condition
+        if events & SCORED and (
+            self.player_score == self.win_score
+            or self.opponent_score == self.win_score
+        ):
+            self.started = False
+            events |= GAME_OVER
+
+        self.tick += 1
+        return events
+
+    def snapshot(self) -> tuple:
+        """Returns the whole match state, for `restore()`.
+
+        Returns:
+            tuple: Values of all the slots, in `__slots__` order.
+        """
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def restore(self, state: tuple) -> None:
+        """Puts the match back into a state returned by `snapshot()`.
+
+        Args:
+            state (tuple): The state.
+        """
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+    def _bounce(self, paddle_x: int, paddle_y: int) -> bool:
+        """Reflects the ball off a paddle if they overlap.
+
+        The normal is taken in doubled coordinates, so the ball center stays on the
+        integer grid. Its length doesn't matter to `_reflect()`.
+
+        Args:
+            paddle_x (int): Left edge of the paddle.
+            paddle_y (int): Bottom edge of the paddle.
+
+        Returns:
+            bool: True if the ball was bounced.
+        """
+        size = self._ball_size
+        bx = self._ball_x
+        by = self._ball_y
+        paddle_right = paddle_x + self._paddle_width
+        paddle_top = paddle_y + self._paddle_height
+        if (
+            paddle_right < bx
+            or paddle_x > bx + size
+            or paddle_top < by
+            or paddle_y > by + size
+        ):
+            return False
+
+        # Normal from the closest point on the paddle to the ball center
+        cx = bx * 2 + size
+        cy = by * 2 + size
+        nx = cx - max(paddle_x * 2, min(cx, paddle_right * 2))
+        ny = cy - max(paddle_y * 2, min(cy, paddle_top * 2))
+        self._reflect(nx, ny)
+        return True
+
+    def _reflect(self, nx: int, ny: int) -> None:
+        """Reflects the ball velocity across a paddle normal, exactly.
+
+        `v - 2 (v.n) n / (n.n)` is the reflection across the normalized normal
+        without the square root. The velocity is sped up unless the reflection is
+        nearly vertical relative to the paddle height.
+
+        Args:
+            nx (int): Horizontal component of the normal, need not be normalized.
+            ny (int): Vertical component of the normal, need not be normalized.
+        """
+        rx = self._vx
+        ry = self._vy
+        length = nx * nx + ny * ny
+        if length:
+            dot = (rx * nx + ry * ny) * 2
+            rx -= divide(dot * nx, length)
+            ry -= divide(dot * ny, length)
+        if abs(ry) < self._paddle_height:
+            rx = divide(rx * self._numerator, self._denominator)
+            ry = divide(ry * self._numerator, self._denominator)
+        self._vx = rx
+        self._vy = ry
+
+
+def state_hash(match) -> str:
+    """Returns a short hash of the whole state of a match.
+
+    Args:
+        match (FixedMatch | engine.Match): The match.
+
+    Returns:
+        str: First 16 hex digits of the SHA-1 of the state.
+    """
+    return sha1(repr(match.snapshot()).encode()).hexdigest()[:16]
+
+
+def play(match, ticks: int, seed: int) -> tuple:
+    """Plays a match with random paddle inputs, restarting it whenever it ends.
+
+    Args:
+        match (FixedMatch | engine.Match): The match.
+        ticks (int): Ticks to simulate.
+        seed (int): Seed of the inputs.
+
+    Returns:
+        tuple: Hash of the state chained over every `HASH_INTERVAL` ticks, and the
+        elapsed seconds.
+    """
+    rng = random.Random(seed)
+    width = match.width
+    inputs = [
+        (rng.random() < 0.3, rng.random() < 0.3, rng.uniform(0.0, width))
+        for _ in range(ticks)
+    ]
+    digest = ""
+    step = match.step
+    move_paddle = match.move_paddle
+    start = perf_counter()
+    for tick, (move_player, move_opponent, target_x) in enumerate(inputs):
+        if not match.started:
+            match.start()
+        if move_player:
+            move_paddle(PLAYER, target_x)
+        if move_opponent:
+            move_paddle(OPPONENT, width - target_x)
+        step()
+        if tick % HASH_INTERVAL == HASH_INTERVAL - 1:
+            digest = state_hash(match) + digest[:16]
+            digest = sha1(digest.encode()).hexdigest()[:16]
+    return digest, perf_counter() - start
+
+
+def main() -> None:
+    """Command line entry point, exits with status 1 if a hash differs."""
+    parser = argparse.ArgumentParser(description="Fixed-point Pong physics.")
+    parser.add_argument("--ticks", type=int, default=120_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--runs", type=int, default=0, help="fresh interpreters to compare with"
+    )
+    parser.add_argument("--hash", action="store_true", help="only print the hash")
+    args = parser.parse_args()
+
+    digest, fixed = play(FixedMatch(562.5, FIELD_HEIGHT), args.ticks, args.seed)
+    if args.hash:
+        print(digest)
+        return
+    _, floating = play(Match(562.5, FIELD_HEIGHT), args.ticks, args.seed)
+    print(
+        f"float {args.ticks / floating:,.0f} ticks/s, "
+        f"fixed {args.ticks / fixed:,.0f} ticks/s ({floating / fixed:.2f}x)"
+    )
+
+    digests = {digest}
+    for _ in range(args.runs):
+        result = subprocess.run(
+            [sys.executable, __file__, "--hash", "--ticks", str(args.ticks),
+             "--seed", str(args.seed)],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        digests.add(result.stdout.strip())
+    print(f"state hash {digest}, {args.runs} fresh runs", end="")
+    failed = len(digests) > 1
+    if failed:
+        print(f", DIFFERENT: {sorted(digests)}")
+    else:
+        print(", identical")
+    defaults = args.ticks == parser.get_default("ticks") and not args.seed
+    if defaults:
+        matches = digest == REFERENCE_HASH
+        print("reference hash", "matches" if matches else "DIFFERS")
+        failed = failed or not matches
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
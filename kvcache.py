@@ -0,0 +1,172 @@
+"""Cached loading of kv rules.
+
+`Builder.load_string()` tokenizes the kv source and compiles every property
+expression on each launch. `load_rules()` does that once: the parsed rules, with
+their compiled expressions, are pickled into `__pycache__` next to the module that
+owns them, keyed by a hash of the source, the Kivy version and the Python version.
+Later launches unpickle the rules and register them with the Builder directly.
+
+Only rules are supported (no root widget), which is how `main.py` uses kv. Sources
+with directives (`#:import`, `#:set`...) aren't cached, the directives run while
+parsing and a cached load would skip them. The registration relies on private
+parts of the Builder, so it is only done on the Kivy versions it was checked
+against, `KIVY_VERSIONS`. Cache files are unpickled with only the kv parser
+classes allowed. Any problem with the cache, an unreadable file, an unexpected
+class or another Kivy, falls back to `Builder.load_string()`. Writing a cache file
+deletes the stale ones of the source.
+"""
+
+import copyreg
+import io
+import marshal
+import os
+import pickle
+import sys
+import types
+from hashlib import sha1
+
+import kivy
+from kivy.factory import Factory
+from kivy.lang import Builder, Parser
+
+# Major Kivy versions whose Builder internals the cached registration was checked
+# against
+KIVY_VERSIONS = (2,)
+
+# The classes a cache file may contain, besides the marshalled code
+PICKLED_CLASSES = {
+    ("collections", "OrderedDict"),
+    ("kivy.lang.parser", "Parser"),
+    ("kivy.lang.parser", "ParserRule"),
+    ("kivy.lang.parser", "ParserRuleProperty"),
+    ("kivy.lang.parser", "ParserSelectorClass"),
+    ("kivy.lang.parser", "ParserSelectorName"),
+    ("marshal", "loads"),
+}
+
+
+class RulesUnpickler(pickle.Unpickler):
+    """Unpickles cache files, refusing anything but the parsed rules."""
+
+    def find_class(self, module: str, name: str):
+        if (module, name) not in PICKLED_CLASSES:
+            raise pickle.UnpicklingError(f"{module}.{name} isn't a kv rule part")
+        return super().find_class(module, name)
+
+
+def _reduce_code(code: types.CodeType):
+    """Pickles code objects through `marshal`, like `.pyc` files do.
+
+    Args:
+        code (types.CodeType): A compiled kv expression.
+
+    Returns:
+        tuple: Reconstructor and its arguments.
+    """
+    return marshal.loads, (marshal.dumps(code),)
+
+
+def cache_path(source: str, directory: str, name: str) -> str:
+    """Returns the cache file of a kv source.
+
+    Args:
+        source (str): The kv source.
+        directory (str): Directory of the cache files.
+        name (str): Name of the kv source, used as a file name prefix.
+
+    Returns:
+        str: Path of the cache file.
+    """
+    key = sha1(
+        f"{kivy.__version__}|{sys.version}|{source}".encode("utf-8")
+    ).hexdigest()[:16]
+    return os.path.join(directory, f"{name}.kv.{key}.pickle")
+
+
+def load_rules(source: str, directory: str, name: str = "rules") -> bool:
+    """Loads kv rules, from the cache if possible.
+
+    Args:
+        source (str): The kv source, rules only. Sources with directives are
+            loaded without the cache.
+        directory (str): Directory of the cache files, created if missing.
+        name (str, optional): Name of the kv source. Defaults to "rules".
+
+    Returns:
+        bool: True if the rules came from the cache.
+    """
+    cacheable = _registrable() and not has_directives(source)
+    path = cache_path(source, directory, name)
+    parser = None
+    if cacheable:
+        try:
+            with open(path, "rb") as file:
+                parser = RulesUnpickler(file).load()
+        except Exception:
+            pass
+    if isinstance(parser, Parser) and not parser.root and not parser.directives:
+        # Same registration as `Builder.load_string()` for rules
+        Builder.rules.extend(parser.rules)
+        Builder._clear_matchcache()
+        Builder.files.append(name)
+        for class_name, baseclasses in parser.dynamic_classes.items():
+            Factory.register(class_name, baseclasses=baseclasses, filename=name)
+        return True
+
+    if Builder.load_string(source, filename=name) is not None:
+        raise ValueError(f"The kv source <{name}> contains a root widget")
+    if cacheable:
+        write_cache(Parser(content=source, filename=name), path)
+    return False
+
+
+def write_cache(parser: Parser, path: str) -> None:
+    """Pickles parsed rules and deletes the stale cache files of their source.
+
+    Args:
+        parser (kivy.lang.Parser): The parsed rules.
+        path (str): Path of the cache file, see `cache_path()`.
+    """
+    directory, file_name = os.path.split(path)
+    prefix = file_name[: file_name.index(".kv.") + 4]
+    try:
+        os.makedirs(directory, exist_ok=True)
+        buffer = io.BytesIO()
+        pickler = pickle.Pickler(buffer, pickle.HIGHEST_PROTOCOL)
+        pickler.dispatch_table = copyreg.dispatch_table.copy()
+        pickler.dispatch_table[types.CodeType] = _reduce_code
+        pickler.dump(parser)
+        with open(path, "wb") as file:
+            file.write(buffer.getvalue())
+        for entry in os.listdir(directory):
+            if entry.startswith(prefix) and entry != file_name:
+                os.remove(os.path.join(directory, entry))
+    except Exception as e:
+        print(f"KvCacheError: can't write the kv cache. {type(e)}")
+
+
+def has_directives(source: str) -> bool:
+    """Checks a kv source for directives, which `Parser` runs while parsing.
+
+    Args:
+        source (str): The kv source.
+
+    Returns:
+        bool: True if a line of the source is a directive.
+    """
+    return any(line.lstrip().startswith("#:") for line in source.splitlines())
+
+
+def _registrable() -> bool:
+    """Checks that the Builder is one the cached registration was checked against.
+
+    Returns:
+        bool: True if cached rules can be registered.
+    """
+    try:
+        major = int(kivy.__version__.split(".")[0])
+    except ValueError:
+        return False
+    return major in KIVY_VERSIONS and isinstance(getattr(Builder, "rules", None), list) and callable(
+        getattr(Builder, "_clear_matchcache", None)
+    )
@@ -0,0 +1,96 @@
+"""Single-pass layout of the game screen.
+
+The kv rules used to chain the geometry: the paddle rows followed the score labels,
+whose height followed their font size, which followed the window height, so a resize
+settled over several binding passes and laid the match out once per pass.
+
+`Layout` computes every element of the screen from the window size in one pass, in
+pixels, along with the scale between pixels and the field units the match is
+simulated in. `PongGame` applies it to its widgets and to the match at once.
+"""
+
+from engine import FIELD_HEIGHT
+
+
+class Layout:
+    """Geometry of the game screen for one window size.
+
+    The proportions are those of the original kv rules: scores 1/30 of the window
+    height tall, one score height away from their edge, paddles one score height
+    beyond their score, 1/6 of the width wide and 1/36 of the height tall, a ball
+    1/30 of the height wide and a menu 1/4 of the width wide.
+
+    Attributes:
+        width (float): Width of the window, in pixels.
+        height (float): Height of the window, in pixels.
+        scale (float): Pixels per field unit.
+        field_width (float): Width of the field, in field units.
+        font_size (float): Font size of the scores.
+        score_height (float): Height of a score line, in pixels.
+        player_score_y (float): Bottom edge of the player's score, in pixels.
+        opponent_score_y (float): Bottom edge of the opponent's score, in pixels.
+        paddle_size (tuple): Width and height of the paddles, in pixels.
+        player_y (float): Bottom edge of the player's paddle, in pixels.
+        opponent_y (float): Bottom edge of the opponent's paddle, in pixels.
+        ball_size (float): Diameter of the ball, in pixels.
+        menu_size (float): Diameter of the menu, in pixels.
+    """
+
+    __slots__ = (
+        "width",
+        "height",
+        "scale",
+        "field_width",
+        "font_size",
+        "score_height",
+        "player_score_y",
+        "opponent_score_y",
+        "paddle_size",
+        "player_y",
+        "opponent_y",
+        "ball_size",
+        "menu_size",
+    )
+
+    def __init__(self, width: float, height: float, line_height):
+        """Computes the layout.
+
+        Args:
+            width (float): Width of the window, in pixels.
+            height (float): Height of the window, in pixels.
+            line_height (callable): Height in pixels of a score line of a font
+                size, e.g. `scoreboard.line_height()`.
+        """
+        height = max(height, 1.0)
+        self.width = width
+        self.height = height
+        self.scale = height / FIELD_HEIGHT
+        self.field_width = width / self.scale
+
+        self.font_size = height / 2 / 15
+        score_height = self.score_height = line_height(self.font_size)
+        self.player_score_y = score_height
+        self.opponent_score_y = height - score_height * 2
+
+        paddle_height = height / 2 / 18
+        self.paddle_size = width / 6, paddle_height
+        self.player_y = self.player_score_y + score_height * 2
+        self.opponent_y = self.opponent_score_y - score_height - paddle_height
+
+        self.ball_size = height / 30
+        self.menu_size = width / 4
+
+    def field(self) -> tuple:
+        """Returns the geometry of the match, in field units.
+
+        Returns:
+            tuple: Width and height of the field, and bottom edges of the player's
+            and the opponent's paddles, the arguments of `engine.Match.resize()`.
+        """
+        scale = self.scale
+        return (
+            self.field_width,
+            FIELD_HEIGHT,
+            self.player_y / scale,
+            self.opponent_y / scale,
+        )
@@ -1,23 +1,60 @@
+import os
+
+from profiler import CAPACITY, FrameProfiler, StartupTimer, WakeupCounter
+
+# Started before Kivy is imported
+STARTUP = StartupTimer()
+
 from kivy.animation import Animation
-# noinspection PyProtectedMember
-from kivy.app import App, Builder
+from kivy.app import App
 from kivy.clock import Clock
 from kivy.properties import (
     NumericProperty,
-    ReferenceListProperty,
     ObjectProperty,
     ListProperty,
 )
+from kivy.uix.label import Label
 from kivy.uix.widget import Widget
-from kivy.vector import Vector
 
-from plyer import notification, vibrator
-
-Builder.load_string(
-    """
+STARTUP.mark("kivy")
+
+from ai import ComputerOpponent
+from engine import (
+    BASE_TICK_RATE,
+    GAME_OVER,
+    OPPONENT,
+    OPPONENT_HIT,
+    PLAYER,
+    PLAYER_HIT,
+    SCORED,
+    Match,
+)
+from kvcache import load_rules
+from layout import Layout
+from renderer import RENDERERS
+from replay import CENTER, RESIZE, START, Recorder
+from scoreboard import ScoreLabel, line_height  # noqa: F401, ScoreLabel is in kv
+import services
+from timestep import PHYSICS_RATE, RENDER_RATE, FixedTimestep
+
+# The optional features, fixed-point physics, multiball, particles, telemetry and
+# broadcast, import their modules once enabled, they'd slow the cold start down
+
+STARTUP.mark("modules")
+
+# Game phases
+PHASE_MENU = 0
+PHASE_SERVE = 1
+PHASE_PLAYING = 2
+PHASE_GAME_OVER = 3
+
+# Widget colors
+BALL_COLORS = {PLAYER: [1, 1, 1, 1], OPPONENT: [0, 0, 0, 1]}
+HIDDEN = [0, 0, 0, 0]
+MENU_COLOR = [0.2, 0.2, 0.2, 0.5]  # Dark grey color
+
+KV = """
 <Menu>:
-    size: self.size
-    center: root.parent.center
     canvas:
         Color:
             rgba: self.color
@@ -25,7 +62,6 @@ Builder.load_string(
             size: self.size
             pos: self.pos
 <PongBall>:
-    size: self.size
     canvas:
         Color:
             rgba: self.color
@@ -71,55 +107,33 @@ Builder.load_string(
             id: split_line
             pos: self.width / 2, self.y
             size: 1, self.height
-    # Score labels        
-    Label:
+    # Score labels, sized to their digits. The geometry of the labels, the ball,
+    # the paddles and the menu is set by `PongGame.sync_layout()` in one pass.
+    ScoreLabel:
         id: player_score
         color: 1, 1, 1, 1
-        # Size relative to the half of the screen
-        font_size: root.height / 2 / 15
-        size: self.texture_size
+        # Centered on their digits
         x: root.width / 2 - self.width / 2
-        # Vertical position relative to the half of the screen
-        y: root.y + self.height
-        text: str(root.player.score)
-    Label:
+        score: root.player.score
+    ScoreLabel:
         id: opponent_score
         color: 0, 0, 0, 1
-        # Size relative to the half of the screen
-        font_size: root.height / 2 / 15
-        size: self.texture_size
+        # Centered on their digits
         x: root.width / 2 - self.width / 2
-        # Vertical position relative to the half of the screen
-        y: root.height - self.height * 2
-        text: str(root.opponent.score)
+        score: root.opponent.score
     # Ball
     PongBall:
         id: pong_ball
-        center: self.parent.center
-        # Size relative to the size of the screen
-        size: self.parent.height / 30, self.parent.height / 30
     # Paddles
     PongPaddle:
         id: player
-        # Size relative to the half of the screen
-        size: self.parent.width / 6, self.parent.height / 2 / 18
-        center_x: self.parent.width / 2
-        # Vertical position relative to the player score
-        y: player_score.top + player_score.height
         color: 1, 1, 1, 1
     PongPaddle:
         id: opponent
-        # Size relative to the half of the screen
-        size: self.parent.width / 6, self.parent.height / 2 / 18
-        center_x: self.parent.width / 2
-        # Vertical position relative to the opponent score
-        top: opponent_score.y - opponent_score.height
         color: 0, 0, 0, 1
     # Menu
     Menu:
         id: menu
-        # Size of the circle relative to screen width
-        size: self.parent.width / 4, self.parent.width / 4
         color: [0.2, 0.2, 0.2, 0.5] # Dark grey color
         # Text
         Label:
@@ -129,57 +143,518 @@ Builder.load_string(
             text: 'Touch'
             # Centering the text only after defining size and the content
             center: menu.center
+"""
+
+# Parsed once, later launches load the cached rules
+load_rules(KV, os.path.join(os.path.dirname(__file__), "__pycache__"), "main")
+STARTUP.mark("kv")
+
+
+class DispatchCounter:
+    """Counts the property dispatches of watched widgets.
+
+    Watching binds a counting callback to each property, so it is only done while
+    the count is needed.
+
+    Attributes:
+        count (int): Dispatches since the last `pop()`.
     """
-)
+
+    def __init__(self):
+        """Initializes the counter without watching anything."""
+        self.count = 0
+        self._bindings = []
+
+    def watch(self, widget, *names) -> None:
+        """Starts counting the dispatches of the given properties.
+
+        Args:
+            widget (kivy.event.EventDispatcher): Owner of the properties.
+            *names (str): Names of the properties.
+        """
+        for name in names:
+            uid = widget.fbind(name, self.increment)
+            self._bindings.append((widget, name, uid))
+
+    def unwatch(self) -> None:
+        """Stops counting and unbinds every watched property."""
+        for widget, name, uid in self._bindings:
+            widget.unbind_uid(name, uid)
+        self._bindings.clear()
+        self.count = 0
+
+    # noinspection PyUnusedLocal
+    def increment(self, *args) -> None:
+        """Counts one dispatch."""
+        self.count += 1
+
+    def pop(self) -> int:
+        """Returns the count and starts over.
+
+        Returns:
+            int: Dispatches since the previous call.
+        """
+        count = self.count
+        self.count = 0
+        return count
 
 
 class PongGame(Widget):
-    """Main game class for the Game. This class contains all the game logic and serves
-    as the root widget.
+    """Main game class for the Game. Serves as the root widget and renders the match
+    simulated by `engine.Match`.
+
+    The widgets hold no game logic. Touches are forwarded to the match and its state
+    is copied into the widgets once per frame. The match runs in field units, see
+    `engine.FIELD_HEIGHT`, which are mapped to pixels when drawing, so it plays the
+    same at every resolution. The match advances in fixed physics
+    steps whatever the frame rate is, and the ball is drawn interpolated between
+    its last two steps.
+
+    The game moves through the menu, serve, playing and game over phases. Menu and
+    color properties are only written on phase changes and when the ball crosses the
+    center line, so a steady frame only updates the ball and the paddles.
+
+    Drawing is delegated to a renderer from `renderer.RENDERERS`: "widgets" moves the
+    ball and paddle widgets, "canvas" draws the scene from one instruction group and
+    "shader" draws it with one fragment shader.
 
     Attributes:
         ball (ObjectProperty): The pong ball used in the game.
         player (ObjectProperty): The player's paddle.
         opponent (ObjectProperty): The opponent's paddle.
         menu (ObjectProperty): The game menu.
-        state_game_started (bool): The state of the game, indicating whether the game
-        has started.
+        match (engine.Match | fixedpoint.FixedMatch): The simulated match, in field
+        units.
+        layout (layout.Layout): Geometry of the screen for the current window size.
+        timestep (timestep.FixedTimestep): Hands out the physics steps.
+        tick_length (float): Length of a physics step in base ticks.
+        previous_ball (tuple): Ball position before the last physics step.
+        ball_pos (tuple): Ball position drawn in the last frame.
+        renderer (renderer.WidgetRenderer | renderer.CanvasRenderer): Draws the
+        match.
+        phase (int): The current game phase, one of the `PHASE_*` constants.
+        ball_side (int | None): Side whose color the ball is drawn in, None while
+        the ball is hidden.
+        dispatches (DispatchCounter): Counts property dispatches when watching.
+        frame_dispatches (int): Property dispatches during the previous frame and
+        the input handled before it.
+        profiler (profiler.FrameProfiler | None): Records frame timings, None unless
+        enabled.
+        overlay (kivy.uix.label.Label | None): Shows the profiler summary.
+        services (services.PlatformServices): Performs haptics and notifications
+        off the game thread, shared by the games of the process.
+        recorder (replay.Recorder | None): Records the match inputs, None unless
+        recording.
+        telemetry (telemetry.TelemetryWriter | None): Logs the paddle hits and
+        points for balancing, None unless enabled.
+        broadcast (broadcast.Publisher | None): Streams the match to spectator
+        screens, None unless enabled.
+        computer (ai.ComputerOpponent | None): Plays the opponent paddle, None when
+        a second player does.
+        session (netplay.RollbackSession | None): Simulates the match with a remote
+        device, None for a local game.
+        multiball (multiball.MultiBall | None): Extra balls of the party mode, None
+        unless enabled.
+        touch_sides (dict): Touch uid to the side of the paddle the touch owns.
+        targets (list): Latest touch target of each paddle, indexed by side, None
+        once applied.
+        raw_inputs (int): Touch move events received.
+        applied_inputs (int): Paddle targets applied to the match.
+        frame_interval (float): Interval of the game loop, in seconds.
+        loop (kivy.clock.ClockEvent | None): The scheduled game loop, None while it
+        sleeps.
+        wakeups (profiler.WakeupCounter): Counts the game loop and Clock wakeups.
+        multiball_renderer (multiball.MultiBallRenderer | None): Draws the extra
+        balls.
+        particles (particles.ParticleSystem | None): Ball trail, paddle-hit sparks
+        and score bursts, None unless the effects are enabled.
+        particle_renderer (particles.ParticleRenderer | None): Draws the particles.
+        trail_effect (tuple | None): `particles.TRAIL`, the effect of every frame.
+        hit_effect (tuple | None): `particles.SPARKS`, the effect of a paddle hit.
+        score_effect (tuple | None): `particles.BURST`, the effect of a point.
     """
 
     ball = ObjectProperty(None)
     player = ObjectProperty(None)
     opponent = ObjectProperty(None)
     menu = ObjectProperty(None)
-    state_game_started = False
 
     def __init__(self, **kwargs):
         """Initializes the PongGame instance.
 
+        Creates the match and lays the screen out with `sync_layout()` on every
+        resize. Physics rates below the base tick rate use
+        continuous collisions, so the longer steps don't let the ball tunnel.
+
         Centers the ball using `center_ball_on_init()` after the layout calculation
         completes to ensure correct ball positioning. This is achieved by scheduling
         `center_ball_on_init()` for the next frame using `Clock.schedule_once()`.
 
         Serves the ball using `serve_ball()`.
 
-        Sends the notification to the user about the project page.
+        Args:
+            physics_rate (float, optional): Physics steps per second. Defaults to
+            `timestep.PHYSICS_RATE`.
+            renderer (str, optional): Name of the renderer. Defaults to "widgets".
+            difficulty (str | None, optional): Difficulty of the computer opponent,
+            a key of `ai.DIFFICULTIES`. Defaults to None, a second player.
+            balls (int, optional): Extra balls served on every match start, the
+            party mode. Defaults to 0.
+            render_rate (float, optional): Frames drawn per second while the game
+            loop runs. Defaults to `timestep.RENDER_RATE`.
+            fixed (bool, optional): Simulate the deterministic fixed-point physics
+            of `fixedpoint.FixedMatch`, which has no continuous mode, so it steps
+            at least once per base tick whatever `physics_rate` asks for.
+            Defaults to False.
+            effects (bool, optional): Draw the ball trail, the paddle-hit sparks
+            and the score bursts. Defaults to False, they cost about 0.1 ms
+            of CPU per frame.
         """
+        physics_rate = kwargs.pop("physics_rate", PHYSICS_RATE)
+        renderer = kwargs.pop("renderer", "widgets")
+        difficulty = kwargs.pop("difficulty", None)
+        balls = kwargs.pop("balls", 0)
+        render_rate = kwargs.pop("render_rate", RENDER_RATE)
+        fixed = kwargs.pop("fixed", False)
+        effects = kwargs.pop("effects", False)
+        if fixed and physics_rate < BASE_TICK_RATE:
+            # Longer discrete steps would let the ball tunnel through the paddles
+            print(
+                f"Fixed point: physics at {BASE_TICK_RATE:g} Hz, "
+                f"not {physics_rate:g}."
+            )
+            physics_rate = BASE_TICK_RATE
         super(PongGame, self).__init__(**kwargs)
+        self.renderer = RENDERERS[renderer](self)
+        self.timestep = FixedTimestep(physics_rate)
+        self.tick_length = BASE_TICK_RATE / physics_rate
+        self.layout = Layout(self.width, self.height, line_height)
+        if fixed:
+            from fixedpoint import FixedMatch
+
+            self.match = FixedMatch(*self.layout.field()[:2])
+        else:
+            self.match = Match(
+                *self.layout.field()[:2], continuous=physics_rate < BASE_TICK_RATE
+            )
+        self.previous_ball = self.ball_pos = self.match.ball_x, self.match.ball_y
+        self.phase = PHASE_MENU
+        self.ball_side = None
+        self.dispatches = DispatchCounter()
+        self.frame_dispatches = 0
+        self.profiler = None
+        self.overlay = None
+        self.services = services.shared()
+        self.recorder = None
+        self.telemetry = None
+        self.broadcast = None
+        self.computer = ComputerOpponent(difficulty) if difficulty else None
+        self.session = None
+        self.touch_sides = {}
+        self.targets = [None, None]
+        self.raw_inputs = 0
+        self.applied_inputs = 0
+        self.frame_interval = 1.0 / render_rate
+        self.loop = None
+        self.wakeups = WakeupCounter(Clock.frames)
+        self.multiball = self.multiball_renderer = None
+        if balls:
+            from multiball import MultiBall, MultiBallRenderer
+
+            self.multiball = MultiBall(self.match, balls)
+            self.multiball_renderer = MultiBallRenderer(
+                self.canvas.after, self.multiball
+            )
+        self.particles = self.particle_renderer = None
+        self.trail_effect = self.hit_effect = self.score_effect = None
+        if effects:
+            from particles import (
+                BURST,
+                SPARKS,
+                TRAIL,
+                ParticleRenderer,
+                ParticleSystem,
+            )
+
+            # Kept at hand, the frames and the events emit them
+            self.trail_effect = TRAIL
+            self.hit_effect = SPARKS
+            self.score_effect = BURST
+            self.particles = ParticleSystem()
+            self.particle_renderer = ParticleRenderer(
+                self.canvas.after, self.particles
+            )
+
+        # Follow the window size
+        self.sync_layout()
+        self.bind(size=self.sync_layout)
 
         # Center the ball
         Clock.schedule_once(self.center_ball_on_init, 1.5)
 
-        # Send notification
-        try:
-            notification.notify(
-                app_name="Pong",
-                title="Official project page:",
-                message="github.com/0Pavlov/Python-Kivy-Pong-Game",
+        # Initial serve
+        self.serve_ball(towards=PLAYER)
+
+    # noinspection PyUnusedLocal
+    def notify_project_page(self, *args) -> None:
+        """Sends the notification to the user about the project page."""
+        self.services.notify(
+            app_name="Pong",
+            title="Official project page:",
+            message="github.com/0Pavlov/Python-Kivy-Pong-Game",
+        )
+
+    @property
+    def state_game_started(self) -> bool:
+        """bool: The state of the game, indicating whether the game has started."""
+        return self.match.started
+
+    def watch_dispatches(self, enabled: bool = True) -> None:
+        """Starts or stops counting the property dispatches of the game widgets.
+
+        Args:
+            enabled (bool, optional): Whether to count. Defaults to True.
+        """
+        self.dispatches.unwatch()
+        if enabled:
+            self.dispatches.watch(self.ball, "pos", "color")
+            self.dispatches.watch(self.player, "pos", "score")
+            self.dispatches.watch(self.opponent, "pos", "score")
+            self.dispatches.watch(self.menu, "pos", "size", "color")
+
+    def enable_profiler(
+        self, capacity: int = CAPACITY, overlay: bool = True, interval: float = None
+    ) -> None:
+        """Starts recording frame timings and property dispatches.
+
+        With the effects on, the particles also count the memory blocks their
+        frames leave allocated, shown in the overlay, which must stay at zero.
+
+        Args:
+            capacity (int, optional): Number of frames kept. Defaults to
+            `profiler.CAPACITY`.
+            overlay (bool, optional): Show a summary on the screen. Defaults to True.
+            interval (float, optional): Scheduled frame interval, in seconds.
+            Defaults to the length of a physics step.
+        """
+        self.disable_profiler()
+        if interval is None:
+            interval = self.timestep.step
+        self.profiler = FrameProfiler(capacity, interval)
+        self.profiler.start()
+        self.watch_dispatches()
+        if self.particles is not None:
+            self.particles.track_allocations = True
+        if overlay:
+            self.overlay = Label(color=(1, 0, 0, 1), halign="left")
+            self.overlay.bind(texture_size=self.overlay.setter("size"))
+            self.add_widget(self.overlay)
+            Clock.schedule_interval(self.update_overlay, 0.5)
+
+    def disable_profiler(self) -> None:
+        """Stops recording and removes the overlay."""
+        if self.profiler is not None:
+            self.profiler.stop()
+            self.profiler = None
+            self.watch_dispatches(False)
+            if self.particles is not None:
+                self.particles.track_allocations = False
+        if self.overlay is not None:
+            Clock.unschedule(self.update_overlay)
+            self.remove_widget(self.overlay)
+            self.overlay = None
+
+    # noinspection PyUnusedLocal
+    def update_overlay(self, dt: float) -> None:
+        """Shows the average frame timings of the profiler.
+
+        Args:
+            dt (float): Delta time parameter.
+        """
+        summary = self.profiler.summary()
+        if summary:
+            wakeups, frames = self.wakeups.rates(Clock.frames)
+            self.overlay.text = "\n".join(
+                f"{name}: {summary[name] * 1000:.3f} ms"
+                for name in ("dt", "max_jitter", "physics", "render", "gc")
+            ) + (
+                f"\ndispatches: {summary['dispatches']:.1f}"
+                f"\ninputs: {self.raw_inputs} raw, {self.applied_inputs} applied"
+                f"\nwakeups: {wakeups:.0f}/s game, {frames:.0f}/s clock"
             )
-        except Exception as e:
-            print(f"NotificationError: can't send the notification. {type(e)}")
+            if self.particles is not None:
+                self.overlay.text += (
+                    f"\nparticle allocations: {self.particles.frame_allocations} "
+                    f"last frame, {self.particles.allocations} total"
+                )
+            self.overlay.top = self.top
 
-        # Initial serve
-        self.serve_ball(vel=(4, -4))
+    def start_recording(self, path: str) -> None:
+        """Starts recording the match inputs for `replay.py`.
+
+        Recordings replay the float physics of a local game, the fixed-point
+        physics and networked games aren't recorded.
+
+        Args:
+            path (str): Destination of the recording.
+        """
+        self.stop_recording()
+        if not isinstance(self.match, Match):
+            print("Recording: the fixed-point physics can't be replayed.")
+            return
+        if self.session is not None:
+            print("Recording: the remote inputs of a networked game aren't recorded.")
+            return
+        self.recorder = Recorder(path, self.match, self.tick_length)
+
+    def stop_recording(self) -> None:
+        """Finishes the recording, if any."""
+        if self.recorder is not None:
+            self.recorder.close(self.match)
+            self.recorder = None
+
+    def start_telemetry(self, path: str) -> None:
+        """Starts logging the paddle hits and points for `telemetry.py`.
+
+        Args:
+            path (str): Destination of the log.
+        """
+        from telemetry import TelemetryWriter
+
+        self.stop_telemetry()
+        self.telemetry = TelemetryWriter(path, self.tick_length, self.match.tick)
+
+    def stop_telemetry(self) -> None:
+        """Writes the rest of the log and closes it, if any."""
+        if self.telemetry is not None:
+            self.telemetry.close()
+            self.telemetry = None
+
+    def start_broadcast(self, port: int) -> None:
+        """Starts streaming the match to spectators, see `broadcast.py`.
+
+        The game plays on without the broadcast where the server can't start.
+
+        Args:
+            port (int): Port the broadcast server listens on.
+        """
+        from broadcast import Publisher
+
+        self.stop_broadcast()
+        try:
+            self.broadcast = Publisher(port, BASE_TICK_RATE / self.tick_length)
+        except OSError as e:
+            print(f"Broadcast: disabled, {e}")
+
+    def stop_broadcast(self) -> None:
+        """Stops the broadcast server, if any."""
+        if self.broadcast is not None:
+            self.broadcast.close()
+            self.broadcast = None
+
+    def wake(self) -> None:
+        """Schedules the game loop, if it sleeps.
+
+        The first frame runs one interval later. The time spent asleep isn't
+        simulated.
+        """
+        if self.loop is None:
+            self.timestep.reset()
+            self.loop = Clock.schedule_interval(self.update, self.frame_interval)
+
+    def sleep(self) -> None:
+        """Unschedules the game loop, the game then only reacts to touches."""
+        if self.loop is not None:
+            self.loop.cancel()
+            self.loop = None
+
+    def enter_phase(self, phase: int) -> None:
+        """Switches the game phase and updates the widgets it affects.
+
+        The game loop only runs during a match: it is woken up by the serve and put
+        to sleep when the game is over, unless a networked session has to keep
+        simulating until both sides restart.
+
+        Args:
+            phase (int): One of the `PHASE_*` constants.
+        """
+        self.phase = phase
+        if phase in (PHASE_SERVE, PHASE_GAME_OVER):
+            # Both follow a point, the winning one included
+            self.player.score = self.match.player_score
+            self.opponent.score = self.match.opponent_score
+        if phase == PHASE_SERVE:
+            self.wake()
+            self.snap_ball()
+        elif phase == PHASE_GAME_OVER:
+            if self.session is None:
+                self.sleep()
+            # Hide the ball when game waits for restart
+            self.renderer.set_ball_color(HIDDEN)
+            self.ball_side = None
+            if self.multiball is not None:
+                self.multiball.clear()
+                self.multiball_renderer.draw(self.layout.scale)
+            if self.particles is not None:
+                self.particles.clear()
+                self.particle_renderer.draw(self.match.height / 2)
+            # Bring the menu back from out of the screen
+            Animation.cancel_all(self.menu)
+            self.menu.color = MENU_COLOR
+            self.show_menu()
+
+    def show_menu(self) -> None:
+        """Centers the menu on the screen at its full size."""
+        menu_size = self.layout.menu_size
+        self.menu.size = menu_size, menu_size
+        self.menu.center = self.center
+
+    # noinspection PyUnusedLocal
+    def hide_menu(self, *args) -> None:
+        """Moves the menu off the screen and resets its size and color."""
+        if self.phase in (PHASE_SERVE, PHASE_PLAYING):
+            menu_size = self.layout.menu_size
+            self.menu.x = self.width
+            self.menu.size = menu_size, menu_size
+            self.menu.color = MENU_COLOR
+
+    # noinspection PyUnusedLocal
+    def sync_layout(self, *args) -> None:
+        """Lays the screen out for the window size in one pass.
+
+        Applies a new `layout.Layout` to the widgets, passes the field geometry to
+        the match and the renderer, and redraws the match. A networked match keeps
+        the field of its session.
+        """
+        layout = self.layout = Layout(self.width, self.height, line_height)
+        ids = self.ids
+        for label, y in (
+            (ids.player_score, layout.player_score_y),
+            (ids.opponent_score, layout.opponent_score_y),
+        ):
+            label.font_size = layout.font_size
+            label.y = y
+        self.ball.size = layout.ball_size, layout.ball_size
+
+        if self.session is None:
+            field = layout.field()
+            self.match.resize(*field)
+            if self.recorder is not None:
+                self.recorder.write(RESIZE, *field)
+        # A networked match keeps the field shared by both sides, the paddle rows
+        # follow the match
+        for paddle, y in (
+            (self.player, self.match.player_y),
+            (self.opponent, self.match.opponent_y),
+        ):
+            paddle.size = layout.paddle_size
+            paddle.y = y * layout.scale
+        self.renderer.resize(layout)
+        self.snap_ball()
+        if self.phase in (PHASE_MENU, PHASE_GAME_OVER):
+            self.show_menu()
+        else:
+            self.hide_menu()
 
     # noinspection PyUnusedLocal
     def center_ball_on_init(self, dt: float) -> None:
@@ -189,163 +664,312 @@ class PongGame(Widget):
             dt (float): Delta time parameter, used during the `__init__` for being able
             to schedule functions.
         """
-        self.ball.center = self.center
+        self.match.center_ball()
+        if self.recorder is not None:
+            self.recorder.write(CENTER)
+        self.snap_ball()
 
-    def serve_ball(self, vel: tuple = (4, 4)) -> None:
+    def serve_ball(self, towards: int = OPPONENT) -> None:
         """Serves the ball.
 
-        Serves the ball from the center of the screen with a given velocity.
+        Serves the ball from the center of the screen.
 
         Args:
-            vel (tuple, optional): Velocity of the ball. Defaults to (4, 4).
+            towards (int, optional): Side the ball is served to. Defaults to
+            `OPPONENT`.
         """
-        self.ball.center = self.center
-        self.ball.velocity = vel
+        self.match.serve(towards)
+        self.snap_ball()
+
+    def snap_ball(self) -> None:
+        """Draws the ball at its current position, skipping the interpolation.
+
+        Used after the ball jumps, e.g. on a serve, so it isn't drawn sliding across
+        the field.
+        """
+        self.previous_ball = self.match.ball_x, self.match.ball_y
+        self.render()
+
+    def render(self, alpha: float = 1.0) -> None:
+        """Copies the match state into the widgets.
+
+        Args:
+            alpha (float, optional): Position of the ball between its previous (0)
+            and current (1) physics step. Defaults to 1.
+        """
+        match = self.match
+        x, y = self.previous_ball
+        self.ball_pos = x, y = (
+            x + (match.ball_x - x) * alpha,
+            y + (match.ball_y - y) * alpha,
+        )
+        self.renderer.draw(x, y, match)
 
     # noinspection PyUnusedLocal
     def update(self, dt: float) -> None:
         """Updates the game state.
 
-        Moves the ball, checks for collisions, updates scores, and handles game logic.
-        Updates the screen each time `PongApp()`s `Clock.schedule_interval()` inside
-        the `build()` method ticks.
+        Advances the match by the physics steps due after `dt`, renders it and
+        reacts to its events. Updates the screen each time the game loop scheduled
+        by `wake()` ticks.
 
         Args:
-            dt (float): Delta time parameter.
+            dt (float): Delta time parameter, real time since the previous frame.
         """
-        if self.state_game_started:
-            # Reset menu size and move off the screen
-            self.menu.x = self.width
-            self.menu.size = self.width / 4, self.width / 4
-
-            # Reset menu color
-            self.menu.color = [0.2, 0.2, 0.2, 0.5]
-
-            # Move the ball each frame
-            self.ball.move()
-
-            # Bounce off paddles
-            self.player.bounce_ball(self.ball)
-            self.opponent.bounce_ball(self.ball)
-
-            # Bounce ball off sides
-            if self.ball.x < self.x or self.ball.right > self.right:
-                self.ball.velocity_x *= -1
-
-            # Ball collision with the top or bottom of the screen
-            if self.ball.top > self.top:  # Top
-                try:
-                    vibrator.vibrate(time=0.08)
-                except Exception as e:
-                    print(
-                        "Ball hit the top.",
-                        "Bzzzz: vibration not supported on your device ;((",
-                        f"\n{type(e)}",
-                    )
-                finally:
-                    self.player.score += 1
-                    self.serve_ball(vel=(4, 4))
-
-            if self.ball.y < self.y:  # Bottom
-                try:
-                    vibrator.vibrate(time=0.08)
-                except Exception as e:
-                    print(
-                        "Ball hit the bottom.",
-                        "Bzzzz: vibration not supported on your device ;((",
-                        f"\n{type(e)}",
-                    )
-                finally:
-                    self.opponent.score += 1
-                    self.serve_ball(vel=(4, -4))
-
-            # Change ball color based on its position
-            if self.ball.center_y > self.center_y:
-                self.ball.color = [0, 0, 0, 1]
-            elif self.ball.center_y < self.center_y:
-                self.ball.color = [1, 1, 1, 1]
+        self.wakeups.wakeups += 1
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.begin_frame(dt)
+        playing = self.phase not in (PHASE_MENU, PHASE_GAME_OVER)
+        # A networked session keeps simulating over a game over, until a restart
+        if playing or self.session is not None:
+            self.play_frame(dt, profiler)
+        self.frame_dispatches = self.dispatches.pop()
+        if profiler is not None:
+            profiler.end_frame(self.frame_dispatches)
+
+    def play_frame(self, dt: float, profiler) -> None:
+        """Runs the physics, drawing and events of a frame during a match.
+
+        Args:
+            dt (float): Real time since the previous frame.
+            profiler (profiler.FrameProfiler | None): Records the phase timings.
+        """
+        match = self.match
+        events = 0
+        steps = self.timestep.advance(dt)
+        if self.session is not None:
+            # Rollbacks rewrite past steps, the ball is drawn from the frame start
+            self.previous_ball = match.ball_x, match.ball_y
+            events = self.session.update(steps, self.session_events)
+            steps = 0
+            if self.broadcast is not None:
+                self.broadcast.publish(match)
+            # A rollback may change the outcome of past ticks, the state decides
+            if self.phase == PHASE_GAME_OVER:
+                if not match.started:
+                    return
+                # Either side asked for the restart, both restarted on its tick
+                self.begin_match()
+                self.hide_menu()
+            elif not match.started:
+                self.services.vibrate(0.08)
+                self.enter_phase(PHASE_GAME_OVER)
+                return
+            self.player.score = match.player_score
+            self.opponent.score = match.opponent_score
+        multiball = self.multiball
+        particles = self.particles
+        telemetry = self.telemetry
+        broadcast = self.broadcast
+        if steps:
+            self.apply_inputs()
+        for _ in range(steps):
+            self.previous_ball = match.ball_x, match.ball_y
+            if multiball is not None:
+                multiball.step(self.tick_length)
+            step_events = match.step(self.tick_length)
+            if step_events:
+                if particles is not None:
+                    self.emit_effects(step_events)
+                if telemetry is not None:
+                    telemetry.step(step_events, match)
+            if broadcast is not None:
+                broadcast.publish(match)
+            if step_events & SCORED:
+                self.previous_ball = match.ball_x, match.ball_y
+            events |= step_events
+        if self.recorder is not None:
+            self.recorder.frame(steps, events, match)
+        if broadcast is not None:
+            broadcast.flush()
+        if self.computer is not None and steps:
+            x = self.computer.update(match, steps * self.tick_length)
+            if x is not None and self.recorder is not None:
+                self.recorder.write(OPPONENT, x)
+        if profiler is not None:
+            profiler.mark("physics")
+        self.render(self.timestep.alpha)
+        if multiball is not None:
+            self.multiball_renderer.draw(self.layout.scale)
+        if particles is not None:
+            size = match.ball_size
+            radius = size / 2
+            x, y = self.ball_pos
+            # Counts the blocks the particles leave allocated, when instrumented
+            particles.begin_frame()
+            particles.effect(self.trail_effect, x + radius, y + radius, size)
+            particles.update(dt)
+            self.particle_renderer.draw(match.height / 2, self.layout.scale)
+            particles.end_frame()
+        if self.phase == PHASE_SERVE:
+            self.enter_phase(PHASE_PLAYING)
+        if profiler is not None:
+            profiler.mark("render")
+
+        # Change ball color when it crosses the center line
+        ball_center_y = self.ball_pos[1] + match.ball_size / 2
+        center_y = match.height / 2
+        if ball_center_y > center_y:
+            side = OPPONENT
+        elif ball_center_y < center_y:
+            side = PLAYER
+        else:
+            side = self.ball_side
+        if side != self.ball_side:
+            self.ball_side = side
+            self.renderer.set_ball_color(BALL_COLORS[side])
+        if profiler is not None:
+            profiler.mark("colors")
+
+        # Ball collision with the top or bottom of the screen
+        if events & SCORED:
+            self.services.vibrate(0.08)
 
             # Game end condition
-            if self.opponent.score == 3 or self.player.score == 3:
-                # Hide the ball when game waits for restart
-                self.ball.color = [0, 0, 0, 0]
-                # Update the game state
-                self.state_game_started = False
-                # Bring the menu back from out of the screen
-                self.menu.center = self.center
-                # Do something if player wins
-                if self.player.score == 3:
-                    pass
-                # Do something if opponent wins
-                elif self.opponent.score == 3:
-                    pass
+            if events & GAME_OVER:
+                self.enter_phase(PHASE_GAME_OVER)
+            else:
+                self.enter_phase(PHASE_SERVE)
+        if profiler is not None:
+            profiler.mark("events")
+
+    def session_events(self, events: int) -> None:
+        """Logs and draws the events of a tick simulated by the session.
+
+        Args:
+            events (int): Event flags of the tick, not reported before.
+        """
+        if self.particles is not None:
+            self.emit_effects(events)
+        if self.telemetry is not None:
+            self.telemetry.step(events, self.match)
+
+    def emit_effects(self, events: int) -> None:
+        """Emits the particles of the events of a physics step.
+
+        A score bursts where the ball left the field, its position before the
+        step, and a paddle hit sparks where the ball is.
+
+        Args:
+            events (int): Event flags of the step.
+        """
+        match = self.match
+        if events & SCORED:
+            x, y = self.previous_ball
+            effect = self.score_effect
+        elif events & (PLAYER_HIT | OPPONENT_HIT):
+            x = match.ball_x
+            y = match.ball_y
+            effect = self.hit_effect
+        else:
+            return
+        size = match.ball_size
+        self.particles.effect(effect, x + size / 2, y + size / 2, size)
+
+    def apply_inputs(self) -> None:
+        """Moves the paddles to the latest targets of their touches.
+
+        Touch events only arrive between frames, so this runs before the first
+        physics step of a frame: each paddle is moved at most once per step however
+        many events came in. The match clips the paddles to the screen borders and
+        restricts movement to prevent tunneling.
+        """
+        targets = self.targets
+        for side in (PLAYER, OPPONENT):
+            target_x = targets[side]
+            if target_x is None:
+                continue
+            targets[side] = None
+            self.applied_inputs += 1
+            if self.match.move_paddle(side, target_x) and self.recorder is not None:
+                self.recorder.write(side, target_x)
 
     def on_touch_move(self, touch) -> None:
-        """Moves the paddles.
+        """Sets the target of the paddle the touch owns.
+
+        The paddle is moved by `apply_inputs()` on the next physics step. The
+        networked game passes the target of its own paddle to the session instead.
+        Targets are converted to field units.
 
-        Moves paddles based on touch position and restricts movement to prevent
-        tunneling. Utilizes Kivy touch detection for that matter.
+        Args:
+            touch (kivy.input.motionevent.MotionEvent): The touch event.
+        """
+        self.raw_inputs += 1
+        side = self.touch_sides.get(touch.uid)
+        if side is None:
+            return
+        x = touch.x / self.layout.scale
+        if self.session is not None:
+            # Networked, the own paddle moves on the tick its input is scheduled on
+            if side == self.session.side:
+                self.session.set_local_input(x)
+            return
+        self.targets[side] = x
+
+    def on_touch_up(self, touch) -> None:
+        """Releases the paddle owned by the touch.
 
         Args:
             touch (kivy.input.motionevent.MotionEvent): The touch event.
         """
-        touch_player_side = touch.y < self.height / 2
-        touch_opponent_side = touch.y > self.height / 2
-        ball_to_player_distance = abs(self.ball.center_y) - abs(self.player.top)
-        ball_to_opponent_distance = abs(self.opponent.y) - abs(self.ball.center_y)
-        ball_radius = self.ball.height / 2
-        half_paddle = self.player.width / 2
-        touch_scope = self.x + half_paddle < touch.x < self.right - half_paddle
-        out_of_scope_left = self.x + half_paddle > touch.x
-        out_of_scope_right = touch.x > self.right - half_paddle
-
-        if touch_player_side:
-            # Restrict paddle movement to avoid tunneling
-            if ball_to_player_distance > ball_radius:
-                # Restrict paddle movement within screen borders
-                if touch_scope:
-                    self.player.center_x = touch.x
-                # Clip paddle to the screen border
-                elif out_of_scope_left:
-                    self.player.x = self.x
-                elif out_of_scope_right:
-                    self.player.right = self.right
-        elif touch_opponent_side:
-            # Restrict paddle movement to avoid tunneling
-            if ball_to_opponent_distance > ball_radius:
-                # Restrict paddle movement within screen borders
-                if touch_scope:
-                    self.opponent.center_x = touch.x
-                # Clip paddle to the screen border
-                elif out_of_scope_left:
-                    self.opponent.x = self.x
-                elif out_of_scope_right:
-                    self.opponent.right = self.right
+        self.touch_sides.pop(touch.uid, None)
 
     def on_touch_down(self, touch) -> None:
-        """Detects menu touch.
+        """Assigns the touch to a paddle and detects menu touch.
 
-        Registers the touch for the menu button and updates the game state if the menu
-        is touched. Utilizes Kivy touch detection for that matter.
+        The touch owns the paddle of the half it starts on, unless the computer
+        plays that paddle, until it is lifted, even if it crosses the center line.
+
+        Registers the touch for the menu button and starts the match if the menu is
+        touched while it is shown. Utilizes Kivy touch detection for that matter. A
+        networked game asks its session for a restart instead, which applies to
+        both sides.
 
         Args:
             touch (kivy.input.motionevent.MotionEvent): The touch event.
         """
-        anim = Animation(
-            size=(self.ball.width * 1.5, self.ball.width * 1.5),
-            color=(0, 0, 0, 0),
-            center=self.ball.center,
-            t='in_out_cubic',
-            duration=0.7,
-        )
-        if self.menu.collide_point(*touch.pos):
-            # Animation
+        side = self.match.side_at(touch.y / self.layout.scale)
+        if side is not None and not (side == OPPONENT and self.computer is not None):
+            self.touch_sides[touch.uid] = side
+
+        menu_shown = self.phase in (PHASE_MENU, PHASE_GAME_OVER)
+        if menu_shown and self.menu.collide_point(*touch.pos):
+            if self.session is not None:
+                # Networked, both sides restart on the tick the request is due
+                if self.phase == PHASE_GAME_OVER:
+                    self.session.request_restart()
+                return
+            # Animation, the menu leaves the screen once it completes
+            ball_size = self.layout.ball_size
+            radius = self.match.ball_size / 2
+            scale = self.layout.scale
+            anim = Animation(
+                size=(ball_size * 1.5, ball_size * 1.5),
+                color=(0, 0, 0, 0),
+                center=(
+                    (self.ball_pos[0] + radius) * scale,
+                    (self.ball_pos[1] + radius) * scale,
+                ),
+                t='in_out_cubic',
+                duration=0.7,
+            )
+            anim.bind(on_complete=self.hide_menu)
             anim.start(self.menu)
-            # Reset the scores
-            self.opponent.score = 0
-            self.player.score = 0
-            # Update the game state
-            self.state_game_started = True
+            # Reset the scores and update the game state
+            self.match.start()
+            self.begin_match()
+
+    def begin_match(self) -> None:
+        """Serves the first point of a match the engine just started."""
+        if self.recorder is not None:
+            self.recorder.write(START)
+        if self.telemetry is not None:
+            self.telemetry.reset(self.match.tick)
+        if self.multiball is not None:
+            self.multiball.clear()
+            self.multiball.spawn(self.multiball.capacity)
+        self.enter_phase(PHASE_SERVE)
 
     class Menu(Widget):
         """Represents the game menu widget.
@@ -361,20 +985,9 @@ class PongGame(Widget):
 
         Attributes:
         color (ListProperty): The color of the ball.
-        velocity_x (NumericProperty): The velocity of the ball in the x direction.
-        velocity_y (NumericProperty): The velocity of the ball in the y direction.
-        velocity (ReferenceListProperty): The combined velocity of the ball in both
-        directions.
         """
 
         color = ListProperty([0, 0, 0, 0])
-        velocity_x = NumericProperty(0)
-        velocity_y = NumericProperty(0)
-        velocity = ReferenceListProperty(velocity_x, velocity_y)
-
-        def move(self) -> None:
-            """Moves the ball based on its current velocity."""
-            self.pos = Vector(*self.pos) + self.velocity
 
     class PongPaddle(Widget):
         """Represents a pong paddle.
@@ -389,59 +1002,6 @@ class PongGame(Widget):
         color = ListProperty([1, 0, 0, 1])
         score = NumericProperty(0)
 
-        def bounce_ball(self, ball) -> None:
-            """Bounces the ball off the paddle.
-
-            Calculates the collision and adjusts the ball's velocity accordingly.
-
-            Args:
-                ball (PongBall): The ball to bounce.
-            """
-            # Ball center vertex
-            ball_center = Vector(ball.center_x, ball.center_y)
-
-            # Ball velocity
-            vx, vy = ball.velocity
-
-            if self.collide_widget(ball):
-                # Find the closest point on the paddle to the ball's center
-                closest_point = self.get_closest_point(ball_center)
-
-                # Calculate the collision normal vector
-                normal = (ball_center - closest_point).normalize()
-
-                # Calculate the relative velocity of the ball to the paddle
-                # Assuming the paddle is stationary
-                relative_velocity = Vector(vx, vy)
-
-                # Calculate the dot product of the relative velocity and the normal
-                dot_product = relative_velocity.dot(normal)
-
-                # Reflect the relative velocity across the collision normal
-                reflection = relative_velocity - 2 * dot_product * normal
-
-                # Speed increase
-                # Adjust this value for the desired speed increase
-                speed_multiplier = 1.2
-                if abs(reflection.y) < self.height:
-                    reflection *= speed_multiplier
-
-                # Apply the reflected velocity to the ball
-                ball.velocity = reflection.x, reflection.y
-
-        def get_closest_point(self, point: Vector) -> Vector:
-            """Finds the closest point on the paddle's rectangle to a given point.
-
-            Args:
-                point (Vector): The point to find the closest point to.
-
-            Returns:
-                Vector: The closest point on the paddle.
-            """
-            closest_x = max(self.x, min(point.x, self.right))
-            closest_y = max(self.y, min(point.y, self.top))
-            return Vector(closest_x, closest_y)
-
 
 class PongApp(App):
     """Main application class for the Pong game.
@@ -450,23 +1010,153 @@ class PongApp(App):
     logic. It inherits from Kivy's App class, which provides the main event loop and
     window management.
 
+    Attributes:
+        physics_rate (float): Physics steps per second.
+        render_rate (float): Frames drawn per second.
+        renderer (str): Name of the renderer, "widgets", "canvas" or "shader".
+        difficulty (str | None): Difficulty of the computer opponent, None for two
+        players.
+        balls (int): Extra balls of the party mode, 0 to play with one ball.
+        fixed (bool): Whether the match uses the fixed-point physics.
+        effects (bool): Whether the particle effects are drawn, off by default to
+        keep the frame budget of low-end devices.
+
+    Frame instrumentation is off by default. It is switched on through the
+    `[instrumentation]` section of the app config file (`pong.ini`), so it can be
+    enabled on a shipped build without a new release. The `[recording]` section
+    names a file to record the session into, for `replay.py`, and the `[telemetry]`
+    section a file to log the paddle hits and points into, for `telemetry.py`. A
+    non-zero `port` in the `[broadcast]` section streams the matches to spectators
+    watching with `broadcast.py`.
+
     Methods:
-        build(): Initializes the game by creating an instance of PongGame and scheduling
-        the game's update method to be called at regular intervals.
+        build_config(): Sets the config defaults.
+        build(): Initializes the game by creating an instance of PongGame, whose game
+        loop runs during matches only.
+        on_start(): Waits for the first frame.
+        on_first_frame(): Reports the startup time and sends the notification.
+        on_pause(): Puts the game loop to sleep while the app is in the background
+        and flushes the telemetry log.
+        on_resume(): Wakes the game loop up if a match is on.
+        on_stop(): Dumps the recorded frame timings, if any, finishes the recording,
+        the telemetry log and the broadcast and stops the platform services.
     """
 
+    physics_rate = PHYSICS_RATE
+    render_rate = RENDER_RATE
+    renderer = "widgets"
+    difficulty = None
+    balls = 0
+    fixed = False
+    effects = False
+
+    def build_config(self, config) -> None:
+        """Sets the config defaults.
+
+        Args:
+            config (kivy.config.ConfigParser): The app config.
+        """
+        config.setdefaults(
+            "instrumentation",
+            {"enabled": 0, "overlay": 1, "capacity": CAPACITY, "dump": ""},
+        )
+        config.setdefaults("recording", {"path": ""})
+        config.setdefaults("telemetry", {"path": ""})
+        config.setdefaults("broadcast", {"port": 0})
+
     def build(self) -> PongGame:
         """Builds the Pong game application.
 
-        Initializes the game and sets the update interval.
+        Initializes the game with its update interval, and puts its loop to sleep
+        while the window is minimized. Enables the frame instrumentation, the
+        recording, the telemetry and the broadcast if the config asks for them.
 
         Returns:
              PongGame: The game instance. Root widget object.
         """
-        game = PongGame()
-        Clock.schedule_interval(game.update, 1.0 / 120.0)
+        STARTUP.mark("app")
+        game = PongGame(
+            physics_rate=self.physics_rate,
+            renderer=self.renderer,
+            difficulty=self.difficulty,
+            balls=self.balls,
+            fixed=self.fixed,
+            effects=self.effects,
+            render_rate=self.render_rate,
+        )
+        from kivy.core.window import Window
+
+        Window.bind(on_minimize=self.on_pause, on_restore=self.on_resume)
+        if self.config.getboolean("instrumentation", "enabled"):
+            game.enable_profiler(
+                capacity=self.config.getint("instrumentation", "capacity"),
+                overlay=self.config.getboolean("instrumentation", "overlay"),
+                interval=1.0 / self.render_rate,
+            )
+        if self.config.get("recording", "path"):
+            game.start_recording(self.config.get("recording", "path"))
+        if self.config.get("telemetry", "path"):
+            game.start_telemetry(self.config.get("telemetry", "path"))
+        if self.config.getint("broadcast", "port"):
+            game.start_broadcast(self.config.getint("broadcast", "port"))
+        STARTUP.mark("build")
         return game
 
+    def on_start(self) -> None:
+        """Waits for the first frame.
+
+        A callback scheduled now runs in the first frame, before it is drawn. It
+        schedules `on_first_frame()` for the second one.
+        """
+        STARTUP.mark("window")
+        Clock.schedule_once(
+            lambda dt: Clock.schedule_once(self.on_first_frame, 0), 0
+        )
+
+    # noinspection PyUnusedLocal
+    def on_first_frame(self, dt: float) -> None:
+        """Reports the startup time and sends the notification.
+
+        Args:
+            dt (float): Delta time parameter.
+        """
+        STARTUP.mark("first frame")
+        print(STARTUP.report())
+        self.root.notify_project_page()
+
+    # noinspection PyUnusedLocal
+    def on_pause(self, *args) -> bool:
+        """Puts the game loop to sleep while the app is in the background.
+
+        Hands the telemetry logged so far to its writer too, Android may kill a
+        paused app without stopping it.
+
+        Returns:
+            bool: True, the app may be paused instead of stopped.
+        """
+        self.root.sleep()
+        if self.root.telemetry is not None:
+            self.root.telemetry.flush()
+        return True
+
+    # noinspection PyUnusedLocal
+    def on_resume(self, *args) -> None:
+        """Wakes the game loop up if a match is on."""
+        if self.root.phase in (PHASE_SERVE, PHASE_PLAYING):
+            self.root.wake()
+
+    def on_stop(self) -> None:
+        """Dumps the recorded frame timings to the configured file, finishes the
+        recording, the telemetry log and the broadcast and stops the platform
+        services."""
+        path = self.config.get("instrumentation", "dump")
+        if self.root.profiler is not None and path:
+            self.root.profiler.dump(path)
+        self.root.stop_recording()
+        self.root.stop_telemetry()
+        self.root.stop_broadcast()
+        self.root.services.close()
+
 
 if __name__ == "__main__":
     PongApp().run()
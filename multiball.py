@@ -0,0 +1,513 @@
+"""Multi-ball party mode.
+
+`MultiBall` simulates hundreds to thousands of extra balls on the field of a match.
+The balls bounce off the side walls, the paddles and each other, and a ball that
+leaves through the top or the bottom edge is served again from the center. They
+don't score, the match ball still decides the game.
+
+The balls are a pool of typed arrays, one per coordinate, sized once: serving and
+removing a ball only moves numbers around. Ball-ball collisions use a uniform grid
+with cells as large as a ball. Every tick the balls are counting-sorted by cell,
+and each ball is only tested against the balls of its own cell and of four
+neighbouring cells, so a tick costs O(n) instead of O(n²).
+
+`MultiBallRenderer` draws all the balls with two point instructions, one per half,
+each tinted with the color the single ball takes in that half.
+
+Run the module directly to find how many balls fit in a frame:
+
+    python multiball.py
+"""
+
+import argparse
+import os
+import random
+from array import array
+from math import cos, pi, sin, sqrt
+from time import perf_counter
+
+from engine import BASE_TICK_RATE, Match
+from timestep import PHYSICS_RATE
+
+# Default pool size
+CAPACITY = 4096
+
+# Diameter of the extra balls relative to the match ball
+SIZE_RATIO = 1 / 3
+
+# Render rates reported by the command line
+RATES = (60.0, 120.0)
+
+
+class MultiBall:
+    """A pool of balls simulated on the field of a match.
+
+    Balls 0 to `count - 1` are in play. Velocities are in units per base tick, like
+    those of `engine.Match`.
+
+    Attributes:
+        match (engine.Match): Provides the field, the paddles and the serve speed.
+        capacity (int): Most balls in play.
+        size (float): Diameter of the balls.
+        count (int): Balls in play.
+        x (array.array): Left edges.
+        y (array.array): Bottom edges.
+        vx (array.array): Horizontal velocities.
+        vy (array.array): Vertical velocities.
+        collisions (int): Ball-ball collisions resolved so far.
+        served (int): Balls served so far, including the re-serves.
+    """
+
+    def __init__(
+        self,
+        match: Match,
+        capacity: int = CAPACITY,
+        size: float = None,
+        seed: int = None,
+    ):
+        """Allocates the pool.
+
+        Args:
+            match (engine.Match): The match whose field the balls share.
+            capacity (int, optional): Most balls in play. Defaults to 4096.
+            size (float, optional): Diameter of the balls. Defaults to a third of
+                the match ball.
+            seed (int, optional): Seed of the serve directions. Defaults to None.
+        """
+        self.match = match
+        self.capacity = capacity
+        self.size = size
+        self.count = 0
+        self.x = array("d", bytes(8 * capacity))
+        self.y = array("d", bytes(8 * capacity))
+        self.vx = array("d", bytes(8 * capacity))
+        self.vy = array("d", bytes(8 * capacity))
+        self.collisions = 0
+        self.served = 0
+        self._random = random.Random(seed)
+        self._cell = array("l", bytes(8 * capacity))
+        self._order = array("l", bytes(8 * capacity))
+        self._grid = None
+        self._starts = array("l")
+        self._fill = array("l")
+        self._zeros = array("l")
+
+    def ball_size(self) -> float:
+        """Returns the diameter of the balls.
+
+        Returns:
+            float: The fixed size, or a third of the match ball.
+        """
+        return self.size or self.match.ball_size * SIZE_RATIO
+
+    def spawn(self, n: int) -> int:
+        """Serves balls from the center of the field, as far as the pool allows.
+
+        Args:
+            n (int): Balls to add.
+
+        Returns:
+            int: Balls added.
+        """
+        n = min(n, self.capacity - self.count)
+        for i in range(self.count, self.count + n):
+            self._serve(i)
+        self.count += n
+        return n
+
+    def clear(self) -> None:
+        """Takes every ball out of play."""
+        self.count = 0
+
+    def remove(self, i: int) -> None:
+        """Takes a ball out of play, the last ball in play takes its slot.
+
+        Args:
+            i (int): Index of the ball.
+        """
+        last = self.count - 1
+        for values in (self.x, self.y, self.vx, self.vy):
+            values[i] = values[last]
+        self.count = last
+
+    def _serve(self, i: int) -> None:
+        """Puts a ball near the center with the serve speed in a random direction.
+
+        Args:
+            i (int): Index of the ball.
+        """
+        match = self.match
+        rng = self._random
+        size = self.ball_size()
+        # Spread over a disc, so new balls don't start on top of each other
+        radius = match.width / 4 * sqrt(rng.random())
+        angle = 2 * pi * rng.random()
+        self.x[i] = (match.width - size) / 2 + radius * cos(angle)
+        self.y[i] = (match.height - size) / 2 + radius * sin(angle)
+        # Steer away from the horizontal, or the ball would never reach a paddle
+        angle = rng.uniform(pi / 6, 5 * pi / 6) + (pi if rng.random() < 0.5 else 0)
+        speed = match.serve_speed * sqrt(2)
+        self.vx[i] = speed * cos(angle)
+        self.vy[i] = speed * sin(angle)
+        self.served += 1
+
+    def _layout_grid(self, size: float) -> tuple:
+        """Returns the grid dimensions, reallocating its arrays if they changed.
+
+        Args:
+            size (float): Diameter of the balls, the cell size.
+
+        Returns:
+            tuple: Number of columns and rows.
+        """
+        columns = int(self.match.width / size) + 1
+        rows = int(self.match.height / size) + 1
+        if self._grid != (columns, rows):
+            self._grid = columns, rows
+            cells = columns * rows + 1
+            self._starts = array("l", bytes(8 * cells))
+            self._fill = array("l", bytes(8 * cells))
+            self._zeros = array("l", bytes(8 * cells))
+        return columns, rows
+
+    def step(self, dt: float = 1.0) -> None:
+        """Advances every ball by one tick.
+
+        Args:
+            dt (float, optional): Length of the tick in units of the base tick.
+                Defaults to 1.
+        """
+        match = self.match
+        size = self.ball_size()
+        xs = self.x
+        ys = self.y
+        vxs = self.vx
+        vys = self.vy
+        right = match.width - size
+        top = match.height - size
+
+        # Move, reflect off the side walls, re-serve the balls out of the field
+        i = 0
+        while i < self.count:
+            x = xs[i] + vxs[i] * dt
+            y = ys[i] + vys[i] * dt
+            if x < 0:
+                x = -x
+                vxs[i] = -vxs[i]
+            elif x > right:
+                x = 2 * right - x
+                vxs[i] = -vxs[i]
+            if y < 0 or y > top:
+                self._serve(i)
+            else:
+                xs[i] = x
+                ys[i] = y
+            i += 1
+
+        self._bounce_paddles(size)
+        self._collide(size)
+
+    def _bounce_paddles(self, size: float) -> None:
+        """Reflects the balls that overlap a paddle and move into it.
+
+        The reflection is the one of `engine.Match`, across the normal from the
+        closest point of the paddle, without the speed-up.
+
+        Args:
+            size (float): Diameter of the balls.
+        """
+        match = self.match
+        xs = self.x
+        ys = self.y
+        vxs = self.vx
+        vys = self.vy
+        radius = size / 2
+        paddle_width = match.paddle_width
+        paddle_height = match.paddle_height
+        for paddle_x, paddle_y in (
+            (match.player_x, match.player_y),
+            (match.opponent_x, match.opponent_y),
+        ):
+            paddle_right = paddle_x + paddle_width
+            paddle_top = paddle_y + paddle_height
+            low = paddle_y - size
+            for i in range(self.count):
+                y = ys[i]
+                if y < low or y > paddle_top:
+                    continue
+                x = xs[i]
+                if x + size < paddle_x or x > paddle_right:
+                    continue
+                cx = x + radius
+                cy = y + radius
+                nx = cx - max(paddle_x, min(cx, paddle_right))
+                ny = cy - max(paddle_y, min(cy, paddle_top))
+                if not (nx or ny):
+                    # Center inside the paddle, push it out vertically
+                    ny = 1.0 if cy > paddle_y + paddle_height / 2 else -1.0
+                vx = vxs[i]
+                vy = vys[i]
+                dot = vx * nx + vy * ny
+                if dot >= 0:
+                    continue
+                dot /= nx * nx + ny * ny
+                vxs[i] = vx - 2 * dot * nx
+                vys[i] = vy - 2 * dot * ny
+
+    def _collide(self, size: float) -> None:
+        """Resolves the ball-ball collisions through the uniform grid.
+
+        Colliding balls exchange the velocity components along the line between
+        their centers, an elastic collision of equal masses, and are pushed apart.
+
+        Args:
+            size (float): Diameter of the balls, also the cell size.
+        """
+        n = self.count
+        columns, rows = self._layout_grid(size)
+        xs = self.x
+        ys = self.y
+        vxs = self.vx
+        vys = self.vy
+        cell = self._cell
+        order = self._order
+        starts = self._starts
+        fill = self._fill
+        inverse = 1 / size
+        last_column = columns - 1
+        last_row = rows - 1
+
+        # Counting sort of the balls by cell
+        starts[:] = self._zeros
+        for i in range(n):
+            column = min(max(int(xs[i] * inverse), 0), last_column)
+            row = min(max(int(ys[i] * inverse), 0), last_row)
+            c = cell[i] = row * columns + column
+            starts[c + 1] += 1
+        for c in range(columns * rows):
+            starts[c + 1] += starts[c]
+        fill[:] = starts
+        for i in range(n):
+            c = cell[i]
+            order[fill[c]] = i
+            fill[c] += 1
+
+        # Each pair of cells is visited once: the cell itself, then the neighbours
+        # to the right and in the row above
+        limit = size * size
+        collisions = 0
+        for k in range(n):
+            i = order[k]
+            c = cell[i]
+            column = c % columns
+            xi = xs[i]
+            yi = ys[i]
+            for neighbour in (c, c + 1, c + columns - 1, c + columns, c + columns + 1):
+                if neighbour == c:
+                    first = k + 1
+                else:
+                    offset = neighbour - c
+                    if (offset == 1 or offset == columns + 1) and column == last_column:
+                        continue
+                    if offset == columns - 1 and column == 0:
+                        continue
+                    if neighbour >= columns * rows:
+                        continue
+                    first = starts[neighbour]
+                for m in range(first, starts[neighbour + 1]):
+                    j = order[m]
+                    dx = xs[j] - xi
+                    dy = ys[j] - yi
+                    distance = dx * dx + dy * dy
+                    if distance >= limit or not distance:
+                        continue
+                    distance = sqrt(distance)
+                    nx = dx / distance
+                    ny = dy / distance
+                    # Push the balls apart along the normal
+                    push = (size - distance) / 2
+                    xs[i] = xi = xi - nx * push
+                    ys[i] = yi = yi - ny * push
+                    xs[j] += nx * push
+                    ys[j] += ny * push
+                    # Exchange the normal velocities if they approach
+                    approach = (vxs[j] - vxs[i]) * nx + (vys[j] - vys[i]) * ny
+                    if approach < 0:
+                        vxs[i] += approach * nx
+                        vys[i] += approach * ny
+                        vxs[j] -= approach * nx
+                        vys[j] -= approach * ny
+                        collisions += 1
+        self.collisions += collisions
+
+
+class MultiBallRenderer:
+    """Draws the balls of a `MultiBall` as point sprites.
+
+    Balls in the player's (bottom, black) half are drawn white and balls in the
+    opponent's (top, white) half are drawn black, like the match ball. Each half is
+    one `Point` instruction textured with a disc, and the coordinate lists are
+    reused from frame to frame.
+
+    Attributes:
+        multiball (MultiBall): The balls.
+        group (kivy.graphics.InstructionGroup): The instructions.
+    """
+
+    def __init__(self, canvas, multiball: MultiBall):
+        """Builds the instructions and adds them to a canvas.
+
+        Args:
+            canvas (kivy.graphics.Canvas): Canvas to draw on, usually the `after`
+                group of the game canvas.
+            multiball (MultiBall): The balls.
+        """
+        from kivy.graphics import Color, InstructionGroup, Point
+
+        self.multiball = multiball
+        self._bottom = []
+        self._top = []
+        texture = disc_texture()
+        self.group = InstructionGroup()
+        self.group.add(Color(1, 1, 1, 1))
+        self.bottom = Point(points=[], texture=texture)
+        self.group.add(self.bottom)
+        self.group.add(Color(0, 0, 0, 1))
+        self.top = Point(points=[], texture=texture)
+        self.group.add(self.top)
+        canvas.add(self.group)
+
+    def draw(self, scale: float = 1.0) -> None:
+        """Writes the ball centers into the point instruction of their half.
+
+        Args:
+            scale (float, optional): Pixels per field unit. Defaults to 1.
+        """
+        multiball = self.multiball
+        radius = multiball.ball_size() / 2
+        center = multiball.match.height / 2 - radius
+        bottom = self._bottom
+        top = self._top
+        del bottom[:]
+        del top[:]
+        xs = multiball.x
+        ys = multiball.y
+        for i in range(multiball.count):
+            y = ys[i]
+            points = top if y > center else bottom
+            points.append((xs[i] + radius) * scale)
+            points.append((y + radius) * scale)
+        self.bottom.pointsize = self.top.pointsize = radius * scale
+        self.bottom.points = bottom
+        self.top.points = top
+
+
+def disc_texture(size: int = 32):
+    """Creates a white disc texture with an antialiased edge.
+
+    Args:
+        size (int, optional): Width and height in pixels. Defaults to 32.
+
+    Returns:
+        kivy.graphics.texture.Texture: The texture.
+    """
+    from kivy.graphics.texture import Texture
+
+    pixels = bytearray(4 * size * size)
+    radius = size / 2
+    for y in range(size):
+        for x in range(size):
+            distance = sqrt((x + 0.5 - radius) ** 2 + (y + 0.5 - radius) ** 2)
+            alpha = max(0.0, min(1.0, radius - distance))
+            offset = 4 * (y * size + x)
+            pixels[offset : offset + 4] = bytes((255, 255, 255, int(alpha * 255)))
+    texture = Texture.create(size=(size, size), colorfmt="rgba")
+    texture.blit_buffer(bytes(pixels), colorfmt="rgba", bufferfmt="ubyte")
+    return texture
+
+
+def frame_cost(n: int, rate: float, frames: int, render: bool) -> float:
+    """Measures the mean cost of a frame with `n` balls.
+
+    A frame simulates the physics steps due at the render rate and draws once.
+
+    Args:
+        n (int): Balls in play.
+        rate (float): Render rate, in Hz.
+        frames (int): Frames measured, after as many warm-up frames.
+        render (bool): Whether to fill the point instructions too.
+
+    Returns:
+        float: Mean seconds per frame.
+    """
+    match = Match(1080.0, 1920.0)
+    multiball = MultiBall(match, n, seed=n)
+    multiball.spawn(n)
+    renderer = None
+    if render:
+        # The window provides the GL context the texture needs
+        from kivy.core.window import Window  # noqa: F401
+        from kivy.graphics import InstructionGroup
+
+        renderer = MultiBallRenderer(InstructionGroup(), multiball)
+    steps = max(int(round(PHYSICS_RATE / rate)), 1)
+    dt = BASE_TICK_RATE / PHYSICS_RATE
+    elapsed = 0.0
+    for frame in range(2 * frames):
+        start = perf_counter()
+        for _ in range(steps):
+            multiball.step(dt)
+        if renderer is not None:
+            renderer.draw()
+        if frame >= frames:
+            elapsed += perf_counter() - start
+    return elapsed / frames
+
+
+def sustainable(rate: float, frames: int, render: bool, budget: float) -> int:
+    """Finds the most balls whose frames fit in a share of the frame budget.
+
+    Args:
+        rate (float): Render rate, in Hz.
+        frames (int): Frames measured per ball count.
+        render (bool): Whether drawing counts towards the cost.
+        budget (float): Share of the frame interval the balls may use.
+
+    Returns:
+        int: The ball count.
+    """
+    limit = budget / rate
+    low, high = 0, 64
+    while frame_cost(high, rate, frames, render) <= limit:
+        low, high = high, high * 2
+    while high - low > max(low // 32, 1):
+        middle = (low + high) // 2
+        if frame_cost(middle, rate, frames, render) <= limit:
+            low = middle
+        else:
+            high = middle
+    return low
+
+
+def main() -> None:
+    """Command line entry point."""
+    # Keep Kivy away from the command line arguments
+    os.environ.setdefault("KIVY_NO_ARGS", "1")
+    parser = argparse.ArgumentParser(description="Measures the multi-ball mode.")
+    parser.add_argument("--frames", type=int, default=30, help="frames per count")
+    parser.add_argument("--budget", type=float, default=0.5,
+                        help="share of the frame interval for the balls")
+    parser.add_argument("--render", action="store_true", help="include drawing")
+    args = parser.parse_args()
+
+    for rate in RATES:
+        n = sustainable(rate, args.frames, args.render, args.budget)
+        cost = frame_cost(n, rate, args.frames, args.render)
+        print(
+            f"{rate:.0f} Hz: {n} balls, {cost * 1000:.2f} ms per frame "
+            f"({args.budget:.0%} of {1000 / rate:.2f} ms)"
+        )
+
+
+if __name__ == "__main__":
+    main()
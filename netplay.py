@@ -0,0 +1,584 @@
+"""Two-device play over UDP with input delay and rollback.
+
+Each device simulates the whole match and owns one paddle. Paddle inputs are
+exchanged as targets for `Match.move_paddle()`, stamped with the tick they apply to.
+A local input is scheduled `INPUT_DELAY` ticks ahead, which hides that much latency
+outright. When a remote input is late, `RollbackSession` predicts it by repeating
+the last known one and keeps simulating. Once the real input arrives and differs
+from the prediction, the session restores the snapshot taken before that tick and
+simulates the ticks since then again, all within the current frame. The session
+stalls rather than predict more than `MAX_ROLLBACK` ticks ahead of the remote
+inputs, which bounds the work of a rollback.
+
+`Peer` is the asyncio UDP transport. Every packet repeats the local inputs the
+other side hasn't acknowledged yet, so a lost packet costs nothing but latency. It
+can inject latency, jitter and packet loss into its sends for testing.
+
+Both devices simulate the same `FIELD`, in field units, whatever the size of
+their screens, and the game draws it letterboxed. Restarting after a game over is
+an input too, so both sides restart on the same tick. With `--fixed` both simulate
+the fixed-point physics of `fixedpoint.py`, which stays identical across CPU
+architectures.
+
+Run two headless peers over localhost and compare their final states:
+
+    python netplay.py --test --latency 0.05 --jitter 0.02 --loss 0.1
+
+Or play a networked game, one command per device:
+
+    python netplay.py --side player --port 9000 --peer 192.168.1.20:9001 --gui
+    python netplay.py --side opponent --port 9001 --peer 192.168.1.10:9000 --gui
+"""
+
+import argparse
+import asyncio
+import random
+import struct
+import subprocess
+import sys
+from math import inf, isnan, nan
+from time import perf_counter
+
+from engine import FIELD_HEIGHT, OPPONENT, PLAYER, Match
+from fixedpoint import FixedMatch, state_hash
+from layout import Layout
+from timestep import PHYSICS_RATE, FixedTimestep
+
+# Ticks a local input is scheduled ahead
+INPUT_DELAY = 2
+
+# Most ticks simulated ahead of the last confirmed remote input
+MAX_ROLLBACK = 8
+
+# Most inputs repeated in one packet
+MAX_INPUTS = 32
+
+# First tick of the inputs, last remote tick confirmed by the sender, input count,
+# followed by one double per input, NaN when the paddle wasn't moved
+PACKET = struct.Struct("<iiB")
+INPUT = struct.Struct("<d")
+
+# Input restarting the match after a game over, on both sides
+RESTART = inf
+
+# Geometry of the match shared by both sides, the arguments of `Match.resize()`: a
+# 9:16 field laid out like the game screen, a score line as tall as its font size
+FIELD = Layout(
+    FIELD_HEIGHT * 9 / 16, FIELD_HEIGHT, lambda font_size: font_size
+).field()
+
+# Sides by name, for the command line
+SIDES = {"player": PLAYER, "opponent": OPPONENT}
+
+
+def same_input(a: float, b: float) -> bool:
+    """Compares two inputs, NaN meaning no input.
+
+    Args:
+        a (float): First input.
+        b (float): Second input.
+
+    Returns:
+        bool: True if they are equal or both missing.
+    """
+    return a == b or (isnan(a) and isnan(b))
+
+
+class RollbackSession:
+    """Simulates a match from local inputs and late remote inputs.
+
+    Attributes:
+        match (engine.Match): The simulated match, on the shared `FIELD`.
+        side (int): Side of the local paddle.
+        input_delay (int): Ticks a local input is scheduled ahead.
+        max_rollback (int): Most ticks simulated ahead of the remote inputs.
+        tick_length (float): Length of a tick in base ticks.
+        connected (bool): Whether the remote side has been heard from.
+        tick (int): Next tick to simulate.
+        confirmed (int): Last tick up to which all remote inputs are known.
+        rollbacks (int): Number of rollbacks.
+        max_depth (int): Most ticks simulated again by one rollback.
+        last_depth (int): Ticks simulated again by the last rollback.
+        resimulation (float): Total time spent simulating again, in seconds.
+        last_resimulation (float): Time spent by the last rollback, in seconds.
+        stalls (int): Ticks not simulated because the remote side was too late.
+    """
+
+    def __init__(
+        self,
+        match: Match,
+        side: int,
+        input_delay: int = INPUT_DELAY,
+        max_rollback: int = MAX_ROLLBACK,
+        tick_length: float = 1.0,
+    ):
+        """Initializes the session at tick 0 and lays the match out on `FIELD`.
+
+        Args:
+            match (engine.Match): The match, in the same state on both sides.
+            side (int): Side of the local paddle.
+            input_delay (int, optional): Ticks a local input is scheduled ahead.
+                Defaults to 2.
+            max_rollback (int, optional): Most ticks simulated ahead of the remote
+                inputs. Defaults to 8.
+            tick_length (float, optional): Length of a tick in base ticks. Defaults
+                to 1.
+        """
+        self.match = match
+        match.resize(*FIELD)
+        self.side = side
+        self.input_delay = input_delay
+        self.max_rollback = max_rollback
+        self.tick_length = tick_length
+        self.connected = False
+        self.tick = 0
+        self.confirmed = -1
+        self.rollbacks = 0
+        self.max_depth = 0
+        self.last_depth = 0
+        self.resimulation = 0.0
+        self.last_resimulation = 0.0
+        self.stalls = 0
+        # The first ticks come before any delayed input
+        self.local_inputs = {tick: nan for tick in range(input_delay)}
+        self.remote_inputs = {}
+        self._pending = nan
+        self._restart = False
+        self._predicted = {}
+        self._reported = {}
+        self._snapshots = {}
+        self._rollback_to = None
+        self._last_remote = nan
+
+    def set_local_input(self, target_x: float) -> None:
+        """Sets the paddle target scheduled on the next simulated tick.
+
+        Args:
+            target_x (float): Requested horizontal center of the local paddle.
+        """
+        self._pending = target_x
+
+    def request_restart(self) -> None:
+        """Schedules a restart on the next simulated tick.
+
+        The match restarts on that tick on both sides, if it is over by then.
+        """
+        self._restart = True
+
+    def add_remote_input(self, tick: int, target_x: float) -> None:
+        """Stores a remote input and schedules a rollback if it was mispredicted.
+
+        Args:
+            tick (int): Tick the input applies to.
+            target_x (float): Requested paddle center, NaN for no move.
+        """
+        if tick <= self.confirmed or tick in self.remote_inputs:
+            return
+        self.remote_inputs[tick] = target_x
+        while self.confirmed + 1 in self.remote_inputs:
+            self.confirmed += 1
+            remote = self.remote_inputs[self.confirmed]
+            # A restart is never predicted, the paddle just stays put
+            self._last_remote = nan if remote == RESTART else remote
+        if tick < self.tick and not same_input(self._predicted[tick], target_x):
+            if self._rollback_to is None or tick < self._rollback_to:
+                self._rollback_to = tick
+
+    def update(self, steps: int, on_events=None) -> int:
+        """Rolls back if needed, then simulates new ticks.
+
+        Every event is reported once: the events of the new ticks, and those a
+        rollback finds in a resimulated tick that weren't reported for it before.
+
+        Args:
+            steps (int): Ticks due since the previous update.
+            on_events (callable, optional): Called with the event flags to report
+                right after their tick, while the match is in its state after that
+                tick. Defaults to None.
+
+        Returns:
+            int: Bitwise OR of the reported event flags.
+        """
+        events = 0
+        if self._rollback_to is not None:
+            start = perf_counter()
+            depth = self.tick - self._rollback_to
+            self.match.restore(self._snapshots[self._rollback_to])
+            reported = self._reported
+            for tick in range(self._rollback_to, self.tick):
+                new = self._simulate(tick) & ~reported[tick]
+                if new:
+                    reported[tick] |= new
+                    events |= new
+                    if on_events is not None:
+                        on_events(new)
+            self._rollback_to = None
+            self.last_resimulation = perf_counter() - start
+            self.resimulation += self.last_resimulation
+            self.last_depth = depth
+            self.max_depth = max(self.max_depth, depth)
+            self.rollbacks += 1
+
+        for _ in range(steps):
+            if self.tick - self.confirmed > self.max_rollback:
+                self.stalls += 1
+                continue
+            scheduled = RESTART if self._restart else self._pending
+            self.local_inputs[self.tick + self.input_delay] = scheduled
+            self._pending = nan
+            self._restart = False
+            tick_events = self._reported[self.tick] = self._simulate(self.tick)
+            if tick_events:
+                events |= tick_events
+                if on_events is not None:
+                    on_events(tick_events)
+            self.tick += 1
+
+        # Nothing before the first unconfirmed tick can be rolled back to
+        for tick in [tick for tick in self._snapshots if tick <= self.confirmed]:
+            del self._snapshots[tick]
+            del self._predicted[tick]
+            del self._reported[tick]
+            self.remote_inputs.pop(tick, None)
+        return events
+
+    def _simulate(self, tick: int) -> int:
+        """Snapshots the match and simulates one tick with its inputs.
+
+        Args:
+            tick (int): The tick.
+
+        Returns:
+            int: Event flags of the tick.
+        """
+        match = self.match
+        self._snapshots[tick] = match.snapshot()
+        remote = self.remote_inputs.get(tick, self._last_remote)
+        self._predicted[tick] = remote
+        local = self.local_inputs.get(tick, nan)
+        for side, target in ((self.side, local), (1 - self.side, remote)):
+            if target == RESTART:
+                if not match.started:
+                    match.start()
+            elif not isnan(target):
+                match.move_paddle(side, target)
+        return match.step(self.tick_length)
+
+    def stats(self) -> str:
+        """Formats the rollback statistics.
+
+        Returns:
+            str: Rollback count, depths and re-simulation times.
+        """
+        mean = self.resimulation / self.rollbacks if self.rollbacks else 0.0
+        return (
+            f"tick {self.tick}, confirmed {self.confirmed}, "
+            f"rollbacks {self.rollbacks}, depth {self.last_depth} "
+            f"(max {self.max_depth}), resimulation {mean * 1000:.3f} ms "
+            f"(total {self.resimulation * 1000:.1f} ms), stalls {self.stalls}"
+        )
+
+
+class Peer(asyncio.DatagramProtocol):
+    """Exchanges the inputs of a `RollbackSession` with the remote side.
+
+    Attributes:
+        session (RollbackSession): The local session.
+        address (tuple): Host and port of the remote side.
+        latency (float): Delay added to every send, in seconds.
+        jitter (float): Largest random delay added on top, in seconds.
+        loss (float): Probability of dropping a packet.
+        sent (int): Packets sent, including dropped ones.
+        received (int): Packets received.
+    """
+
+    def __init__(
+        self,
+        session: RollbackSession,
+        address: tuple,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        loss: float = 0.0,
+        seed: int = None,
+    ):
+        """Initializes the peer.
+
+        Args:
+            session (RollbackSession): The local session.
+            address (tuple): Host and port of the remote side.
+            latency (float, optional): Delay added to every send, in seconds.
+                Defaults to 0.
+            jitter (float, optional): Largest random delay added on top, in
+                seconds. Defaults to 0.
+            loss (float, optional): Probability of dropping a packet. Defaults
+                to 0.
+            seed (int, optional): Seed of the injected faults. Defaults to None.
+        """
+        self.session = session
+        self.address = address
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.sent = 0
+        self.received = 0
+        self.transport = None
+        self._acked = -1
+        self._random = random.Random(seed)
+
+    def connection_made(self, transport) -> None:
+        """Keeps the transport.
+
+        Args:
+            transport (asyncio.DatagramTransport): The socket.
+        """
+        self.transport = transport
+
+    # noinspection PyUnusedLocal
+    def datagram_received(self, data: bytes, address: tuple) -> None:
+        """Hands the remote inputs of a packet to the session.
+
+        Args:
+            data (bytes): The packet.
+            address (tuple): Host and port of the sender.
+        """
+        try:
+            first, acked, count = PACKET.unpack_from(data)
+        except struct.error:
+            return
+        self.received += 1
+        self.session.connected = True
+        self._acked = max(self._acked, acked)
+        for i in range(count):
+            (target_x,) = INPUT.unpack_from(data, PACKET.size + i * INPUT.size)
+            self.session.add_remote_input(first + i, target_x)
+
+    def send(self) -> None:
+        """Sends the local inputs the remote side hasn't acknowledged."""
+        session = self.session
+        first = self._acked + 1
+        last = min(session.tick + session.input_delay, first + MAX_INPUTS)
+        inputs = session.local_inputs
+        count = 0
+        payload = bytearray()
+        for tick in range(first, last):
+            if tick not in inputs:
+                break
+            payload += INPUT.pack(inputs[tick])
+            count += 1
+        # Inputs stay until the remote side has them and they are simulated for good
+        keep = min(first, session.confirmed + 1, session.tick)
+        for tick in [tick for tick in inputs if tick < keep]:
+            del inputs[tick]
+        data = PACKET.pack(first, session.confirmed, count) + payload
+
+        self.sent += 1
+        if self._random.random() < self.loss:
+            return
+        delay = self.latency + self._random.uniform(0.0, self.jitter)
+        if delay > 0:
+            asyncio.get_running_loop().call_later(
+                delay, self.transport.sendto, data, self.address
+            )
+        else:
+            self.transport.sendto(data, self.address)
+
+
+def parse_address(text: str) -> tuple:
+    """Parses a "host:port" address.
+
+    Args:
+        text (str): The address.
+
+    Returns:
+        tuple: Host and port.
+    """
+    host, _, port = text.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+async def run_headless(args) -> None:
+    """Plays a fixed number of ticks with a synthetic local input.
+
+    Both sides request restarts after a game over at random, the match restarts
+    on the first one scheduled.
+
+    Prints the rollback statistics and a hash of the final match state, which is
+    the same on both sides if they stayed in sync.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments.
+    """
+    match = (FixedMatch if args.fixed else Match)(*FIELD[:2])
+    match.win_score = args.win_score
+    match.start()
+    session = RollbackSession(match, SIDES[args.side])
+    peer = Peer(session, parse_address(args.peer), args.latency, args.jitter,
+                args.loss, args.seed)
+    loop = asyncio.get_running_loop()
+    await loop.create_datagram_endpoint(
+        lambda: peer, local_addr=("127.0.0.1", args.port)
+    )
+
+    rng = random.Random(args.seed + session.side)
+    timestep = FixedTimestep(PHYSICS_RATE)
+    frame = 1.0 / PHYSICS_RATE
+    last = perf_counter()
+    worst = 0.0
+    done_at = None
+    while done_at is None or perf_counter() - done_at < 0.5:
+        await asyncio.sleep(frame)
+        now = perf_counter()
+        steps = timestep.advance(now - last)
+        last = now
+        if session.connected:
+            if rng.random() < 0.3:
+                session.set_local_input(rng.uniform(0.0, match.width))
+            if not match.started and rng.random() < 0.05:
+                session.request_restart()
+            start = perf_counter()
+            session.update(min(steps, args.ticks - session.tick))
+            worst = max(worst, perf_counter() - start)
+        peer.send()
+        if (
+            done_at is None
+            and session.tick == args.ticks
+            and session.confirmed >= args.ticks - 1
+        ):
+            session.update(0)
+            done_at = perf_counter()
+
+    digest = state_hash(match)
+    print(f"{args.side}: {session.stats()}, worst update {worst * 1000:.3f} ms")
+    print(f"{args.side}: sent {peer.sent}, received {peer.received}, state {digest}")
+
+
+def run_test(args) -> None:
+    """Runs both sides in two processes over localhost and compares their states.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments.
+    """
+    common = [
+        sys.executable, __file__, "--ticks", str(args.ticks),
+        "--win-score", str(args.win_score),
+        "--latency", str(args.latency), "--jitter", str(args.jitter),
+        "--loss", str(args.loss), "--seed", str(args.seed),
+    ] + (["--fixed"] if args.fixed else [])
+    processes = [
+        subprocess.Popen(
+            common + ["--side", side, "--port", str(port), "--peer", f":{peer}"],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        for side, port, peer in (
+            ("player", args.port, args.port + 1),
+            ("opponent", args.port + 1, args.port),
+        )
+    ]
+    digests = set()
+    for process in processes:
+        output = process.communicate()[0]
+        print(output, end="")
+        digests.add(output.split()[-1])
+    print("in sync" if len(digests) == 1 else "OUT OF SYNC")
+    sys.exit(0 if len(digests) == 1 else 1)
+
+
+def run_app(args) -> None:
+    """Plays a networked game, the local touches drive the local paddle.
+
+    The game is letterboxed to the aspect ratio of the shared `FIELD`.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments.
+    """
+    from kivy.clock import Clock
+    from kivy.core.window import Window
+    from kivy.uix.anchorlayout import AnchorLayout
+    from kivy.uix.relativelayout import RelativeLayout
+
+    from main import PongApp
+
+    app = PongApp()
+    app.fixed = args.fixed
+
+    # noinspection PyUnusedLocal
+    def on_start(*largs) -> None:
+        game = app.root
+        session = RollbackSession(
+            game.match, SIDES[args.side], tick_length=game.tick_length
+        )
+        if game.recorder is not None:
+            print("Recording: the remote inputs of a networked game aren't recorded.")
+            game.stop_recording()
+        game.session = session
+        peer = Peer(session, parse_address(args.peer), args.latency, args.jitter,
+                    args.loss, args.seed)
+
+        # The game draws and takes touches in the coordinates of its box
+        frame = AnchorLayout()
+        box = RelativeLayout(size_hint=(None, None))
+
+        # noinspection PyUnusedLocal
+        def fit(*args) -> None:
+            scale = min(frame.width / FIELD[0], frame.height / FIELD[1])
+            box.size = FIELD[0] * scale, FIELD[1] * scale
+
+        frame.bind(size=fit)
+        Window.remove_widget(game)
+        box.add_widget(game)
+        frame.add_widget(box)
+        Window.add_widget(frame)
+        game.sync_layout()
+
+        # noinspection PyUnusedLocal
+        def tick(dt: float) -> None:
+            # Both sides start the match once they hear from each other
+            if session.connected and not session.tick and not game.match.started:
+                game.match.start()
+                game.begin_match()
+                game.hide_menu()
+            peer.send()
+
+        asyncio.ensure_future(
+            asyncio.get_running_loop().create_datagram_endpoint(
+                lambda: peer, local_addr=("0.0.0.0", args.port)
+            )
+        )
+        Clock.schedule_interval(tick, 1.0 / app.render_rate)
+
+    app.bind(on_start=on_start)
+    asyncio.run(app.async_run(async_lib="asyncio"))
+
+
+def main() -> None:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Networked Pong with rollback.")
+    parser.add_argument("--side", choices=SIDES, default="player")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--peer", default=":9001", help="host:port of the other side")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="seconds")
+    parser.add_argument("--loss", type=float, default=0.0, help="probability")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ticks", type=int, default=1200, help="headless length")
+    parser.add_argument(
+        "--win-score", type=int, default=3, help="headless points per match"
+    )
+    parser.add_argument("--test", action="store_true", help="run both sides")
+    parser.add_argument("--gui", action="store_true", help="play with a window")
+    parser.add_argument(
+        "--fixed", action="store_true", help="deterministic fixed-point physics"
+    )
+    args = parser.parse_args()
+
+    if args.test:
+        run_test(args)
+    elif args.gui:
+        run_app(args)
+    else:
+        asyncio.run(run_headless(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+"""Pooled particles for the ball trail, paddle-hit sparks and score bursts.
+
+Widgets or `Animation` objects per particle would allocate on every frame.
+`ParticleSystem` keeps its particles in typed arrays sized once, one per attribute,
+and removes a dead particle by moving the last live one into its slot, so emitting,
+updating and drawing particles creates no objects that outlive the frame. The number
+of live particles is capped, particles emitted beyond the cap are dropped.
+
+`ParticleRenderer` draws every particle from one mesh whose vertices live in a typed
+array that is rewritten in place, one `struct.pack_into()` per quad, and uploaded
+with a single assignment per frame.
+Particles take the inverse color of the half they are in, like the match ball: the
+texture holds a white and a black column and each particle samples the column of
+its half, with its alpha fading along the rows.
+
+Run the module directly to measure the cost of a frame and check that frames don't
+allocate:
+
+    python particles.py
+"""
+
+import argparse
+import os
+import random
+import struct
+import sys
+from array import array
+from math import cos, pi, sin
+from time import perf_counter
+
+# Default pool size
+CAPACITY = 1024
+
+# Largest pool a renderer can draw, its mesh indices are 16 bits
+MAX_CAPACITY = 65536 // 4
+
+# Vertices of a particle quad, position and texture coordinates of each corner
+QUAD = struct.Struct("16f")
+
+# Directions of the sparks and bursts
+DIRECTIONS = 64
+
+# Effects, as particles emitted, speed in field units per second, lifetime in
+# seconds, and size relative to the match ball
+TRAIL = 1, 0.0, 0.25, 0.6
+SPARKS = 12, 240.0, 0.35, 0.25
+BURST = 48, 420.0, 0.7, 0.35
+
+# Velocity kept per second, the particles slow down as they age
+DRAG = 0.05
+
+
+class ParticleSystem:
+    """A fixed pool of particles moving and fading on the field.
+
+    Particles 0 to `count - 1` are alive. Positions and sizes are in field units.
+
+    Attributes:
+        capacity (int): Size of the pool.
+        limit (int): Most live particles, at most `capacity`.
+        count (int): Live particles.
+        x (array.array): Horizontal centers.
+        y (array.array): Vertical centers.
+        vx (array.array): Horizontal velocities, in units per second.
+        vy (array.array): Vertical velocities, in units per second.
+        age (array.array): Seconds since the particle was emitted.
+        life (array.array): Lifetime, in seconds.
+        size (array.array): Diameter at emission.
+        emitted (int): Particles emitted so far.
+        dropped (int): Particles not emitted because of the limit.
+        track_allocations (bool): Whether frames count the memory blocks they
+            leave allocated.
+        frame_allocations (int): Memory blocks left allocated between the last
+            `begin_frame()` and `end_frame()`, zero unless the frame allocated.
+        allocations (int): Net memory blocks left allocated by all frames so far,
+            blocks freed by a later frame are subtracted. The counts are process
+            wide, blocks allocated meanwhile by other threads, e.g. the platform
+            services worker on its first request, are counted too.
+    """
+
+    def __init__(
+        self,
+        capacity: int = CAPACITY,
+        limit: int = None,
+        seed: int = None,
+        track_allocations: bool = False,
+    ):
+        """Allocates the pool.
+
+        Args:
+            capacity (int, optional): Size of the pool. Defaults to 1024.
+            limit (int, optional): Most live particles. Defaults to the capacity.
+            seed (int, optional): Seed of the particle directions. Defaults to None.
+            track_allocations (bool, optional): Count the memory blocks left
+                allocated by each frame. Defaults to False, counting costs a walk
+                over the allocator arenas.
+        """
+        self.capacity = capacity
+        self.limit = capacity if limit is None else min(limit, capacity)
+        self.count = 0
+        self.x = array("d", bytes(8 * capacity))
+        self.y = array("d", bytes(8 * capacity))
+        self.vx = array("d", bytes(8 * capacity))
+        self.vy = array("d", bytes(8 * capacity))
+        self.age = array("d", bytes(8 * capacity))
+        self.life = array("d", bytes(8 * capacity))
+        self.size = array("d", bytes(8 * capacity))
+        self.emitted = 0
+        self.dropped = 0
+        self.track_allocations = track_allocations
+        self.frame_allocations = 0
+        self.allocations = 0
+        self._random = random.Random(seed).random
+        self._directions = [
+            (cos(2 * pi * i / DIRECTIONS), sin(2 * pi * i / DIRECTIONS))
+            for i in range(DIRECTIONS)
+        ]
+        self._blocks = 0
+
+    def emit(
+        self, x: float, y: float, vx: float, vy: float, life: float, size: float
+    ) -> bool:
+        """Emits one particle, unless the limit is reached.
+
+        Args:
+            x (float): Horizontal center.
+            y (float): Vertical center.
+            vx (float): Horizontal velocity, in units per second.
+            vy (float): Vertical velocity, in units per second.
+            life (float): Lifetime, in seconds.
+            size (float): Diameter.
+
+        Returns:
+            bool: True if the particle was emitted.
+        """
+        i = self.count
+        if i >= self.limit:
+            self.dropped += 1
+            return False
+        self.x[i] = x
+        self.y[i] = y
+        self.vx[i] = vx
+        self.vy[i] = vy
+        self.age[i] = 0.0
+        self.life[i] = life
+        self.size[i] = size
+        self.count = i + 1
+        self.emitted += 1
+        return True
+
+    def effect(self, effect: tuple, x: float, y: float, ball_size: float) -> None:
+        """Emits the particles of an effect, spread in random directions.
+
+        Args:
+            effect (tuple): `TRAIL`, `SPARKS` or `BURST`.
+            x (float): Horizontal center.
+            y (float): Vertical center.
+            ball_size (float): Diameter of the match ball.
+        """
+        n, speed, life, size = effect
+        size *= ball_size
+        directions = self._directions
+        rand = self._random
+        emit = self.emit
+        for _ in range(n):
+            dx, dy = directions[int(rand() * DIRECTIONS)]
+            # Uneven speeds and lifetimes keep the effect from looking like a ring
+            v = speed * (0.5 + rand())
+            emit(x, y, dx * v, dy * v, life * (0.5 + rand() * 0.5), size)
+
+    def clear(self) -> None:
+        """Removes all the particles."""
+        self.count = 0
+
+    def begin_frame(self) -> None:
+        """Starts counting the memory blocks allocated by a frame, if tracking."""
+        if self.track_allocations:
+            self._blocks = sys.getallocatedblocks()
+
+    def end_frame(self) -> None:
+        """Counts the memory blocks left allocated since `begin_frame()`."""
+        if self.track_allocations:
+            blocks = sys.getallocatedblocks() - self._blocks
+            self.frame_allocations = blocks
+            self.allocations += blocks
+
+    def update(self, dt: float) -> None:
+        """Ages and moves the particles, and removes the dead ones.
+
+        Args:
+            dt (float): Seconds since the previous update.
+        """
+        x = self.x
+        y = self.y
+        vx = self.vx
+        vy = self.vy
+        age = self.age
+        life = self.life
+        size = self.size
+        drag = DRAG**dt
+        i = 0
+        n = self.count
+        while i < n:
+            a = age[i] + dt
+            if a >= life[i]:
+                # Move the last live particle into the slot
+                n -= 1
+                x[i] = x[n]
+                y[i] = y[n]
+                vx[i] = vx[n]
+                vy[i] = vy[n]
+                age[i] = age[n]
+                life[i] = life[n]
+                size[i] = size[n]
+                continue
+            age[i] = a
+            x[i] += vx[i] * dt
+            y[i] += vy[i] * dt
+            vx[i] *= drag
+            vy[i] *= drag
+            i += 1
+        self.count = n
+
+
+def gradient_texture():
+    """Creates the 2x2 texture the particles are colored from.
+
+    The left column is white and the right column black. The bottom row is
+    transparent and the top row opaque, and the linear filter blends the rows.
+
+    Returns:
+        kivy.graphics.texture.Texture: The texture.
+    """
+    from kivy.graphics.texture import Texture
+
+    pixels = bytes(
+        (255, 255, 255, 0, 0, 0, 0, 0, 255, 255, 255, 255, 0, 0, 0, 255)
+    )
+    texture = Texture.create(size=(2, 2), colorfmt="rgba")
+    texture.blit_buffer(pixels, colorfmt="rgba", bufferfmt="ubyte")
+    texture.mag_filter = texture.min_filter = "linear"
+    return texture
+
+
+class ParticleRenderer:
+    """Draws the particles of a `ParticleSystem` from a single mesh.
+
+    Every pool slot has a quad in the mesh. The quads of dead particles are
+    collapsed to a point, so the indices never change and only the vertex array is
+    uploaded per frame.
+
+    Attributes:
+        particles (ParticleSystem): The particles.
+        mesh (kivy.graphics.Mesh): The quads.
+        group (kivy.graphics.InstructionGroup): The instructions.
+    """
+
+    def __init__(self, canvas, particles: ParticleSystem):
+        """Builds the mesh and adds it to a canvas.
+
+        Args:
+            canvas (kivy.graphics.Canvas): Canvas to draw on, usually the `after`
+                group of the game canvas.
+            particles (ParticleSystem): The particles.
+
+        Raises:
+            ValueError: If the pool is too large for 16-bit mesh indices.
+        """
+        from kivy.graphics import Color, InstructionGroup, Mesh
+
+        if particles.capacity > MAX_CAPACITY:
+            raise ValueError(f"at most {MAX_CAPACITY} particles can be drawn")
+        self.particles = particles
+        self._vertices = array("f", bytes(4 * 16 * particles.capacity))
+        indices = []
+        for i in range(0, 4 * particles.capacity, 4):
+            indices += (i, i + 1, i + 2, i + 2, i + 3, i)
+        self._drawn = 0
+        self.group = InstructionGroup()
+        self.group.add(Color(1, 1, 1, 1))
+        self.mesh = Mesh(
+            vertices=self._vertices,
+            indices=indices,
+            mode="triangles",
+            texture=gradient_texture(),
+        )
+        self.group.add(self.mesh)
+        canvas.add(self.group)
+
+    def draw(self, split: float, scale: float = 1.0) -> None:
+        """Writes the quads of the live particles and uploads them.
+
+        Particles shrink and fade out as they age.
+
+        Args:
+            split (float): Height of the center line, in field units.
+            scale (float, optional): Pixels per field unit. Defaults to 1.
+        """
+        particles = self.particles
+        vertices = self._vertices
+        xs = particles.x
+        ys = particles.y
+        ages = particles.age
+        lives = particles.life
+        sizes = particles.size
+        n = particles.count
+        pack = QUAD.pack_into
+        for i in range(n):
+            remaining = 1.0 - ages[i] / lives[i]
+            half = sizes[i] * remaining * scale / 2
+            x = xs[i] * scale
+            y = ys[i]
+            # White below the center line, black above, fading out
+            u = 0.75 if y > split else 0.25
+            v = 0.25 + 0.5 * remaining
+            y *= scale
+            left = x - half
+            right = x + half
+            bottom = y - half
+            top = y + half
+            pack(
+                vertices, i * QUAD.size,
+                left, bottom, u, v, right, bottom, u, v,
+                right, top, u, v, left, top, u, v,
+            )
+        # Collapse the quads of the particles that died since the last draw
+        for k in range(n * 16, self._drawn * 16):
+            vertices[k] = 0.0
+        self._drawn = n
+        self.mesh.vertices = vertices
+
+
+def main() -> None:
+    """Command line entry point, exits with status 1 if a frame allocated."""
+    # Keep Kivy away from the command line arguments
+    os.environ.setdefault("KIVY_NO_ARGS", "1")
+    parser = argparse.ArgumentParser(description="Measures the particle system.")
+    parser.add_argument("--frames", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=CAPACITY)
+    parser.add_argument("--render", action="store_true", help="include drawing")
+    args = parser.parse_args()
+
+    particles = ParticleSystem(limit=args.limit, seed=0, track_allocations=True)
+    renderer = None
+    if args.render:
+        # The window provides the GL context the texture needs
+        from kivy.core.window import Window  # noqa: F401
+        from kivy.graphics import InstructionGroup
+
+        renderer = ParticleRenderer(InstructionGroup(), particles)
+    dt = 1 / 120
+    # Long enough for the counters to outgrow the cached small integers
+    warmup = args.frames // 2
+    start = 0.0
+    for frame in range(args.frames):
+        particles.begin_frame()
+        # A trail every frame, sparks a few times a second and a burst now and then
+        particles.effect(TRAIL, 280.0, 500.0 + frame % 200, 33.0)
+        if frame % 30 == 0:
+            particles.effect(SPARKS, 280.0, 120.0, 33.0)
+        if frame % 240 == 0:
+            particles.effect(BURST, 280.0, 980.0, 33.0)
+        particles.update(dt)
+        if renderer is not None:
+            renderer.draw(500.0)
+        particles.end_frame()
+        if frame == warmup:
+            start = perf_counter()
+        elif frame == warmup + 1:
+            # After the frame that settles the float kept by the timer
+            particles.allocations = 0
+    elapsed = perf_counter() - start
+    frames = args.frames - warmup - 1
+    print(
+        f"{elapsed / frames * 1e6:.1f} us per frame, {particles.count} live "
+        f"particles, {particles.emitted} emitted, {particles.dropped} dropped, "
+        f"{particles.allocations} blocks allocated after warm-up"
+    )
+    sys.exit(1 if particles.allocations else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""Opt-in frame instrumentation for the game loop.
+
+`FrameProfiler` records one row per frame into a fixed-size ring buffer of typed
+arrays: the Clock delta and its jitter against the scheduled interval, the time
+spent in each phase of `PongGame.update`, the time spent in garbage collection and
+the number of property dispatches. Nothing is allocated per frame, and the game only
+calls into the profiler when one is enabled.
+
+The buffer can be summarized for an overlay and dumped as JSON or CSV.
+
+`StartupTimer` splits the cold start of the app into named stages.
+
+`WakeupCounter` measures how often the game loop and the Clock wake the CPU.
+"""
+
+import csv
+import gc
+import json
+from array import array
+from time import perf_counter
+
+# Phases of a frame, in the order `PongGame.update` runs them
+PHASES = ("physics", "render", "colors", "events")
+
+# Columns of a frame row
+FIELDS = ("frame", "dt", "jitter") + PHASES + ("gc", "dispatches")
+
+# Default number of frames kept, 10 seconds at 120 Hz
+CAPACITY = 1200
+
+
+class FrameProfiler:
+    """Ring buffer of per-frame timings.
+
+    A frame is recorded by `begin_frame()`, a `mark()` after each phase and
+    `end_frame()`. Phases that don't run in a frame are recorded as 0.
+
+    Attributes:
+        capacity (int): Number of frames kept.
+        interval (float): Scheduled frame interval, in seconds.
+        columns (dict): One `array('d')` per field of `FIELDS`.
+        frames (int): Number of frames recorded so far.
+    """
+
+    def __init__(self, capacity: int = CAPACITY, interval: float = 1.0 / 120.0):
+        """Initializes an empty buffer.
+
+        Args:
+            capacity (int, optional): Number of frames kept. Defaults to 1200.
+            interval (float, optional): Scheduled frame interval, in seconds.
+                Defaults to 1/120.
+        """
+        self.capacity = capacity
+        self.interval = interval
+        self.columns = {name: array("d", bytes(8 * capacity)) for name in FIELDS}
+        self.frames = 0
+        self._row = 0
+        self._last = 0.0
+        self._gc_start = 0.0
+        self._gc_time = 0.0
+
+    def start(self) -> None:
+        """Starts timing the garbage collector."""
+        if self._on_gc not in gc.callbacks:
+            gc.callbacks.append(self._on_gc)
+
+    def stop(self) -> None:
+        """Stops timing the garbage collector."""
+        if self._on_gc in gc.callbacks:
+            gc.callbacks.remove(self._on_gc)
+
+    # noinspection PyUnusedLocal
+    def _on_gc(self, phase: str, info: dict) -> None:
+        """Accumulates the duration of garbage collections.
+
+        Args:
+            phase (str): "start" or "stop".
+            info (dict): Collection details, unused.
+        """
+        if phase == "start":
+            self._gc_start = perf_counter()
+        else:
+            self._gc_time += perf_counter() - self._gc_start
+
+    def begin_frame(self, dt: float) -> None:
+        """Starts recording a frame.
+
+        Args:
+            dt (float): Clock delta of the frame, in seconds.
+        """
+        row = self._row = self.frames % self.capacity
+        columns = self.columns
+        columns["frame"][row] = self.frames
+        columns["dt"][row] = dt
+        columns["jitter"][row] = dt - self.interval
+        for phase in PHASES:
+            columns[phase][row] = 0.0
+        self._last = perf_counter()
+
+    def mark(self, phase: str) -> None:
+        """Records the time since the previous mark as the duration of a phase.
+
+        Args:
+            phase (str): One of `PHASES`.
+        """
+        now = perf_counter()
+        self.columns[phase][self._row] = now - self._last
+        self._last = now
+
+    def end_frame(self, dispatches: int = 0) -> None:
+        """Finishes recording a frame.
+
+        Args:
+            dispatches (int, optional): Property dispatches during the frame.
+                Defaults to 0.
+        """
+        columns = self.columns
+        columns["gc"][self._row] = self._gc_time
+        columns["dispatches"][self._row] = dispatches
+        self._gc_time = 0.0
+        self.frames += 1
+
+    def rows(self):
+        """Yields the recorded frames, oldest first.
+
+        Yields:
+            dict: Field name to value.
+        """
+        count = min(self.frames, self.capacity)
+        first = self.frames - count
+        for frame in range(first, self.frames):
+            row = frame % self.capacity
+            yield {name: column[row] for name, column in self.columns.items()}
+
+    def summary(self) -> dict:
+        """Averages every field over the recorded frames.
+
+        Returns:
+            dict: Field name to mean value, plus the worst jitter as "max_jitter".
+        """
+        count = min(self.frames, self.capacity)
+        if not count:
+            return {}
+        result = {
+            name: sum(column[:count]) / count
+            for name, column in self.columns.items()
+            if name != "frame"
+        }
+        result["max_jitter"] = max(self.columns["jitter"][:count])
+        return result
+
+    def dump(self, path: str) -> None:
+        """Writes the recorded frames to a file.
+
+        Args:
+            path (str): Destination, written as CSV if it ends with ".csv" and as
+                JSON otherwise.
+        """
+        with open(path, "w", newline="") as file:
+            if path.endswith(".csv"):
+                writer = csv.DictWriter(file, fieldnames=FIELDS)
+                writer.writeheader()
+                writer.writerows(self.rows())
+            else:
+                json.dump(
+                    {"summary": self.summary(), "frames": list(self.rows())}, file
+                )
+
+
+class StartupTimer:
+    """Measures the stages of the app startup.
+
+    Each `mark()` closes a stage that began at the previous mark, or at the creation
+    of the timer for the first one.
+
+    Attributes:
+        stages (dict): Stage name to duration, in seconds, in the order marked.
+    """
+
+    def __init__(self):
+        """Starts the first stage."""
+        self.stages = {}
+        self._last = perf_counter()
+
+    def mark(self, stage: str) -> None:
+        """Ends a stage.
+
+        Args:
+            stage (str): Name of the stage.
+        """
+        now = perf_counter()
+        self.stages[stage] = now - self._last
+        self._last = now
+
+    def report(self) -> str:
+        """Formats the stages and their total.
+
+        Returns:
+            str: One line with the duration of every stage, in milliseconds.
+        """
+        total = sum(self.stages.values())
+        stages = ", ".join(
+            f"{stage} {duration * 1000:.1f} ms"
+            for stage, duration in self.stages.items()
+        )
+        return f"Startup: {stages}, total {total * 1000:.1f} ms"
+
+
+class WakeupCounter:
+    """Counts the wakeups of the game loop and of the Clock.
+
+    Attributes:
+        wakeups (int): Game loop wakeups so far.
+    """
+
+    def __init__(self, frames: int = 0):
+        """Starts the first measurement window.
+
+        Args:
+            frames (int, optional): Current Clock frame count. Defaults to 0.
+        """
+        self.wakeups = 0
+        self._since = perf_counter()
+        self._wakeups = 0
+        self._frames = frames
+
+    def rates(self, frames: int) -> tuple:
+        """Returns the wakeup rates since the previous call and starts a new window.
+
+        Args:
+            frames (int): Current Clock frame count.
+
+        Returns:
+            tuple: Game loop wakeups and Clock frames per second.
+        """
+        now = perf_counter()
+        elapsed = max(now - self._since, 1e-9)
+        rates = (
+            (self.wakeups - self._wakeups) / elapsed,
+            (frames - self._frames) / elapsed,
+        )
+        self._since = now
+        self._wakeups = self.wakeups
+        self._frames = frames
+        return rates
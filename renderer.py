@@ -0,0 +1,337 @@
+"""Renderers that draw the match state of `PongGame`.
+
+The match is simulated in field units, see `engine.FIELD_HEIGHT`. Renderers are
+given the `layout.Layout` of the window on every resize and map the match state to
+pixels with its scale as they draw.
+
+`WidgetRenderer` is the original path: the state is copied into the ball and paddle
+widgets, and their kv rules redraw the canvas through property bindings.
+
+`CanvasRenderer` draws the backgrounds, paddles and ball from a single instruction
+group owned by the renderer. Its instructions are written directly from the match
+state once per frame, and the ball and paddle widgets are left as invisible layout
+anchors, so moving the ball dispatches no widget properties at all.
+
+`ShaderRenderer` is the fragment shader path of `glsl_test.py` made into a backend:
+one rectangle covers the field and the shader draws the split background, both
+paddles and the ball, whose color is the inverse of the half it is in. All per-frame
+values are packed into one uniform array, uploaded with a single assignment.
+"""
+
+from math import cos, pi, sin
+
+from kivy.graphics import (
+    BindTexture,
+    Color,
+    InstructionGroup,
+    Mesh,
+    Rectangle,
+    RenderContext,
+)
+
+# Triangles in the ball mesh
+BALL_SEGMENTS = 32
+
+# Fragment shader of `ShaderRenderer`. The scene uniform holds:
+#   scene[0]: ball center x, ball center y, ball radius, ball visibility
+#   scene[1]: player paddle x, player paddle y, opponent paddle x, opponent paddle y
+#   scene[2]: paddle width, paddle height, field width, field height
+SCENE_SHADER = """
+$HEADER$
+
+uniform vec4 scene[3];
+
+float inside(vec2 pos, vec2 origin, vec2 size) {
+    vec2 p = pos - origin;
+    return step(0.0, p.x) * step(0.0, p.y) * step(p.x, size.x) * step(p.y, size.y);
+}
+
+void main(void) {
+    vec4 ball = scene[0];
+    vec4 paddles = scene[1];
+    vec2 paddle_size = scene[2].xy;
+    vec2 field = scene[2].zw;
+    vec2 pos = tex_coord0 * field;
+    float half_height = field.y * 0.5;
+
+    // White opponent half on top of the black player half
+    float ink = step(half_height, pos.y);
+    // White player paddle, black opponent paddle
+    ink = mix(ink, 1.0, inside(pos, paddles.xy, paddle_size));
+    ink = mix(ink, 0.0, inside(pos, paddles.zw, paddle_size));
+    // The ball takes the inverse color of its half
+    float in_ball = ball.w * step(distance(pos, ball.xy), ball.z);
+    ink = mix(ink, 1.0 - step(half_height, ball.y), in_ball);
+
+    gl_FragColor = vec4(vec3(ink), 1.0);
+}
+"""
+
+
+def take_over_canvas(game, instruction) -> None:
+    """Replaces the widget drawing of the scene with a single instruction.
+
+    Clears the canvases of the ball and paddle widgets, removes the kv background
+    instructions of the game canvas and inserts `instruction` before the canvases of
+    the child widgets, so the score labels and the menu are still drawn on top.
+
+    Args:
+        game (PongGame): The game to draw.
+        instruction (kivy.graphics.Instruction): Draws the scene.
+    """
+    for widget in (game.ball, game.player, game.opponent):
+        widget.canvas.clear()
+    child_canvases = {widget.canvas for widget in game.children}
+    for child in list(game.canvas.children):
+        # Vertex instructions remove their texture binding along with them
+        if not isinstance(child, BindTexture) and child not in child_canvases:
+            game.canvas.remove(child)
+    game.canvas.insert(0, instruction)
+
+
+class WidgetRenderer:
+    """Draws the match by updating the ball and paddle widgets.
+
+    Attributes:
+        game (PongGame): The game to draw.
+        scale (float): Pixels per field unit.
+    """
+
+    def __init__(self, game):
+        """Initializes the renderer.
+
+        Args:
+            game (PongGame): The game to draw.
+        """
+        self.game = game
+        self.scale = 1.0
+
+    def resize(self, layout) -> None:
+        """Keeps the scale of a new layout, `PongGame` sizes the widgets.
+
+        Args:
+            layout (layout.Layout): Layout of the window.
+        """
+        self.scale = layout.scale
+
+    def draw(self, ball_x: float, ball_y: float, match) -> None:
+        """Copies the ball and paddle positions into the widgets.
+
+        Args:
+            ball_x (float): Drawn left edge of the ball, in field units.
+            ball_y (float): Drawn bottom edge of the ball, in field units.
+            match (engine.Match): The simulated match.
+        """
+        game = self.game
+        scale = self.scale
+        game.ball.pos = ball_x * scale, ball_y * scale
+        game.player.x = match.player_x * scale
+        game.opponent.x = match.opponent_x * scale
+
+    def set_ball_color(self, color: list) -> None:
+        """Sets the ball color.
+
+        Args:
+            color (list): RGBA color.
+        """
+        self.game.ball.color = color
+
+
+class CanvasRenderer:
+    """Draws the whole scene from one instruction group.
+
+    The group replaces the background instructions of the `<PongGame>` kv rule and
+    the canvases of the ball and paddle widgets. It holds one color and one shape per
+    element: two background rectangles, two paddle rectangles and a ball mesh whose
+    vertices are computed from a precomputed unit circle.
+
+    Attributes:
+        game (PongGame): The game to draw.
+        scale (float): Pixels per field unit.
+        group (kivy.graphics.InstructionGroup): The scene instructions.
+    """
+
+    def __init__(self, game):
+        """Builds the instruction group and takes over the game canvas.
+
+        Args:
+            game (PongGame): The game to draw.
+        """
+        self.game = game
+        self.scale = 1.0
+        self._paddles = None
+        self._circle = [
+            (cos(2 * pi * i / BALL_SEGMENTS), sin(2 * pi * i / BALL_SEGMENTS))
+            for i in range(BALL_SEGMENTS)
+        ]
+        self._vertices = [0.0] * (4 * (BALL_SEGMENTS + 1))
+        indices = []
+        for i in range(BALL_SEGMENTS):
+            indices += (0, i + 1, (i + 1) % BALL_SEGMENTS + 1)
+
+        self.group = InstructionGroup()
+        self.group.add(Color(0, 0, 0, 1))
+        self.player_background = Rectangle()
+        self.group.add(self.player_background)
+        self.group.add(Color(1, 1, 1, 1))
+        self.opponent_background = Rectangle()
+        self.group.add(self.opponent_background)
+        self.group.add(Color(*game.player.color))
+        self.player = Rectangle()
+        self.group.add(self.player)
+        self.group.add(Color(*game.opponent.color))
+        self.opponent = Rectangle()
+        self.group.add(self.opponent)
+        self.ball_color = Color(*game.ball.color)
+        self.group.add(self.ball_color)
+        self.ball = Mesh(vertices=self._vertices, indices=indices, mode="triangles")
+        self.group.add(self.ball)
+
+        take_over_canvas(game, self.group)
+
+    def resize(self, layout) -> None:
+        """Lays the backgrounds out for a new window size.
+
+        Args:
+            layout (layout.Layout): Layout of the window.
+        """
+        width = layout.width
+        height = layout.height
+        self.scale = layout.scale
+        self._paddles = None
+        self.player_background.pos = 0, 0
+        self.player_background.size = width, height / 2
+        self.opponent_background.pos = 0, height / 2
+        self.opponent_background.size = width, height / 2
+
+    def draw(self, ball_x: float, ball_y: float, match) -> None:
+        """Writes the ball vertices and, if they moved, the paddle rectangles.
+
+        Args:
+            ball_x (float): Drawn left edge of the ball, in field units.
+            ball_y (float): Drawn bottom edge of the ball, in field units.
+            match (engine.Match): The simulated match.
+        """
+        paddles = (
+            match.player_x,
+            match.player_y,
+            match.opponent_x,
+            match.opponent_y,
+            match.paddle_width,
+            match.paddle_height,
+        )
+        scale = self.scale
+        if paddles != self._paddles:
+            self._paddles = paddles
+            size = match.paddle_width * scale, match.paddle_height * scale
+            self.player.pos = match.player_x * scale, match.player_y * scale
+            self.player.size = size
+            self.opponent.pos = match.opponent_x * scale, match.opponent_y * scale
+            self.opponent.size = size
+
+        radius = match.ball_size / 2 * scale
+        cx = ball_x * scale + radius
+        cy = ball_y * scale + radius
+        vertices = self._vertices
+        vertices[0] = cx
+        vertices[1] = cy
+        i = 4
+        for x, y in self._circle:
+            vertices[i] = cx + x * radius
+            vertices[i + 1] = cy + y * radius
+            i += 4
+        self.ball.vertices = vertices
+
+    def set_ball_color(self, color: list) -> None:
+        """Sets the ball color.
+
+        Args:
+            color (list): RGBA color.
+        """
+        self.ball_color.rgba = color
+
+
+class ShaderRenderer:
+    """Draws the whole scene with one fragment shader over one rectangle.
+
+    Attributes:
+        game (PongGame): The game to draw.
+        context (kivy.graphics.RenderContext): Holds the shader and the rectangle.
+        scene (list): Values of the scene uniform, see `SCENE_SHADER`.
+    """
+
+    def __init__(self, game):
+        """Compiles the shader and takes over the game canvas.
+
+        Args:
+            game (PongGame): The game to draw.
+
+        Raises:
+            RuntimeError: If the shader doesn't compile.
+        """
+        self.game = game
+        self.context = RenderContext(
+            use_parent_projection=True,
+            use_parent_modelview=True,
+            use_parent_frag_modelview=True,
+        )
+        self.context.shader.fs = SCENE_SHADER
+        if not self.context.shader.success:
+            raise RuntimeError("ShaderError: can't compile the scene shader.")
+        self.rectangle = Rectangle()
+        self.context.add(self.rectangle)
+        self.scene = [[0.0] * 4 for _ in range(3)]
+        self.scene[0][3] = float(game.ball.color[3] > 0)
+        take_over_canvas(game, self.context)
+
+    def resize(self, layout) -> None:
+        """Stretches the rectangle over a new window size.
+
+        The shader maps the texture coordinates to field units itself, so the scene
+        is uploaded in field units.
+
+        Args:
+            layout (layout.Layout): Layout of the window.
+        """
+        self.rectangle.pos = 0, 0
+        self.rectangle.size = layout.width, layout.height
+
+    def draw(self, ball_x: float, ball_y: float, match) -> None:
+        """Packs the frame into the scene uniform and uploads it in one go.
+
+        Args:
+            ball_x (float): Drawn left edge of the ball, in field units.
+            ball_y (float): Drawn bottom edge of the ball, in field units.
+            match (engine.Match): The simulated match.
+        """
+        ball, paddles, sizes = self.scene
+        radius = match.ball_size / 2
+        ball[0] = ball_x + radius
+        ball[1] = ball_y + radius
+        ball[2] = radius
+        paddles[0] = match.player_x
+        paddles[1] = match.player_y
+        paddles[2] = match.opponent_x
+        paddles[3] = match.opponent_y
+        sizes[0] = match.paddle_width
+        sizes[1] = match.paddle_height
+        sizes[2] = match.width
+        sizes[3] = match.height
+        self.context["scene"] = self.scene
+
+    def set_ball_color(self, color: list) -> None:
+        """Shows or hides the ball, the shader picks its color from its half.
+
+        Args:
+            color (list): RGBA color, only the alpha is used.
+        """
+        self.scene[0][3] = float(color[3] > 0)
+        self.context["scene"] = self.scene
+
+
+# Renderers selectable by name
+RENDERERS = {
+    "widgets": WidgetRenderer,
+    "canvas": CanvasRenderer,
+    "shader": ShaderRenderer,
+}
@@ -0,0 +1,262 @@
+"""Recording of matches and their headless replay.
+
+`Recorder` writes a match played in `PongGame` as a compact binary log: a header with
+the length of a physics step and the full `engine.Match` state, followed by records
+stamped with the number of physics steps simulated before them. Records hold the
+paddle moves applied from the touches and the computer opponent, the menu touches of
+`on_touch_down()` that start a match, layout changes, and checkpoints of the ball
+and scores taken on every score and every `CHECKPOINT_INTERVAL` steps.
+
+`replay()` rebuilds the match from the header and runs it without Kivy as fast as
+the CPU allows, applying each record at its step and comparing every checkpoint with
+the replayed state. A recording that replays without mismatches reproduces the
+session exactly, so a recording of a reported bug is a reproduction of it:
+
+    python replay.py session.pongrec
+"""
+
+import argparse
+import struct
+import sys
+from time import perf_counter
+
+from engine import OPPONENT, PLAYER, SCORED, Match
+
+# First bytes of a recording, with the format version
+MAGIC = b"PONGREC1"
+
+# Match state saved in the header, in order, with its struct format
+STATE = (
+    ("width", "d"),
+    ("height", "d"),
+    ("ball_size", "d"),
+    ("paddle_width", "d"),
+    ("paddle_height", "d"),
+    ("player_y", "d"),
+    ("opponent_y", "d"),
+    ("ball_x", "d"),
+    ("ball_y", "d"),
+    ("vx", "d"),
+    ("vy", "d"),
+    ("player_x", "d"),
+    ("opponent_x", "d"),
+    ("player_score", "q"),
+    ("opponent_score", "q"),
+    ("started", "?"),
+    ("tick", "q"),
+    ("serve_speed", "d"),
+    ("speed_multiplier", "d"),
+    ("win_score", "d"),
+    ("continuous", "?"),
+)
+HEADER = struct.Struct("<d" + "".join(fmt for _, fmt in STATE))
+
+# Record kinds, a paddle move uses the side it moves
+MOVE_PLAYER = PLAYER
+MOVE_OPPONENT = OPPONENT
+START = 2
+RESIZE = 3
+CENTER = 4
+CHECKPOINT = 5
+
+# Step count and kind of a record, followed by the payload of its kind
+RECORD = struct.Struct("<IB")
+PAYLOADS = {
+    MOVE_PLAYER: struct.Struct("<d"),
+    MOVE_OPPONENT: struct.Struct("<d"),
+    START: struct.Struct("<"),
+    RESIZE: struct.Struct("<4d"),
+    CENTER: struct.Struct("<"),
+    CHECKPOINT: struct.Struct("<4d2q"),
+}
+
+# Physics steps between two periodic checkpoints, 1 second at 120 Hz
+CHECKPOINT_INTERVAL = 120
+
+
+def checkpoint(match: Match) -> tuple:
+    """Returns the values compared at a checkpoint.
+
+    Args:
+        match (engine.Match): The match.
+
+    Returns:
+        tuple: Ball position and velocity, and both scores.
+    """
+    return (
+        match.ball_x,
+        match.ball_y,
+        match.vx,
+        match.vy,
+        match.player_score,
+        match.opponent_score,
+    )
+
+
+class Recorder:
+    """Writes the inputs and checkpoints of a match to a binary log.
+
+    Attributes:
+        path (str): Destination of the recording.
+        steps (int): Physics steps simulated since the recording started.
+        records (int): Records written.
+    """
+
+    def __init__(self, path: str, match: Match, tick_length: float):
+        """Opens the recording and writes the header.
+
+        Args:
+            path (str): Destination of the recording.
+            match (engine.Match): The match, in its state before the first record.
+            tick_length (float): Length of a physics step in base ticks.
+        """
+        self.path = path
+        self.steps = 0
+        self.records = 0
+        self._next_checkpoint = CHECKPOINT_INTERVAL
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+        self._file.write(
+            HEADER.pack(tick_length, *(getattr(match, name) for name, _ in STATE))
+        )
+
+    def write(self, kind: int, *payload) -> None:
+        """Writes a record at the current step.
+
+        Args:
+            kind (int): One of the record kinds.
+            *payload: Values of the payload of the kind.
+        """
+        self._file.write(RECORD.pack(self.steps, kind))
+        self._file.write(PAYLOADS[kind].pack(*payload))
+        self.records += 1
+
+    def frame(self, steps: int, events: int, match: Match) -> None:
+        """Counts the physics steps of a frame and writes the due checkpoint.
+
+        Args:
+            steps (int): Physics steps simulated in the frame.
+            events (int): Event flags of those steps.
+            match (engine.Match): The match.
+        """
+        self.steps += steps
+        if events & SCORED or self.steps >= self._next_checkpoint:
+            self.write(CHECKPOINT, *checkpoint(match))
+            self._next_checkpoint = self.steps + CHECKPOINT_INTERVAL
+
+    def close(self, match: Match) -> None:
+        """Writes a final checkpoint and closes the recording.
+
+        Args:
+            match (engine.Match): The match.
+        """
+        if not self._file.closed:
+            self.write(CHECKPOINT, *checkpoint(match))
+            self._file.close()
+
+
+def load(path: str):
+    """Reads a recording.
+
+    Args:
+        path (str): The recording.
+
+    Returns:
+        tuple: Length of a physics step, the match in its recorded initial state,
+        and the list of `(step, kind, payload)` records.
+
+    Raises:
+        ValueError: If the file isn't a recording.
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path} is not a Pong recording")
+    offset = len(MAGIC)
+    tick_length, *values = HEADER.unpack_from(data, offset)
+    offset += HEADER.size
+
+    match = Match()
+    for (name, _), value in zip(STATE, values):
+        setattr(match, name, value)
+
+    records = []
+    while offset < len(data):
+        step, kind = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        payload = PAYLOADS[kind]
+        records.append((step, kind, payload.unpack_from(data, offset)))
+        offset += payload.size
+    return tick_length, match, records
+
+
+def replay(path: str) -> dict:
+    """Replays a recording headlessly and checks its checkpoints.
+
+    Args:
+        path (str): The recording.
+
+    Returns:
+        dict: Number of steps and records, elapsed seconds, checkpoints checked,
+        the first mismatching checkpoint as `(step, recorded, replayed)` or None,
+        and the final scores.
+    """
+    tick_length, match, records = load(path)
+    step = match.step
+    steps = 0
+    checkpoints = 0
+    mismatch = None
+    start = perf_counter()
+    for record_step, kind, payload in records:
+        while steps < record_step:
+            step(tick_length)
+            steps += 1
+        if kind == CHECKPOINT:
+            checkpoints += 1
+            state = checkpoint(match)
+            if mismatch is None and state != payload:
+                mismatch = steps, payload, state
+        elif kind == START:
+            match.start()
+        elif kind == RESIZE:
+            match.resize(*payload)
+        elif kind == CENTER:
+            match.center_ball()
+        else:
+            match.move_paddle(kind, payload[0])
+    elapsed = perf_counter() - start
+    return {
+        "steps": steps,
+        "records": len(records),
+        "elapsed": elapsed,
+        "checkpoints": checkpoints,
+        "mismatch": mismatch,
+        "scores": (match.player_score, match.opponent_score),
+    }
+
+
+def main() -> None:
+    """Command line entry point, exits with status 1 on a mismatch."""
+    parser = argparse.ArgumentParser(description="Replays Pong recordings.")
+    parser.add_argument("paths", nargs="+", help="recordings to replay")
+    args = parser.parse_args()
+
+    failed = False
+    for path in args.paths:
+        result = replay(path)
+        rate = result["steps"] / result["elapsed"] if result["elapsed"] else 0.0
+        print(
+            f"{path}: {result['steps']} steps, {result['records']} records, "
+            f"{rate:,.0f} steps/s, score {result['scores'][0]}:"
+            f"{result['scores'][1]}, {result['checkpoints']} checkpoints",
+            "OK" if result["mismatch"] is None else "MISMATCH",
+        )
+        if result["mismatch"] is not None:
+            failed = True
+            step, recorded, replayed = result["mismatch"]
+            print(f"  step {step}: recorded {recorded}, replayed {replayed}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Score display drawn from a pre-rasterized digit atlas.
+
+A Kivy `Label` renders its text through the core text provider into a new texture
+whenever the text or the font size changes. The scores of `PongGame` change on every
+point and their font size follows the height of the window, so each score, resize or
+rotation rasterized both labels again.
+
+`DigitAtlas` rasterizes the ten digits once per font size into a single texture and
+keeps a region of it per digit. `ScoreLabel` draws a score as one textured quad per
+digit, so a score change only swaps the texture regions of its quads. Atlases are
+cached by font size, and a rotation back to an earlier size reuses its atlas.
+"""
+
+from kivy.core.text import Label as CoreLabel
+from kivy.graphics import Color, Rectangle
+from kivy.properties import ListProperty, NumericProperty
+from kivy.uix.widget import Widget
+
+# Glyphs of the atlas, in the order of their value
+DIGITS = "0123456789"
+
+# Digits drawn by a score label, enough for any score
+MAX_DIGITS = 4
+
+# Atlases kept in the cache, one per font size seen
+ATLAS_CACHE_SIZE = 8
+
+# Font size to atlas, oldest first
+_atlases = {}
+
+
+class DigitAtlas:
+    """The ten digits rasterized once into a single texture.
+
+    Attributes:
+        font_size (int): Font size of the glyphs.
+        texture (kivy.graphics.texture.Texture): Texture of all the digits.
+        height (int): Height of a glyph.
+        glyphs (list[tuple]): Texture region and width of each digit.
+    """
+
+    def __init__(self, font_size: int):
+        """Rasterizes the digits.
+
+        Args:
+            font_size (int): Font size of the glyphs.
+        """
+        label = CoreLabel(text=DIGITS, font_size=font_size)
+        label.refresh()
+        self.font_size = font_size
+        self.texture = label.texture
+        self.height = self.texture.height
+        self.glyphs = []
+        left = 0
+        for i in range(1, len(DIGITS) + 1):
+            # The extents of the prefix keep the advance of each digit
+            right = label.get_extents(DIGITS[:i])[0]
+            region = self.texture.get_region(left, 0, right - left, self.height)
+            self.glyphs.append((region, right - left))
+            left = right
+
+
+def atlas(font_size: float) -> DigitAtlas:
+    """Returns the atlas of a font size, rasterizing it on first use.
+
+    Args:
+        font_size (float): Font size, rounded to whole pixels.
+
+    Returns:
+        DigitAtlas: The atlas.
+    """
+    font_size = max(int(round(font_size)), 1)
+    cached = _atlases.get(font_size)
+    if cached is None:
+        if len(_atlases) >= ATLAS_CACHE_SIZE:
+            del _atlases[next(iter(_atlases))]
+        cached = _atlases[font_size] = DigitAtlas(font_size)
+    return cached
+
+
+def line_height(font_size: float) -> int:
+    """Returns the height of a score drawn at a font size.
+
+    Args:
+        font_size (float): Font size.
+
+    Returns:
+        int: Height of the glyphs, in pixels.
+    """
+    return atlas(font_size).height
+
+
+class ScoreLabel(Widget):
+    """Draws a score with one quad per digit from a `DigitAtlas`.
+
+    The widget sizes itself to its digits, like a `Label` sized to its
+    `texture_size`, so the kv layout relying on it is unchanged.
+
+    Attributes:
+        score (NumericProperty): The displayed score.
+        color (ListProperty): Color of the digits.
+        font_size (NumericProperty): Font size of the digits.
+    """
+
+    score = NumericProperty(0)
+    color = ListProperty([1, 1, 1, 1])
+    font_size = NumericProperty(15)
+
+    def __init__(self, **kwargs):
+        """Creates the quads of the digits."""
+        super().__init__(**kwargs)
+        self._atlas = None
+        self._glyphs = []
+        with self.canvas:
+            self._color = Color(*self.color)
+            self._quads = [Rectangle(size=(0, 0)) for _ in range(MAX_DIGITS)]
+        self.fbind("color", self.update_color)
+        self.fbind("font_size", self.update_atlas)
+        self.fbind("score", self.update_digits)
+        self.fbind("pos", self.update_positions)
+        self.update_atlas()
+
+    # noinspection PyUnusedLocal
+    def update_color(self, *args) -> None:
+        """Applies the color of the digits."""
+        self._color.rgba = self.color
+
+    # noinspection PyUnusedLocal
+    def update_atlas(self, *args) -> None:
+        """Switches to the atlas of the font size and redraws the digits."""
+        self._atlas = atlas(self.font_size)
+        self.update_digits()
+
+    # noinspection PyUnusedLocal
+    def update_digits(self, *args) -> None:
+        """Points the quads at the glyphs of the score and resizes the widget."""
+        glyphs = self._atlas.glyphs
+        self._glyphs = [glyphs[int(c)] for c in str(int(self.score))[-MAX_DIGITS:]]
+        height = self._atlas.height
+        width = 0
+        for i, quad in enumerate(self._quads):
+            if i < len(self._glyphs):
+                texture, glyph_width = self._glyphs[i]
+                quad.texture = texture
+                quad.size = glyph_width, height
+                width += glyph_width
+            else:
+                quad.size = 0, 0
+        self.size = width, height
+        self.update_positions()
+
+    # noinspection PyUnusedLocal
+    def update_positions(self, *args) -> None:
+        """Places the quads of the digits side by side."""
+        x, y = self.pos
+        for quad, (_, width) in zip(self._quads, self._glyphs):
+            quad.pos = x, y
+            x += width
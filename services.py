@@ -0,0 +1,166 @@
+"""Background dispatcher for platform services (haptics and notifications).
+
+Plyer calls can be slow, and on platforms without a backend they raise on every
+call. `PlatformServices` keeps them off the game thread: the game only puts a
+request on a queue, and a daemon worker thread performs it. The worker probes each
+capability on its first use and remembers the outcome, so an unsupported service is
+reported once and then skipped. Requests that pile up while the worker is busy are
+coalesced: one vibration of the longest requested duration, and one notification
+per distinct message.
+
+The games of a process share one `PlatformServices`, see `shared()`, so a single
+worker runs however many games are created and an unsupported capability is
+reported once. `close()` stops them.
+"""
+
+import threading
+from queue import SimpleQueue
+
+# Request kinds
+VIBRATE = "vibrate"
+NOTIFY = "notify"
+
+# Messages printed once for an unsupported capability
+UNSUPPORTED = {
+    VIBRATE: "Bzzzz: vibration not supported on your device ;((",
+    NOTIFY: "NotificationError: can't send the notification.",
+}
+
+# The services of the process, see `shared()`
+_shared = None
+
+
+class PlatformServices:
+    """Performs plyer requests on a worker thread.
+
+    Attributes:
+        available (dict): Capability to whether it works, filled on first use.
+        requested (int): Requests enqueued.
+        performed (int): Requests sent to the platform after coalescing.
+        closed (bool): Whether `close()` was called.
+    """
+
+    def __init__(self):
+        """Starts the worker thread."""
+        self.available = {}
+        self.requested = 0
+        self.performed = 0
+        self.closed = False
+        self._queue = SimpleQueue()
+        self._thread = threading.Thread(
+            target=self._run, name="PlatformServices", daemon=True
+        )
+        self._thread.start()
+
+    def vibrate(self, time: float) -> None:
+        """Requests a vibration.
+
+        Args:
+            time (float): Duration, in seconds.
+        """
+        self.requested += 1
+        self._queue.put((VIBRATE, time))
+
+    def notify(self, **kwargs) -> None:
+        """Requests a notification.
+
+        Args:
+            **kwargs: Passed to `plyer.notification.notify()`.
+        """
+        self.requested += 1
+        self._queue.put((NOTIFY, kwargs))
+
+    def close(self, timeout: float = 1.0) -> None:
+        """Stops the worker once the queued requests are done.
+
+        Args:
+            timeout (float, optional): Longest wait for the worker, in seconds.
+                Defaults to 1.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        """Worker loop, performs the queued requests in coalesced batches."""
+        queue = self._queue
+        running = True
+        try:
+            while running:
+                batch = [queue.get()]
+                while not queue.empty():
+                    batch.append(queue.get())
+                if None in batch:
+                    running = False
+                    batch = batch[: batch.index(None)]
+
+                vibration = 0.0
+                notifications = []
+                for kind, payload in batch:
+                    if kind == VIBRATE:
+                        vibration = max(vibration, payload)
+                    elif payload not in notifications:
+                        notifications.append(payload)
+                if vibration:
+                    self._perform(VIBRATE, vibration)
+                for kwargs in notifications:
+                    self._perform(NOTIFY, kwargs)
+        finally:
+            try:
+                # Android threads must detach from the JVM before they end
+                from jnius import detach
+
+                detach()
+            except ImportError:
+                pass
+
+    def _perform(self, kind: str, payload) -> None:
+        """Sends a request to plyer unless the capability is known to be missing.
+
+        Args:
+            kind (str): `VIBRATE` or `NOTIFY`.
+            payload (float | dict): Vibration duration or notification arguments.
+        """
+        if self.available.get(kind) is False:
+            return
+        try:
+            if kind == VIBRATE:
+                from plyer import vibrator
+
+                vibrator.vibrate(time=payload)
+            else:
+                from plyer import notification
+
+                notification.notify(**payload)
+        except Exception as e:
+            if kind not in self.available:
+                self.available[kind] = False
+                print(UNSUPPORTED[kind], f"\n{type(e)}")
+            return
+        self.available[kind] = True
+        self.performed += 1
+
+
+def shared() -> PlatformServices:
+    """Returns the services shared by the games of the process.
+
+    They are started on the first call, and again after they were closed.
+
+    Returns:
+        PlatformServices: The shared services.
+    """
+    global _shared
+    if _shared is None or _shared.closed:
+        available = _shared.available if _shared is not None else {}
+        _shared = PlatformServices()
+        # A capability found missing stays missing
+        _shared.available.update(available)
+    return _shared
+
+
+def close() -> None:
+    """Stops the shared services, if they were started."""
+    if _shared is not None:
+        _shared.close()
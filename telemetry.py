@@ -0,0 +1,488 @@
+"""Match telemetry for gameplay balancing.
+
+`TelemetryWriter` logs the events of the matches played in `PongGame`: one row per
+paddle hit with the position of the hit along the paddle and the ball speed after
+the reflection, and one row per point with the length of its rally (paddle hits
+since the serve) and the time it took. Rows are written into preallocated typed
+arrays, one per column. A full block of rows is handed to a worker thread that
+appends it to the file, and the game carries on in a spare block, so the game loop
+never waits for the disk and allocates nothing while the worker keeps up.
+
+The log is columnar and append-only: a magic header followed by blocks, each one a
+row count and then the values of every column for those rows, back to back, in
+the little-endian byte order of the platforms the game runs on. A block cut short
+by a crash is ignored by the reader.
+
+`TelemetryLog` memory-maps a log and exposes each column as numpy arrays viewing
+the mapped blocks, so millions of events are aggregated without turning them into
+Python objects. numpy is only needed to read logs, the game doesn't import it:
+
+    python telemetry.py session.pongtel [more.pongtel ...]
+"""
+
+import argparse
+import contextlib
+import mmap
+import struct
+import threading
+from array import array
+from math import hypot
+from queue import Empty, SimpleQueue
+
+from engine import (
+    BASE_TICK_RATE,
+    OPPONENT_HIT,
+    OPPONENT_SCORED,
+    PLAYER_HIT,
+    PLAYER_SCORED,
+    SCORED,
+)
+
+# First bytes of a log, with the format version
+MAGIC = b"PONGTEL1"
+
+# Columns of a row, in file order, with their array typecode and numpy dtype
+COLUMNS = (
+    ("tick", "I", "<u4"),  # Match tick of the event
+    ("kind", "B", "u1"),  # Event flag, a paddle hit or a score
+    ("rally", "I", "<u4"),  # Paddle hits since the serve, including this one
+    ("offset", "f", "<f4"),  # Hit position along the paddle, -1 left to 1 right
+    ("speed", "f", "<f4"),  # Ball speed after the last hit, field units per second
+    ("duration", "f", "<f4"),  # Seconds since the serve
+)
+
+# Row count of a block
+BLOCK = struct.Struct("<I")
+
+# Rows per block, about 72 KiB
+BLOCK_SIZE = 4096
+
+# Event flags logged, the paddle hits and the scores
+KINDS = (PLAYER_HIT, OPPONENT_HIT, PLAYER_SCORED, OPPONENT_SCORED)
+
+# Bins of the hit offset histogram over the width of a paddle
+OFFSET_BINS = 10
+
+# Bins of the histograms the duration median and the speed percentile are read
+# from, over the range of their values
+QUANTILE_BINS = 4096
+
+
+class TelemetryWriter:
+    """Logs the paddle hits and points of a match through a worker thread.
+
+    Attributes:
+        path (str): Destination of the log.
+        tick_length (float): Length of a physics step in base ticks.
+        events (int): Rows logged.
+        blocks (int): Blocks handed to the worker.
+        allocated (int): Blocks allocated because the worker fell behind, beyond
+            the two the writer starts with.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        tick_length: float,
+        tick: int = 0,
+        block_size: int = BLOCK_SIZE,
+    ):
+        """Opens the log and starts the worker.
+
+        Args:
+            path (str): Destination of the log.
+            tick_length (float): Length of a physics step in base ticks.
+            tick (int, optional): Current tick of the match, the start of the first
+                rally. Defaults to 0.
+            block_size (int, optional): Rows per block. Defaults to `BLOCK_SIZE`.
+        """
+        self.path = path
+        self.tick_length = tick_length
+        self.events = 0
+        self.blocks = 0
+        self.allocated = 0
+        self._block_size = block_size
+        self._columns = self._new_block()
+        self._row = 0
+        self._rally = 0
+        self._serve_tick = tick
+        self._speed = 0.0
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+        self._free = SimpleQueue()
+        self._free.put(self._new_block())
+        self._full = SimpleQueue()
+        self._thread = threading.Thread(
+            target=self._run, name="TelemetryWriter", daemon=True
+        )
+        self._thread.start()
+
+    def step(self, events: int, match) -> None:
+        """Logs the paddle hits and the point of a physics step.
+
+        Args:
+            events (int): Event flags of the step, logged if non-zero.
+            match (engine.Match | fixedpoint.FixedMatch): The match after the step.
+        """
+        tick = match.tick
+        duration = (tick - self._serve_tick) * self.tick_length / BASE_TICK_RATE
+        for kind in KINDS:
+            if not events & kind:
+                continue
+            if kind & SCORED:
+                self.write(tick, kind, self._rally, 0.0, self._speed, duration)
+                self._rally = 0
+                self._serve_tick = tick
+                self._speed = 0.0
+            else:
+                self._rally += 1
+                half = match.paddle_width / 2
+                paddle_x = match.player_x if kind == PLAYER_HIT else match.opponent_x
+                # Where the ball touched the paddle, it may have moved on since
+                offset = (match.hit_x - paddle_x - half) / half
+                self._speed = hypot(match.vx, match.vy) * BASE_TICK_RATE
+                self.write(tick, kind, self._rally, offset, self._speed, duration)
+
+    def reset(self, tick: int) -> None:
+        """Starts a new rally, when a match starts.
+
+        Args:
+            tick (int): Current tick of the match.
+        """
+        self._rally = 0
+        self._serve_tick = tick
+        self._speed = 0.0
+
+    def write(
+        self,
+        tick: int,
+        kind: int,
+        rally: int,
+        offset: float,
+        speed: float,
+        duration: float,
+    ) -> None:
+        """Logs a row, see `COLUMNS`.
+
+        Args:
+            tick (int): Match tick of the event.
+            kind (int): Event flag.
+            rally (int): Paddle hits since the serve.
+            offset (float): Hit position along the paddle.
+            speed (float): Ball speed, in field units per second.
+            duration (float): Seconds since the serve.
+        """
+        ticks, kinds, rallies, offsets, speeds, durations = self._columns
+        row = self._row
+        ticks[row] = tick
+        kinds[row] = kind
+        rallies[row] = rally
+        offsets[row] = offset
+        speeds[row] = speed
+        durations[row] = duration
+        self.events += 1
+        self._row = row = row + 1
+        if row == self._block_size:
+            self._hand_over()
+
+    def flush(self) -> None:
+        """Hands the rows logged so far to the worker, which writes them through.
+
+        Called when the app is paused, since a paused app may be killed without
+        being stopped.
+        """
+        if self._row:
+            self._hand_over()
+
+    def close(self) -> None:
+        """Writes the remaining rows and closes the log, once the worker is done."""
+        if self._file.closed:
+            return
+        self.flush()
+        self._full.put(None)
+        self._thread.join()
+        self._file.close()
+
+    def _new_block(self) -> list:
+        """Returns the empty columns of a block.
+
+        Returns:
+            list[array.array]: One array of `BLOCK_SIZE` values per column.
+        """
+        return [
+            array(typecode, bytes(array(typecode).itemsize * self._block_size))
+            for _, typecode, _ in COLUMNS
+        ]
+
+    def _hand_over(self) -> None:
+        """Queues the current block for the worker and switches to a free one."""
+        self._full.put((self._columns, self._row))
+        self.blocks += 1
+        self._row = 0
+        try:
+            self._columns = self._free.get_nowait()
+        except Empty:
+            self._columns = self._new_block()
+            self.allocated += 1
+
+    def _run(self) -> None:
+        """Worker loop, appends the queued blocks and recycles their columns."""
+        file = self._file
+        while True:
+            block = self._full.get()
+            if block is None:
+                break
+            columns, count = block
+            file.write(BLOCK.pack(count))
+            for column in columns:
+                file.write(memoryview(column)[:count])
+            # Complete blocks reach the file even if the process is killed
+            file.flush()
+            self._free.put(columns)
+
+
+class TelemetryLog:
+    """Memory-mapped columns of a telemetry log.
+
+    Attributes:
+        path (str): The log.
+        events (int): Rows in the complete blocks of the log.
+        blocks (list[dict]): Column name to a numpy array viewing the mapped block,
+            per block.
+    """
+
+    def __init__(self, path: str):
+        """Maps the log and locates its blocks.
+
+        Args:
+            path (str): The log.
+
+        Raises:
+            ValueError: If the file isn't a telemetry log.
+        """
+        import numpy as np
+
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[: len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a Pong telemetry log")
+        dtypes = [(name, np.dtype(dtype)) for name, _, dtype in COLUMNS]
+        row_size = sum(dtype.itemsize for _, dtype in dtypes)
+        self.blocks = []
+        self.events = 0
+        offset = len(MAGIC)
+        size = len(self._map)
+        while offset + BLOCK.size <= size:
+            (count,) = BLOCK.unpack_from(self._map, offset)
+            offset += BLOCK.size
+            if offset + count * row_size > size:
+                break
+            block = {}
+            for name, dtype in dtypes:
+                block[name] = np.frombuffer(self._map, dtype, count, offset)
+                offset += count * dtype.itemsize
+            self.blocks.append(block)
+            self.events += count
+
+    def column(self, name: str):
+        """Returns a column of the whole log.
+
+        The column is copied out of the map, `summarize()` works on the mapped
+        blocks instead.
+
+        Args:
+            name (str): Name of the column, one of `COLUMNS`.
+
+        Returns:
+            numpy.ndarray: The values of the column, copied out of the map.
+        """
+        import numpy as np
+
+        dtype = next(dtype for column, _, dtype in COLUMNS if column == name)
+        if not self.blocks:
+            return np.empty(0, dtype)
+        return np.concatenate([block[name] for block in self.blocks])
+
+    def close(self) -> None:
+        """Releases the views and unmaps the log."""
+        self.blocks = []
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def summarize(paths: list) -> dict:
+    """Aggregates telemetry logs, one mapped block at a time.
+
+    Counts, sums and extremes are accumulated per block, as are integer histograms
+    of the rally lengths and the hit offsets. The duration median and the speed
+    percentile are read from histograms filled in a second pass over the blocks,
+    to within 1/`QUANTILE_BINS` of the largest value. No column is copied whole.
+
+    Args:
+        paths (list[str]): The logs.
+
+    Returns:
+        dict: Event and point counts, rally lengths, time per point, ball speed at
+        the paddle hits and a histogram of the hit offsets over `OFFSET_BINS` bins
+        from the left edge of the paddle to its right edge.
+    """
+    with contextlib.ExitStack() as stack:
+        logs = [stack.enter_context(TelemetryLog(path)) for path in paths]
+        # The views into the maps are gone with the frame before the maps close
+        return summarize_blocks([block for log in logs for block in log.blocks])
+
+
+def summarize_blocks(blocks: list) -> dict:
+    """Aggregates the blocks of telemetry logs, see `summarize()`.
+
+    Args:
+        blocks (list[dict]): Column name to the values of the block, per block.
+
+    Returns:
+        dict: The summary.
+    """
+    import numpy as np
+
+    events = points = player_points = opponent_points = hits = 0
+    rally_sum = duration_sum = speed_sum = 0.0
+    duration_max = speed_max = 0.0
+    rallies = np.zeros(1, np.int64)
+    offsets = np.zeros(OFFSET_BINS, np.int64)
+    for block in blocks:
+        kind = block["kind"]
+        scored = (kind & SCORED) != 0
+        hit = ~scored
+        events += len(kind)
+        player_points += int(np.count_nonzero(kind == PLAYER_SCORED))
+        opponent_points += int(np.count_nonzero(kind == OPPONENT_SCORED))
+
+        rally = block["rally"][scored]
+        points += len(rally)
+        if len(rally):
+            rally_sum += float(rally.sum(dtype=np.float64))
+            counts = np.bincount(rally)
+            if len(counts) > len(rallies):
+                rallies = np.pad(rallies, (0, len(counts) - len(rallies)))
+            rallies[: len(counts)] += counts
+            duration = block["duration"][scored]
+            duration_sum += float(duration.sum(dtype=np.float64))
+            duration_max = max(duration_max, float(duration.max()))
+
+        speed = block["speed"][hit]
+        hits += len(speed)
+        if len(speed):
+            speed_sum += float(speed.sum(dtype=np.float64))
+            speed_max = max(speed_max, float(speed.max()))
+            offset = np.clip(block["offset"][hit], -1.0, 1.0)
+            bins = np.minimum((offset + 1) / 2 * OFFSET_BINS, OFFSET_BINS - 1)
+            offsets += np.bincount(bins.astype(np.intp), minlength=OFFSET_BINS)
+
+    durations = np.zeros(QUANTILE_BINS, np.int64)
+    speeds = np.zeros(QUANTILE_BINS, np.int64)
+    for block in blocks:
+        scored = (block["kind"] & SCORED) != 0
+        durations += histogram(block["duration"][scored], duration_max)
+        speeds += histogram(block["speed"][~scored], speed_max)
+
+    duration_width = duration_max / QUANTILE_BINS
+    speed_width = speed_max / QUANTILE_BINS
+    return {
+        "events": events,
+        "points": points,
+        "player_points": player_points,
+        "opponent_points": opponent_points,
+        "rally_mean": rally_sum / points if points else 0.0,
+        "rally_median": quantile(rallies, 0.5),
+        "rally_max": len(rallies) - 1 if points else 0,
+        "duration_mean": duration_sum / points if points else 0.0,
+        "duration_median": quantile(durations, 0.5, duration_width, 0.5),
+        "speed_mean": speed_sum / hits if hits else 0.0,
+        "speed_p95": quantile(speeds, 0.95, speed_width, 0.5),
+        "speed_max": speed_max,
+        "offsets": offsets.tolist(),
+    }
+
+
+def histogram(values, top: float):
+    """Counts values over `QUANTILE_BINS` equal bins from 0 to `top`.
+
+    Args:
+        values (numpy.ndarray): The values, at most `top`, negative ones count in
+            the first bin.
+        top (float): Upper edge of the last bin.
+
+    Returns:
+        numpy.ndarray: Count per bin.
+    """
+    import numpy as np
+
+    if not len(values) or top <= 0:
+        counts = np.zeros(QUANTILE_BINS, np.int64)
+        counts[0] = len(values)
+        return counts
+    bins = np.clip(values * (QUANTILE_BINS / top), 0, QUANTILE_BINS - 1)
+    return np.bincount(bins.astype(np.intp), minlength=QUANTILE_BINS)
+
+
+def quantile(counts, q: float, width: float = 1.0, offset: float = 0.0) -> float:
+    """Reads a quantile off a histogram, interpolating like `numpy.percentile`.
+
+    Args:
+        counts (numpy.ndarray): Count per bin.
+        q (float): The quantile, from 0 to 1.
+        width (float, optional): Width of a bin. Defaults to 1, bins of integers.
+        offset (float, optional): Position of a bin's value within the bin, in
+            bins. Defaults to 0, its lower edge.
+
+    Returns:
+        float: The quantile, 0 without values.
+    """
+    import numpy as np
+
+    total = int(counts.sum())
+    if not total:
+        return 0.0
+    cumulative = np.cumsum(counts)
+    position = (total - 1) * q
+    lower = int(position)
+    below = int(np.searchsorted(cumulative, lower, side="right"))
+    above = int(np.searchsorted(cumulative, min(lower + 1, total - 1), side="right"))
+    return float((below + (above - below) * (position - lower) + offset) * width)
+
+
+def main() -> None:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Summarizes Pong telemetry logs.")
+    parser.add_argument("paths", nargs="+", help="telemetry logs")
+    args = parser.parse_args()
+
+    summary = summarize(args.paths)
+    print(
+        f"{summary['events']} events, {summary['points']} points "
+        f"({summary['player_points']}:{summary['opponent_points']})"
+    )
+    print(
+        f"rallies: mean {summary['rally_mean']:.2f}, "
+        f"median {summary['rally_median']:.1f}, max {summary['rally_max']} hits"
+    )
+    print(
+        f"time per point: mean {summary['duration_mean']:.2f} s, "
+        f"median {summary['duration_median']:.2f} s"
+    )
+    print(
+        f"hit speed: mean {summary['speed_mean']:.0f}, "
+        f"p95 {summary['speed_p95']:.0f}, max {summary['speed_max']:.0f} units/s"
+    )
+    print("hit offsets, left to right:", " ".join(map(str, summary["offsets"])))
+
+
+if __name__ == "__main__":
+    main()
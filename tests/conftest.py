@@ -0,0 +1,30 @@
+"""Fixtures of the game tests."""
+
+import pytest
+
+
+@pytest.fixture
+def kivy_game():
+    """Returns a factory of laid out `PongGame`s with a running match.
+
+    The tests using it are skipped without Kivy.
+    """
+    pytest.importorskip("kivy")
+    import main
+    import services
+
+    games = []
+
+    def create(**kwargs):
+        game = main.PongGame(**kwargs)
+        game.size = 1080, 1920
+        game.match.win_score = float("inf")
+        game.match.start()
+        game.enter_phase(main.PHASE_SERVE)
+        games.append(game)
+        return game
+
+    yield create
+    for game in games:
+        game.sleep()
+    services.close()
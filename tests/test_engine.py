@@ -0,0 +1,20 @@
+"""Tests of the match rules as the game shows them."""
+
+from ai import ComputerOpponent
+
+
+def test_final_score_is_shown(kivy_game):
+    """The widget scores show the final score once a match is over."""
+    import main
+
+    game = kivy_game()
+    game.match.win_score = 3
+    game.computer = ComputerOpponent("hard")
+    dt = game.timestep.step
+    for _ in range(120 * 600):
+        game.update(dt)
+        if game.phase == main.PHASE_GAME_OVER:
+            break
+    assert game.phase == main.PHASE_GAME_OVER, "the match didn't end"
+    shown = game.player.score, game.opponent.score
+    assert shown == (game.match.player_score, game.match.opponent_score)
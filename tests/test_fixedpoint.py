@@ -0,0 +1,16 @@
+"""Tests of the deterministic fixed-point physics."""
+
+from engine import FIELD_HEIGHT
+from fixedpoint import REFERENCE_HASH, FixedMatch, play
+
+# The defaults of `python fixedpoint.py`, which the reference hash is taken with
+TICKS = 120_000
+SEED = 0
+
+
+def test_runs_reach_the_reference_hash():
+    """Two runs of the same inputs chain the same state hashes as the reference."""
+    digests = [
+        play(FixedMatch(562.5, FIELD_HEIGHT), TICKS, SEED)[0] for _ in range(2)
+    ]
+    assert digests == [REFERENCE_HASH, REFERENCE_HASH]
@@ -0,0 +1,18 @@
+"""Tests of the particle effects."""
+
+
+def test_frames_leave_nothing_allocated(kivy_game):
+    """Instrumented frames of the particle effects leave nothing allocated."""
+    game = kivy_game(effects=True)
+    game.enable_profiler(overlay=False)
+    particles = game.particles
+    dt = game.timestep.step
+    # Long enough for the counters to outgrow the cached small integers
+    for _ in range(2000):
+        game.update(dt)
+    # Frames may free blocks allocated before them, none may keep new ones
+    leaking = 0
+    for _ in range(2000):
+        game.update(dt)
+        leaking += particles.frame_allocations > 0
+    assert leaking == 0, f"{leaking} frames left blocks allocated"
@@ -0,0 +1,74 @@
+"""Fixed-timestep accumulator for the game loop.
+
+Kivy's Clock calls the game at whatever rate it manages to, and each call reports
+the real time elapsed since the previous one. `FixedTimestep` turns that elapsed time
+into a whole number of physics steps of a fixed length, so the game runs at the same
+speed however often it is drawn, and reports how far the simulation is into the next
+step so the view can interpolate between the last two states.
+"""
+
+# Default physics and render rates, in Hz
+PHYSICS_RATE = 120.0
+RENDER_RATE = 120.0
+
+# Upper bound on the steps simulated for a single frame
+MAX_STEPS = 8
+
+
+class FixedTimestep:
+    """Accumulates elapsed time and hands it out in fixed steps.
+
+    If a frame comes so late that more than `max_steps` steps are due, the excess
+    time is dropped instead of simulated. The game then slows down for that frame
+    rather than spending ever longer frames on catching up (the spiral of death).
+
+    Attributes:
+        rate (float): Physics steps per second.
+        step (float): Length of a step, in seconds.
+        max_steps (int): Most steps handed out for a single frame.
+        accumulator (float): Time not yet simulated, in seconds.
+        dropped (float): Total time dropped by the catch-up limit, in seconds.
+    """
+
+    __slots__ = ("rate", "step", "max_steps", "accumulator", "dropped")
+
+    def __init__(self, rate: float = PHYSICS_RATE, max_steps: int = MAX_STEPS):
+        """Initializes the accumulator.
+
+        Args:
+            rate (float, optional): Physics steps per second. Defaults to 120.
+            max_steps (int, optional): Most steps handed out for a single frame.
+                Defaults to 8.
+        """
+        self.rate = rate
+        self.step = 1.0 / rate
+        self.max_steps = max_steps
+        self.accumulator = 0.0
+        self.dropped = 0.0
+
+    def advance(self, elapsed: float) -> int:
+        """Adds elapsed time and returns the number of steps to simulate.
+
+        Args:
+            elapsed (float): Real time since the previous call, in seconds.
+
+        Returns:
+            int: Number of whole steps now due.
+        """
+        accumulator = self.accumulator + elapsed
+        steps = int(accumulator / self.step)
+        if steps > self.max_steps:
+            self.dropped += (steps - self.max_steps) * self.step
+            accumulator -= (steps - self.max_steps) * self.step
+            steps = self.max_steps
+        self.accumulator = max(accumulator - steps * self.step, 0.0)
+        return steps
+
+    @property
+    def alpha(self) -> float:
+        """float: Fraction of the next step already elapsed, in `[0, 1)`."""
+        return self.accumulator / self.step
+
+    def reset(self) -> None:
+        """Forgets the accumulated time, e.g. after a pause."""
+        self.accumulator = 0.0
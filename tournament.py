@@ -0,0 +1,428 @@
+"""Self-play tournaments between computer players.
+
+Every pair of entrants plays a number of headless matches under the same rules.
+The matches are spread over a process pool in chunks, and each match gets its own
+seed, derived from the tournament seed and its index, so the results don't depend
+on the number of workers or on the order they finish in. Results are streamed back
+as they complete and can be appended to a JSON lines file.
+
+A worker that dies breaks the whole pool, and the pool kills the other workers
+with it. Every worker keeps the index of the match it is playing in shared memory,
+so the matches that were being played at the time are known, but not which one
+crashed. Those matches are played again one at a time, each alone in a fresh
+pool, and only a crash there counts as an attempt, as does a crash while a single
+match was being played. The pool is then rebuilt for the other unfinished matches.
+A match that crashed `MAX_ATTEMPTS` times is recorded as crashed instead of
+stopping the tournament.
+
+Once all matches are in, the entrants are rated with Elo, replaying the results in
+match order, and the rallies (paddle hits per point) are summarized:
+
+    python tournament.py easy normal hard --rounds 200
+    python tournament.py normal hard --win-score 5 --speed-multiplier 1.1
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from itertools import combinations
+from time import perf_counter
+
+from ai import DIFFICULTIES, ComputerOpponent
+from engine import (
+    OPPONENT,
+    OPPONENT_HIT,
+    PLAYER,
+    PLAYER_HIT,
+    SCORED,
+    SERVE_SPEED,
+    SPEED_MULTIPLIER,
+    WIN_SCORE,
+    Match,
+)
+
+# Elo parameters
+INITIAL_RATING = 1500.0
+K_FACTOR = 16.0
+
+# Matches per task sent to a worker
+CHUNK_SIZE = 16
+
+# Crashes a match may be in progress during before it is recorded as crashed
+MAX_ATTEMPTS = 3
+
+# Ticks after which a match is a draw, 10 minutes at 120 Hz
+MAX_TICKS = 72_000
+
+
+def match_seed(seed: int, index: int) -> int:
+    """Returns the seed of a match.
+
+    Args:
+        seed (int): Seed of the tournament.
+        index (int): Index of the match.
+
+    Returns:
+        int: Seed of the match.
+    """
+    return seed * 1_000_003 + index
+
+
+def play(job: tuple) -> dict:
+    """Plays one match between two computer players.
+
+    Args:
+        job (tuple): Match index, seed, player entrant, opponent entrant and rules.
+
+    Returns:
+        dict: The entrants, the scores, the ticks played and the rally lengths.
+    """
+    index, seed, player, opponent, rules = job
+    match = Match(
+        1080.0,
+        1920.0,
+        serve_speed=rules["serve_speed"],
+        speed_multiplier=rules["speed_multiplier"],
+        win_score=rules["win_score"],
+        continuous=rules["continuous"],
+    )
+    match.start()
+    computers = (
+        ComputerOpponent(player, seed=2 * seed, side=PLAYER),
+        ComputerOpponent(opponent, seed=2 * seed + 1, side=OPPONENT),
+    )
+    rallies = []
+    hits = 0
+    step = match.step
+    while match.started and match.tick < rules["max_ticks"]:
+        for computer in computers:
+            computer.update(match, 1.0)
+        events = step()
+        if events & (PLAYER_HIT | OPPONENT_HIT):
+            hits += 1
+        if events & SCORED:
+            rallies.append(hits)
+            hits = 0
+    return {
+        "index": index,
+        "seed": seed,
+        "player": player,
+        "opponent": opponent,
+        "player_score": match.player_score,
+        "opponent_score": match.opponent_score,
+        "ticks": match.tick,
+        "rallies": rallies,
+    }
+
+
+# Shared array of the match each worker plays, and the slot of this worker
+_playing = None
+_slot = 0
+
+
+def init_worker(playing, workers) -> None:
+    """Gives a new worker its slot in the shared array of matches in progress.
+
+    Args:
+        playing (multiprocessing.Array): Match index per worker, -1 when idle.
+        workers (multiprocessing.Value): Workers started so far.
+    """
+    global _playing, _slot
+    with workers.get_lock():
+        _slot = workers.value
+        workers.value += 1
+    _playing = playing
+
+
+def play_chunk(jobs: list, crash_rate: float = 0.0, attempts: list = None) -> list:
+    """Plays a chunk of matches in a worker.
+
+    An exception in a match is reported as that match's error, it doesn't fail the
+    rest of the chunk.
+
+    Args:
+        jobs (list): Jobs of `play()`.
+        crash_rate (float, optional): Probability of killing the worker before a
+            match, for testing. Defaults to 0.
+        attempts (list[int], optional): Crashes each match was in progress during,
+            they vary the injected crashes. Defaults to none.
+
+    Returns:
+        list[dict]: The results.
+    """
+    results = []
+    for i, job in enumerate(jobs):
+        if _playing is not None:
+            _playing[_slot] = job[0]
+        attempt = attempts[i] if attempts else 0
+        if crash_rate and random.Random(job[1] + attempt).random() < crash_rate:
+            os._exit(1)
+        try:
+            results.append(play(job))
+        except Exception as e:
+            results.append({"index": job[0], "seed": job[1], "error": repr(e)})
+        if _playing is not None:
+            _playing[_slot] = -1
+    return results
+
+
+def schedule(entrants: list, rounds: int, seed: int, rules: dict) -> list:
+    """Lists the matches of a round robin, each pair playing both sides.
+
+    Args:
+        entrants (list[str]): Difficulty names of the entrants.
+        rounds (int): Matches per pair and side.
+        seed (int): Seed of the tournament.
+        rules (dict): Match rules.
+
+    Returns:
+        list[tuple]: Jobs of `play()`.
+    """
+    jobs = []
+    for _ in range(rounds):
+        for a, b in combinations(entrants, 2):
+            for player, opponent in ((a, b), (b, a)):
+                index = len(jobs)
+                jobs.append((index, match_seed(seed, index), player, opponent, rules))
+    return jobs
+
+
+def run(jobs: list, workers: int, crash_rate: float = 0.0, on_result=None) -> list:
+    """Plays the jobs over a process pool, surviving worker crashes.
+
+    Args:
+        jobs (list): Jobs of `play()`.
+        workers (int): Worker processes.
+        crash_rate (float, optional): Probability of killing a worker before a
+            match, for testing. Defaults to 0.
+        on_result (callable, optional): Called with each result as it arrives.
+
+    Returns:
+        list[dict]: The results, sorted by match index. Matches that kept crashing
+        their worker have a "crashed" entry.
+    """
+    attempts = [0] * len(jobs)
+    remaining = list(jobs)
+    results = []
+    # Matches in progress when a pool broke, to replay alone
+    suspects = set()
+
+    def report(result: dict) -> None:
+        results.append(result)
+        if on_result is not None:
+            on_result(result)
+
+    while remaining:
+        isolated = [job for job in remaining if job[0] in suspects][:1]
+        batch = isolated or remaining
+        finished, playing = run_pool(
+            batch, 1 if isolated else workers, crash_rate, attempts, report
+        )
+        remaining = [job for job in remaining if job[0] not in finished]
+        suspects.difference_update(finished)
+        if playing is None:
+            continue
+        if isolated or len(playing) == 1:
+            # The match in progress is the one that crashed
+            for index in playing:
+                attempts[index] += 1
+        else:
+            suspects.update(playing)
+        crashed = [job for job in remaining if attempts[job[0]] >= MAX_ATTEMPTS]
+        for job in crashed:
+            report({"index": job[0], "seed": job[1], "crashed": True})
+            suspects.discard(job[0])
+        remaining = [job for job in remaining if attempts[job[0]] < MAX_ATTEMPTS]
+        print(
+            f"Worker crashed, {len(remaining)} matches left to play",
+            file=sys.stderr,
+        )
+    return sorted(results, key=lambda result: result["index"])
+
+
+def run_pool(
+    jobs: list, workers: int, crash_rate: float, attempts: list, report
+) -> tuple:
+    """Plays jobs over one process pool, until they are done or it breaks.
+
+    Args:
+        jobs (list): Jobs of `play()`.
+        workers (int): Worker processes.
+        crash_rate (float): Probability of killing a worker before a match.
+        attempts (list[int]): Crashes charged to each match so far.
+        report (callable): Called with each result as it arrives.
+
+    Returns:
+        tuple: Indices of the finished matches, and the indices of the matches in
+        progress when the pool broke, None if it didn't.
+    """
+    playing = multiprocessing.Array("q", [-1] * workers, lock=False)
+    started = multiprocessing.Value("i", 0)
+    finished = set()
+    broken = False
+    with ProcessPoolExecutor(
+        workers, initializer=init_worker, initargs=(playing, started)
+    ) as executor:
+        futures = []
+        for i in range(0, len(jobs), CHUNK_SIZE):
+            chunk = jobs[i : i + CHUNK_SIZE]
+            futures.append(
+                executor.submit(
+                    play_chunk,
+                    chunk,
+                    crash_rate,
+                    [attempts[job[0]] for job in chunk],
+                )
+            )
+        for future in as_completed(futures):
+            try:
+                chunk_results = future.result()
+            except BrokenProcessPool:
+                broken = True
+                continue
+            for result in chunk_results:
+                finished.add(result["index"])
+                report(result)
+    if not broken:
+        return finished, None
+    return finished, {index for index in playing if index >= 0} - finished
+
+
+def elo(results: list, entrants: list) -> dict:
+    """Rates the entrants by replaying the results in match order.
+
+    Args:
+        results (list[dict]): Results sorted by match index.
+        entrants (list[str]): Names of the entrants.
+
+    Returns:
+        dict: Entrant to rating.
+    """
+    ratings = dict.fromkeys(entrants, INITIAL_RATING)
+    for result in results:
+        if "player_score" not in result:
+            continue
+        a = result["player"]
+        b = result["opponent"]
+        if result["player_score"] > result["opponent_score"]:
+            score = 1.0
+        elif result["player_score"] < result["opponent_score"]:
+            score = 0.0
+        else:
+            score = 0.5
+        expected = 1 / (1 + 10 ** ((ratings[b] - ratings[a]) / 400))
+        ratings[a] += K_FACTOR * (score - expected)
+        ratings[b] -= K_FACTOR * (score - expected)
+    return ratings
+
+
+def summarize(results: list, entrants: list) -> dict:
+    """Aggregates the results.
+
+    Args:
+        results (list[dict]): Results sorted by match index.
+        entrants (list[str]): Names of the entrants.
+
+    Returns:
+        dict: Ratings, wins per entrant, rally statistics and failure counts.
+    """
+    played = [result for result in results if "player_score" in result]
+    wins = dict.fromkeys(entrants, 0)
+    for result in played:
+        if result["player_score"] > result["opponent_score"]:
+            wins[result["player"]] += 1
+        elif result["opponent_score"] > result["player_score"]:
+            wins[result["opponent"]] += 1
+    rallies = [rally for result in played for rally in result["rallies"]]
+    return {
+        "ratings": elo(results, entrants),
+        "wins": wins,
+        "matches": len(played),
+        "errors": sum("error" in result for result in results),
+        "crashed": sum("crashed" in result for result in results),
+        "draws": sum(
+            result["player_score"] == result["opponent_score"] for result in played
+        ),
+        "points": len(rallies),
+        "rally_mean": statistics.mean(rallies) if rallies else 0.0,
+        "rally_median": statistics.median(rallies) if rallies else 0.0,
+        "rally_max": max(rallies, default=0),
+        "ticks_mean": statistics.mean(r["ticks"] for r in played) if played else 0.0,
+    }
+
+
+def main() -> None:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Self-play Pong tournaments.")
+    parser.add_argument("entrants", nargs="*", default=list(DIFFICULTIES),
+                        help=f"difficulties among {', '.join(DIFFICULTIES)}")
+    parser.add_argument("--rounds", type=int, default=50,
+                        help="matches per pair and side")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--win-score", type=int, default=WIN_SCORE)
+    parser.add_argument("--speed-multiplier", type=float, default=SPEED_MULTIPLIER)
+    parser.add_argument("--serve-speed", type=float, default=SERVE_SPEED)
+    parser.add_argument("--continuous", action="store_true")
+    parser.add_argument("--max-ticks", type=int, default=MAX_TICKS)
+    parser.add_argument("--output", help="append the results as JSON lines")
+    parser.add_argument("--crash-rate", type=float, default=0.0,
+                        help="kill workers at random, for testing")
+    args = parser.parse_args()
+
+    entrants = list(dict.fromkeys(args.entrants))
+    for name in entrants:
+        if name not in DIFFICULTIES:
+            parser.error(f"unknown difficulty {name}")
+    if len(entrants) < 2:
+        parser.error("a tournament needs two different entrants")
+    rules = {
+        "win_score": args.win_score,
+        "speed_multiplier": args.speed_multiplier,
+        "serve_speed": args.serve_speed,
+        "continuous": args.continuous,
+        "max_ticks": args.max_ticks,
+    }
+    jobs = schedule(entrants, args.rounds, args.seed, rules)
+
+    output = open(args.output, "a") if args.output else None
+    start = perf_counter()
+
+    def on_result(result: dict) -> None:
+        if output is not None:
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+
+    try:
+        results = run(jobs, args.workers, args.crash_rate, on_result)
+    finally:
+        if output is not None:
+            output.close()
+    elapsed = perf_counter() - start
+
+    summary = summarize(results, entrants)
+    print(
+        f"{summary['matches']} matches in {elapsed:.1f} s "
+        f"({summary['matches'] / elapsed:.1f}/s, {args.workers} workers), "
+        f"{summary['draws']} draws, {summary['errors']} errors, "
+        f"{summary['crashed']} crashed"
+    )
+    for name, rating in sorted(
+        summary["ratings"].items(), key=lambda item: item[1], reverse=True
+    ):
+        print(f"{name:10} {rating:7.1f}  {summary['wins'][name]} wins")
+    print(
+        f"rallies: {summary['points']} points, mean {summary['rally_mean']:.2f}, "
+        f"median {summary['rally_median']:.1f}, max {summary['rally_max']} hits, "
+        f"{summary['ticks_mean']:.0f} ticks per match"
+    )
+
+
+if __name__ == "__main__":
+    main()